@@ -0,0 +1,855 @@
+"""Asynchronous FASJSON client, based on aiohttp.
+
+This module needs the ``async`` extra to be installed: ``pip install fasjson-client[async]``.
+"""
+
+import asyncio
+import collections
+import errno
+import functools
+import itertools
+import json
+import logging
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from bravado.client import SwaggerClient, CallableOperation, construct_request
+from bravado.exception import HTTPError, make_http_exception
+from bravado.http_future import unmarshal_response
+from bravado_core.response import IncomingResponse
+from swagger_spec_validator.common import SwaggerValidationError
+
+from .bulk import BulkResult, get_lookup, unique
+from .cache import ResponseCache
+from .circuit import CircuitBreaker
+from .coalescing import RequestCoalescer
+from .cursor import AsyncEntityCrawl, start_crawl
+from .endpoints import EndpointPool, rebase_request, with_endpoint
+from .errors import APIError, ClientError, ClientSetupError
+from .formats import mask_format
+from .gss_http import GssapiAuthenticator
+from .hedge import Hedger
+from .loader import AsyncEntityLoader
+from .prefetch import PagePrefetcher
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .response import FASJSONResponse, ResponseWrapper
+from .shards import Shard, make_shards
+from .spec import load_local_spec
+from .timeouts import Deadline, get_operation_timeouts, request_args
+
+_log = logging.getLogger(__name__)
+
+#: The exceptions raised when the server can't be reached.
+CONNECTION_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class AiohttpResponseAdapter(IncomingResponse):
+    """Wraps an aiohttp response and its body to be processed by bravado.
+
+    Args:
+        response (aiohttp.ClientResponse): the aiohttp response
+        body (bytes): the response body, that has already been read
+    """
+
+    def __init__(self, response, body):
+        self._response = response
+        self.raw_bytes = body
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    @property
+    def text(self):
+        return self.raw_bytes.decode(self._response.charset or "utf-8", "replace")
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+
+class AsyncResponseWrapper(ResponseWrapper):
+    """Wraps an operation to call it asynchronously and return our Response object.
+
+    Args:
+        operation (bravado.client.CallableOperation): the bravado operation to wrap
+        client (AsyncClient): the client that will send the request
+        cache (fasjson_client.cache.ResponseCache): the cache to store the responses in
+        coalescer (fasjson_client.coalescing.RequestCoalescer): the coalescer sharing the
+            identical read requests that are in flight
+        prefetcher (fasjson_client.prefetch.PagePrefetcher): the prefetcher requesting the next
+            pages of the paginated responses ahead of time
+        retry_policy (fasjson_client.retry.RetryPolicy): the policy retrying the read requests
+            that fail with a transient error
+        circuit_breaker (fasjson_client.circuit.CircuitBreaker): the circuit breaker failing
+            fast while the server is down
+        rate_limiter (fasjson_client.ratelimit.RateLimiter): the limiter throttling the requests
+        timeouts (tuple): the connect and total timeouts of the operation
+        hedger (fasjson_client.hedge.Hedger): the hedger sending a duplicate of the slow read
+            requests
+        endpoint_pool (fasjson_client.endpoints.EndpointPool): the pool selecting the server
+            each request is sent to
+        cache_scope (tuple): the identity of the client, added to the cache keys so that the
+            clients sharing a cache don't share their responses
+    """
+
+    def __init__(
+        self,
+        operation,
+        client,
+        cache=None,
+        coalescer=None,
+        prefetcher=None,
+        retry_policy=None,
+        circuit_breaker=None,
+        rate_limiter=None,
+        timeouts=None,
+        hedger=None,
+        endpoint_pool=None,
+        cache_scope=None,
+    ):
+        super().__init__(
+            operation,
+            cache=cache,
+            coalescer=coalescer,
+            prefetcher=prefetcher,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
+            rate_limiter=rate_limiter,
+            timeouts=timeouts,
+            hedger=hedger,
+            endpoint_pool=endpoint_pool,
+            cache_scope=cache_scope,
+        )
+        self._client = client
+
+    async def __call__(self, **kwargs):
+        """Send the HTTP request and return a FASJSONResponse.
+
+        Returns:
+            FASJSONResponse: the API call result. Its ``next_page()`` and ``prev_page()``
+            methods must be awaited.
+
+        Raises:
+            APIError: if the API doesn't return a successful response
+            DeadlineExceeded: if the deadline given in the ``_deadline`` argument has passed
+        """
+        deadline = Deadline.make(kwargs.pop("_deadline", None))
+        if self.prefetcher is not None:
+            return await self.prefetcher.call_async(self, kwargs, deadline)
+        return await self._fetch(self._call, kwargs, deadline)
+
+    async def call_or_none(self, **kwargs):
+        """Send the HTTP request, returning ``None`` if the server replies with 404 Not Found.
+
+        Returns:
+            FASJSONResponse: the API call result, or ``None``
+
+        Raises:
+            APIError: if the API doesn't return a successful response, except 404
+        """
+        deadline = Deadline.make(kwargs.pop("_deadline", None))
+        return await self._fetch(self._call_or_none, kwargs, deadline)
+
+    async def _call(
+        self, kwargs, deadline=None, endpoint=None, none_if_not_found=False
+    ):
+        try:
+            call_result = await self._client._call_operation(
+                self.operation.operation,
+                with_endpoint(request_args(kwargs, self.timeouts, deadline), endpoint),
+                none_if_not_found=none_if_not_found,
+            )
+        except HTTPError as e:
+            raise APIError.from_bravado_error(e)
+        if call_result is None:
+            return None
+        return FASJSONResponse(call_result, operation=self, operation_args=kwargs)
+
+    async def _call_or_none(self, kwargs, deadline=None, endpoint=None):
+        return await self._call(kwargs, deadline, endpoint, none_if_not_found=True)
+
+    async def _fetch(self, call, kwargs, deadline=None):
+        key = self._request_key(kwargs)
+        send = functools.partial(call, kwargs, deadline)
+        if self.endpoint_pool is not None:
+            send = functools.partial(
+                self.endpoint_pool.call_async,
+                send,
+                CONNECTION_ERRORS,
+                failover=key is not None,
+            )
+        if self.rate_limiter is not None:
+            send = functools.partial(self.rate_limiter.call_async, send)
+        if self.circuit_breaker is not None:
+            send = functools.partial(
+                self.circuit_breaker.call_async, send, CONNECTION_ERRORS
+            )
+        if deadline is not None:
+            send = functools.partial(deadline.call_async, send, CONNECTION_ERRORS)
+        if key is None:
+            return await send()
+        if self.hedger is not None:
+            send = functools.partial(self.hedger.call_async, self.operation_id, send)
+        if self.retry_policy is not None:
+            send = functools.partial(
+                self.retry_policy.call_async,
+                self.operation_id,
+                send,
+                CONNECTION_ERRORS,
+                deadline,
+            )
+        if self.coalescer is not None:
+            send = functools.partial(
+                self.coalescer.call_async, key + (call.__name__,), send, deadline
+            )
+        if self.cache is None or not self.cache.is_cacheable(self.operation.operation):
+            return await send()
+        if call == self._call_or_none and self.cache.is_not_found(key):
+            return None
+        return await self.cache.fetch_async(key, send, CONNECTION_ERRORS)
+
+
+def _to_query(params):
+    query = []
+    for key, value in params.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        query.extend((key, str(item)) for item in values)
+    return query
+
+
+class AsyncClient:
+    """Asynchronous FASJSON client class that builds API methods based on openapi specs.
+
+    The client must be set up before it is used, and closed afterwards. The easiest way is to
+    use it as an asynchronous context manager::
+
+        async with AsyncClient("https://fasjson.example.com") as client:
+            response = await client.get_user(username="dummy")
+
+    Args:
+        url (str or list): the URL to the FASJSON instance, or the URLs to its replicas to
+            spread the requests over
+        principal (str): the Kerberos principal to use for authentication
+        api_version (int): the FASJSON API version to use
+        bravado_config (dict): additional configuration to pass down to bravado
+        auth (bool): whether or not the client should use auth. only for testing.
+        spec (str): build the client from a local spec instead of downloading it. Set it to
+            ``"bundled"`` to use the spec shipped with this package, or to the path of a JSON
+            file.
+        session (aiohttp.ClientSession): the session to send requests with, for example to
+            share a connection pool with other clients. It will not be closed by the client.
+        connection_limit (int): the maximum number of connections in the client's pool, when
+            no session is given
+        connection_limit_per_host (int): the maximum number of connections to the same host
+            in the client's pool, when no session is given. ``0`` means no limit.
+        opportunistic_auth (bool): send the Kerberos token with the first request instead of
+            waiting for the server's challenge, saving a round trip.
+        response_cache (bool or fasjson_client.cache.ResponseCache): cache the responses to the
+            read operations. Set it to ``True`` to use a cache with the default settings.
+        coalesce_requests (bool): share one request between the identical read calls made
+            while it is in flight.
+        prefetch_pages (int or fasjson_client.prefetch.PagePrefetcher): the number of pages to
+            fetch ahead of the paginated responses. Disabled by default.
+        retry (bool or fasjson_client.retry.RetryPolicy): retry the read operations that fail
+            with a transient error. Set it to ``True`` to use the default policy.
+        circuit_breaker (bool or fasjson_client.circuit.CircuitBreaker): stop sending requests
+            for a while when the server fails too often. Set it to ``True`` to use the default
+            settings.
+        rate_limit (float or fasjson_client.ratelimit.RateLimiter): the maximum number of
+            requests per second sent by the client. No limit by default.
+        operation_timeouts (dict): the timeouts of some operations, keyed by operation id. A
+            timeout is either the number of seconds to wait for the whole request, or a
+            ``(connect_timeout, timeout)`` tuple.
+        hedge (bool or fasjson_client.hedge.Hedger): send a duplicate of the read requests
+            that are slower than usual, and use the first response. Set it to ``True`` to use
+            the default settings.
+        timeout (float): the default number of seconds to wait for a whole request, when no
+            session is given. No timeout by default.
+        connect_timeout (float): the default number of seconds to wait for a connection, when
+            no session is given. No timeout by default.
+        keep_alive (bool): whether to keep the connections open between requests, when no
+            session is given
+    """
+
+    def __init__(
+        self,
+        url,
+        principal=None,
+        api_version=1,
+        bravado_config=None,
+        auth=True,
+        spec=None,
+        session=None,
+        connection_limit=100,
+        connection_limit_per_host=0,
+        opportunistic_auth=False,
+        response_cache=None,
+        coalesce_requests=False,
+        prefetch_pages=0,
+        timeout=None,
+        connect_timeout=None,
+        keep_alive=True,
+        retry=None,
+        circuit_breaker=None,
+        rate_limit=None,
+        operation_timeouts=None,
+        hedge=None,
+    ):
+        self._api = None
+        self._ops = None
+        self._setup_lock = None
+        urls = [url] if isinstance(url, str) else list(url)
+        self._base_url = urls[0]
+        if not self._base_url.endswith("/"):
+            self._base_url += "/"
+        self._principal = principal
+        self._api_version = api_version
+        self.endpoint_pool = (
+            EndpointPool(urls, api_version=api_version) if len(urls) > 1 else None
+        )
+        self._bravado_config = bravado_config or {}
+        self._bravado_config.setdefault("formats", []).append(mask_format)
+        self._spec = spec
+        self._session = session
+        self._own_session = session is None
+        self._connection_limit = connection_limit
+        self._connection_limit_per_host = connection_limit_per_host
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._operation_timeouts = operation_timeouts
+        self._keep_alive = keep_alive
+        if response_cache is True:
+            response_cache = ResponseCache()
+        elif response_cache is False:
+            response_cache = None
+        self.response_cache = response_cache
+        self.request_coalescer = RequestCoalescer() if coalesce_requests else None
+        if isinstance(prefetch_pages, PagePrefetcher):
+            self.page_prefetcher = prefetch_pages
+        else:
+            self.page_prefetcher = (
+                PagePrefetcher(prefetch_pages) if prefetch_pages else None
+            )
+        self.retry_policy = RetryPolicy() if retry is True else retry or None
+        self.circuit_breaker = (
+            CircuitBreaker() if circuit_breaker is True else circuit_breaker or None
+        )
+        if isinstance(rate_limit, RateLimiter):
+            self.rate_limiter = rate_limit
+        else:
+            self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.hedger = Hedger() if hedge is True else hedge or None
+        if auth:
+            self._authenticator = GssapiAuthenticator(
+                urlsplit(self._base_url).netloc,
+                principal=self._principal,
+                opportunistic_auth=opportunistic_auth,
+                other_hosts=[urlsplit(url).netloc for url in self._endpoint_urls[1:]],
+            )
+        else:
+            self._authenticator = None
+
+    async def __aenter__(self):
+        await self.setup()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+    @property
+    def _spec_url(self):
+        return urljoin(self._base_url, f"specs/v{self._api_version}.json")
+
+    @property
+    def _endpoint_urls(self):
+        if self.endpoint_pool is None:
+            return [self._base_url]
+        return [endpoint.url for endpoint in self.endpoint_pool.endpoints]
+
+    async def setup(self):
+        """Open the HTTP session and load the spec, if it hasn't been done yet.
+
+        Raises:
+            ClientSetupError: if the client could not be set up
+        """
+        if self._ops is not None:
+            return
+        if self._setup_lock is None:
+            self._setup_lock = asyncio.Lock()
+        async with self._setup_lock:
+            if self._ops is not None:
+                return
+            if self._session is None:
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=self._connection_limit,
+                        limit_per_host=self._connection_limit_per_host,
+                        force_close=not self._keep_alive,
+                    ),
+                    timeout=self._timeout,
+                )
+            if self._spec is None:
+                spec_dict = await self._fetch_first_spec()
+            else:
+                spec_dict = load_local_spec(
+                    self._spec, self._base_url, self._api_version
+                )
+            self._api = self._make_bravado_client(spec_dict)
+            self._ops = self._make_ops_map()
+
+    async def close(self):
+        """Close the HTTP session, unless it was given to the constructor."""
+        if self.page_prefetcher is not None:
+            self.page_prefetcher.close()
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._ops = None
+
+    async def _fetch_first_spec(self):
+        # The spec is fetched from the first replica that can be reached.
+        spec_urls = [
+            urljoin(url, f"specs/v{self._api_version}.json")
+            for url in self._endpoint_urls
+        ]
+        for spec_url in spec_urls[:-1]:
+            try:
+                return await self._fetch_spec(spec_url)
+            except ClientSetupError as e:
+                if e.code != errno.ECONNABORTED:
+                    raise
+                _log.warning("Could not load the spec from %s: %s", spec_url, e)
+        return await self._fetch_spec(spec_urls[-1])
+
+    async def _fetch_spec(self, spec_url):
+        message = "error loading remote spec, are you sure this is the URL to a FASJSON instance?"
+        try:
+            response = await self._send(
+                {"method": "GET", "url": spec_url, "headers": {}}
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ClientSetupError(
+                message, errno.ECONNABORTED, data={"exc": e, "message": str(e)}
+            )
+        if response.status_code >= 300:
+            e = make_http_exception(response=response)
+            raise ClientSetupError(
+                message,
+                errno.ECONNABORTED,
+                data={"exc": e, "message": str(e), "status_code": e.status_code},
+            )
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ClientSetupError(
+                "remote data validation failed", errno.EPROTO, data={"exc": e}
+            )
+
+    def _make_bravado_client(self, spec_dict):
+        try:
+            return SwaggerClient.from_spec(
+                spec_dict, self._spec_url, config=self._bravado_config
+            )
+        except SwaggerValidationError as e:
+            raise ClientSetupError(
+                "schema validation failed", errno.EPROTO, data={"exc": e}
+            )
+
+    def _make_ops_map(self):
+        ops = {}
+        for res_name, res in self._api.swagger_spec.resources.items():
+            for op_name, op in res.operations.items():
+                ops[op_name] = AsyncResponseWrapper(
+                    CallableOperation(op),
+                    self,
+                    cache=self.response_cache,
+                    coalescer=self.request_coalescer,
+                    prefetcher=self.page_prefetcher,
+                    retry_policy=self.retry_policy,
+                    circuit_breaker=self.circuit_breaker,
+                    rate_limiter=self.rate_limiter,
+                    hedger=self.hedger,
+                    endpoint_pool=self.endpoint_pool,
+                    cache_scope=(self._base_url, self._principal),
+                    timeouts=get_operation_timeouts(
+                        self._operation_timeouts,
+                        op.operation_id,
+                        self._timeout.connect,
+                        self._timeout.total,
+                    ),
+                )
+        return ops
+
+    def _check_setup(self):
+        if self._ops is None:
+            raise ClientSetupError(
+                "the client is not set up, use it in an async with block or await its "
+                "setup() method",
+                errno.EINVAL,
+            )
+
+    @property
+    def operations(self):
+        """List available operations.
+
+        Returns:
+            list(str): available operation names
+        """
+        self._check_setup()
+        return list(self._ops)
+
+    def __getattr__(self, name):
+        # The operations are never private. Private and special names are looked up by copy,
+        # pickle, hasattr() or mocks, and must not set the client up.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        self._check_setup()
+        try:
+            return self._ops[name]
+        except KeyError:
+            pass
+        if name.startswith("get_") and name.endswith("_or_none"):
+            try:
+                return self._ops[name[: -len("_or_none")]].call_or_none
+            except KeyError:
+                pass
+        raise AttributeError("No such operation: {!r}".format(name))
+
+    async def _call_operation(self, operation, kwargs, none_if_not_found=False):
+        op_kwargs = dict(kwargs)
+        request_options = op_kwargs.pop("_request_options", {})
+        request_params = construct_request(operation, request_options, **op_kwargs)
+        if "api_url" in request_options:
+            rebase_request(request_params, operation, request_options["api_url"])
+        response = await self._send(request_params)
+        if none_if_not_found and response.status_code == 404:
+            return None
+        unmarshal_response(
+            response, operation, request_options.get("response_callbacks")
+        )
+        return response.swagger_result
+
+    @property
+    def authenticator(self):
+        """The authenticator used by this client, or ``None`` if auth is disabled.
+
+        Its ``challenges_avoided`` and ``challenges_received`` attributes count the effect of
+        opportunistic authentication.
+        """
+        return self._authenticator
+
+    async def _negotiate_header(self, url):
+        # Generating the token may block while talking to the KDC.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self._authenticator.negotiate_header, urlsplit(url).hostname
+        )
+
+    async def _send(self, request_params):
+        headers = {key: str(value) for key, value in request_params["headers"].items()}
+        kwargs = {
+            "params": _to_query(request_params.get("params", {})),
+            "data": request_params.get("data"),
+        }
+        if "timeout" in request_params or "connect_timeout" in request_params:
+            kwargs["timeout"] = aiohttp.ClientTimeout(
+                total=request_params.get("timeout"),
+                connect=request_params.get("connect_timeout"),
+            )
+        opportunistic = (
+            self._authenticator is not None and self._authenticator.opportunistic_auth
+        )
+        if opportunistic:
+            headers["Authorization"] = await self._negotiate_header(
+                request_params["url"]
+            )
+        response = await self._request(
+            request_params["method"], request_params["url"], headers, **kwargs
+        )
+        if opportunistic:
+            self._authenticator.record_response(response.status_code)
+        www_authenticate = response.headers.get("WWW-Authenticate", "")
+        if (
+            response.status_code == 401
+            and self._authenticator is not None
+            and "negotiate" in www_authenticate.lower()
+        ):
+            headers["Authorization"] = await self._negotiate_header(
+                request_params["url"]
+            )
+            response = await self._request(
+                request_params["method"], request_params["url"], headers, **kwargs
+            )
+        return response
+
+    async def _request(self, method, url, headers, **kwargs):
+        async with self._session.request(
+            method, url, headers=headers, **kwargs
+        ) as response:
+            body = await response.read()
+        return AiohttpResponseAdapter(response, body)
+
+    async def list_all_entities(
+        self,
+        entity_name,
+        page_size=1000,
+        concurrency=1,
+        max_buffered_pages=None,
+        deadline=None,
+        **kwargs,
+    ):
+        """Iterate asynchronously over all the entities of a given type, across all pages.
+
+        Args:
+            entity_name (str): the plural name of the entity, for example ``users``
+            page_size (int): the number of entities per page
+            concurrency (int): the number of pages to fetch in parallel. The first page is
+                always fetched alone to get the number of pages.
+            max_buffered_pages (int): when fetching pages in parallel, the maximum number of
+                pages being fetched or waiting to be consumed. Defaults to twice the
+                concurrency.
+            deadline (float or fasjson_client.timeouts.Deadline): the number of seconds, or the
+                deadline, before which all the pages must be fetched, retries included
+            **kwargs: additional arguments for the list operation
+
+        Yields:
+            dict: the entities, in the order of the pages
+
+        Raises:
+            DeadlineExceeded: if the deadline passes before the last page is fetched
+        """
+        if deadline is not None:
+            kwargs["_deadline"] = Deadline.make(deadline)
+        operation = await self._list_operation(entity_name)
+        response = await operation(page_size=page_size, page_number=1, **kwargs)
+        for entity in response.result:
+            yield entity
+        if concurrency > 1:
+            responses = self._iter_pages_concurrently(
+                operation,
+                range(2, response.page["total_pages"] + 1),
+                concurrency,
+                max_buffered_pages or concurrency * 2,
+                page_size=page_size,
+                **kwargs,
+            )
+            async for response in responses:
+                for entity in response.result:
+                    yield entity
+            return
+        page_number = 1
+        while page_number < response.page["total_pages"]:
+            page_number += 1
+            response = await operation(
+                page_size=page_size, page_number=page_number, **kwargs
+            )
+            for entity in response.result:
+                yield entity
+
+    def resumable_list_all_entities(
+        self, entity_name, page_size=1000, cursor=None, checkpoint=None, **kwargs
+    ):
+        """Iterate asynchronously over all the entities of a given type, resumably.
+
+        The pages are fetched one after the other. The position of the iteration is available in
+        the ``cursor`` attribute of the returned object, and iterating over it again after an
+        error resumes after the last page that was completely consumed.
+
+        Args:
+            entity_name (str): the plural name of the entity, for example ``users``
+            page_size (int): the number of entities per page
+            cursor (fasjson_client.cursor.Cursor or dict): the cursor of a previous iteration to
+                resume from
+            checkpoint (str): the path of a file where the cursor is saved after each page. If
+                the file exists, the iteration resumes from the cursor it holds. The file is
+                removed when the iteration is finished.
+            **kwargs: additional arguments for the list operation. They must be serializable to
+                JSON.
+
+        Returns:
+            AsyncEntityCrawl: the iteration, to use in an ``async for`` loop
+
+        Raises:
+            ValueError: if the cursor belongs to another iteration
+        """
+        cursor = start_crawl(entity_name, page_size, kwargs, cursor, checkpoint)
+        return AsyncEntityCrawl(self, cursor, checkpoint)
+
+    async def get_shards(self, entity_name, count, page_size=1000, **kwargs):
+        """Split the iteration over all the entities of a given type into page ranges.
+
+        The number of pages is learned by requesting the first page. The shards can be
+        consumed by several processes or hosts with :meth:`iter_shard`.
+
+        Args:
+            entity_name (str): the plural name of the entity, for example ``users``
+            count (int): the number of shards. There are fewer shards if there are fewer pages.
+            page_size (int): the number of entities per page
+            **kwargs: additional arguments for the list operation
+
+        Returns:
+            list: the :class:`fasjson_client.shards.Shard` instances, in the order of the pages
+        """
+        operation = await self._list_operation(entity_name)
+        response = await operation(page_size=page_size, page_number=1, **kwargs)
+        return make_shards(
+            entity_name, page_size, response.page["total_pages"], count, kwargs
+        )
+
+    async def iter_shard(self, shard):
+        """Iterate over the entities of a shard returned by :meth:`get_shards`.
+
+        Args:
+            shard (fasjson_client.shards.Shard or dict): the shard, or its ``_asdict()``
+                serialization
+
+        Yields:
+            dict: the entities, in the order of the pages
+        """
+        if isinstance(shard, dict):
+            shard = Shard(**shard)
+        operation = await self._list_operation(shard.entity_name)
+        for page_number in range(shard.first_page, shard.last_page + 1):
+            response = await operation(
+                page_size=shard.page_size, page_number=page_number, **shard.kwargs
+            )
+            for entity in response.result:
+                yield entity
+
+    async def _list_operation(self, entity_name):
+        """Return the operation listing the entities of a given type."""
+        await self.setup()
+        try:
+            return self._ops["list_{}".format(entity_name)]
+        except KeyError:
+            raise ValueError(
+                "No such entity: {}. Is it plural? It should be.".format(entity_name)
+            )
+
+    async def _iter_pages_concurrently(
+        self, operation, page_numbers, concurrency, max_buffered_pages, **kwargs
+    ):
+        semaphore = asyncio.Semaphore(concurrency)
+        page_numbers = iter(page_numbers)
+        pending = collections.deque()
+
+        async def fetch(page_number):
+            async with semaphore:
+                return await operation(page_number=page_number, **kwargs)
+
+        def submit(page_number):
+            pending.append(asyncio.ensure_future(fetch(page_number)))
+
+        try:
+            for page_number in itertools.islice(page_numbers, max_buffered_pages):
+                submit(page_number)
+            while pending:
+                response = await pending.popleft()
+                for page_number in itertools.islice(page_numbers, 1):
+                    submit(page_number)
+                yield response
+        finally:
+            # Don't fetch the remaining pages if the consumer stopped early.
+            for task in pending:
+                task.cancel()
+
+    async def iter_entities(
+        self, entity_name, names, concurrency=10, deadline=None, **kwargs
+    ):
+        """Look up many entities by name concurrently, yielding them as they arrive.
+
+        The errors are yielded instead of being raised. Duplicate names are only looked up once.
+
+        Args:
+            entity_name (str): the plural name of the entity, ``users`` or ``groups``
+            names (iterable): the names of the entities. It is consumed lazily.
+            concurrency (int): the number of lookups to run concurrently
+            deadline (float or fasjson_client.timeouts.Deadline): the number of seconds, or the
+                deadline, before which all the lookups must complete. The lookups that can't
+                complete in time get a :class:`fasjson_client.errors.DeadlineExceeded` error.
+            **kwargs: additional arguments for the lookup operation
+
+        Yields:
+            tuple: the name, the entity or ``None`` if it does not exist, and the exception
+            raised by the lookup or ``None``, in the order the lookups complete
+        """
+        await self.setup()
+        operation, arg_name = get_lookup(self._ops, entity_name)
+        names = unique(names)
+        if deadline is not None:
+            kwargs["_deadline"] = Deadline.make(deadline)
+
+        async def lookup(name):
+            try:
+                response = await operation.call_or_none(**{arg_name: name}, **kwargs)
+            except (ClientError,) + CONNECTION_ERRORS as e:
+                return name, None, e
+            return name, None if response is None else response.result, None
+
+        pending = set()
+        try:
+            for name in itertools.islice(names, concurrency):
+                pending.add(asyncio.ensure_future(lookup(name)))
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    for name in itertools.islice(names, 1):
+                        pending.add(asyncio.ensure_future(lookup(name)))
+                    yield task.result()
+        finally:
+            # Don't run the remaining lookups if the consumer stopped early.
+            for task in pending:
+                task.cancel()
+
+    async def get_entities(
+        self, entity_name, names, concurrency=10, deadline=None, **kwargs
+    ):
+        """Look up many entities by name concurrently.
+
+        Args:
+            entity_name (str): the plural name of the entity, ``users`` or ``groups``
+            names (iterable): the names of the entities
+            concurrency (int): the number of lookups to run concurrently
+            deadline (float or fasjson_client.timeouts.Deadline): the number of seconds, or the
+                deadline, before which all the lookups must complete
+            **kwargs: additional arguments for the lookup operation
+
+        Returns:
+            BulkResult: the entities and the errors, keyed by name
+        """
+        result = BulkResult({}, {})
+        lookups = self.iter_entities(
+            entity_name, names, concurrency, deadline, **kwargs
+        )
+        async for name, entity, error in lookups:
+            if error is None:
+                result.results[name] = entity
+            else:
+                result.errors[name] = error
+        return result
+
+    async def get_users(self, usernames, concurrency=10, **kwargs):
+        """Look up many users concurrently, see :meth:`get_entities`."""
+        return await self.get_entities("users", usernames, concurrency, **kwargs)
+
+    async def get_groups(self, groupnames, concurrency=10, **kwargs):
+        """Look up many groups concurrently, see :meth:`get_entities`."""
+        return await self.get_entities("groups", groupnames, concurrency, **kwargs)
+
+    def loader(self, entity_name, **kwargs):
+        """Build a loader that batches the lookups of single entities.
+
+        The lookups made through the loader within a short window are deduplicated and sent
+        together, concurrently.
+
+        Args:
+            entity_name (str): the plural name of the entity, ``users`` or ``groups``
+            **kwargs: the options of the loader, see
+                :class:`fasjson_client.loader.AsyncEntityLoader`
+
+        Returns:
+            AsyncEntityLoader: the loader
+        """
+        return AsyncEntityLoader(self, entity_name, **kwargs)
@@ -0,0 +1,66 @@
+"""Helpers to look up many entities at once."""
+
+import collections
+
+
+#: The result of a bulk lookup. ``results`` maps the names to the entities, or to ``None`` for
+#: the entities that don't exist. ``errors`` maps the names to the exceptions raised when
+#: looking them up.
+BulkResult = collections.namedtuple("BulkResult", ["results", "errors"])
+
+#: The operation and argument used to look up each type of entity, keyed by plural name.
+LOOKUPS = {
+    "users": ("get_user", "username"),
+    "groups": ("get_group", "groupname"),
+}
+
+
+def unique(names):
+    """Iterate over the names, skipping the duplicates.
+
+    Args:
+        names (iterable): the names
+
+    Yields:
+        str: the names, in their original order
+    """
+    seen = set()
+    for name in names:
+        if name not in seen:
+            seen.add(name)
+            yield name
+
+
+def get_lookup(ops, entity_name):
+    """Return the operation and its argument to look up an entity by name.
+
+    Args:
+        ops (dict): the client's operations, keyed by operation id
+        entity_name (str): the plural name of the entity, for example ``users``
+
+    Returns:
+        tuple: the operation and the name of its argument
+
+    Raises:
+        ValueError: if the entities of this type can't be looked up by name
+    """
+    check_entity_name(entity_name)
+    operation_id, arg_name = LOOKUPS[entity_name]
+    return ops[operation_id], arg_name
+
+
+def check_entity_name(entity_name):
+    """Check that the entities of this type can be looked up by name.
+
+    Args:
+        entity_name (str): the plural name of the entity, for example ``users``
+
+    Raises:
+        ValueError: if the entities of this type can't be looked up by name
+    """
+    if entity_name not in LOOKUPS:
+        raise ValueError(
+            "Can't look up {} by name, valid entities are: {}.".format(
+                entity_name, ", ".join(sorted(LOOKUPS))
+            )
+        )
@@ -0,0 +1,442 @@
+"""Client-side caching of the API responses.
+
+Only the responses to ``GET`` operations are cached, the other operations such as ``sign_csr``
+always reach the server.
+"""
+
+import asyncio
+import collections
+import copy
+import logging
+import threading
+import time
+
+from .errors import APIError, CircuitOpenError, DeadlineExceeded
+
+
+_log = logging.getLogger(__name__)
+
+
+#: The default number of seconds during which a response is cached.
+DEFAULT_TTL = 60
+
+#: The default maximum number of responses in the cache.
+DEFAULT_MAXSIZE = 1024
+
+#: The errors raised when the server can't answer in time, on top of the connection errors.
+UNAVAILABLE_ERRORS = (APIError, CircuitOpenError, DeadlineExceeded)
+
+
+def _normalize(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    return value
+
+
+def _normalize_mask(mask):
+    if mask is None:
+        return None
+    if isinstance(mask, str):
+        mask = mask.split(",")
+    return tuple(sorted({field.strip() for field in mask}))
+
+
+def _is_not_found(error):
+    return isinstance(error, APIError) and error.code == 404
+
+
+def _mark_stale(response):
+    response = copy.deepcopy(response)
+    response.stale = True
+    return response
+
+
+class ResponseCache:
+    """A thread-safe cache of the responses, with a time-to-live and a bounded size.
+
+    When the cache is full, the least recently used response is evicted.
+
+    After its time-to-live, a response can still be used for a while: it is then returned with
+    its ``stale`` attribute set to ``True``.
+
+    The responses are copied when they are stored and when they are returned, so that a caller
+    modifying its response doesn't change the responses of the other callers.
+
+    Args:
+        ttl (float): the default number of seconds during which a response is cached
+        ttls (dict): the number of seconds during which the responses of some operations are
+            cached, keyed by operation id. A TTL of zero disables caching for that operation.
+        maxsize (int): the maximum number of responses in the cache
+        stale_while_revalidate (float): the number of seconds after the TTL during which a
+            cached response is returned right away while it is refreshed in the background
+        stale_if_error (float): the number of seconds after the TTL during which a cached
+            response is returned if the server can't be reached or replies with a server error,
+            while the circuit breaker is open, and when the deadline of the call has passed
+        not_found_ttl (float): the number of seconds during which the ``get_*_or_none()``
+            lookups remember that an entity does not exist. Disabled by default.
+    """
+
+    def __init__(
+        self,
+        ttl=DEFAULT_TTL,
+        ttls=None,
+        maxsize=DEFAULT_MAXSIZE,
+        stale_while_revalidate=0,
+        stale_if_error=0,
+        not_found_ttl=0,
+    ):
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.maxsize = maxsize
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.not_found_ttl = not_found_ttl
+        #: The number of calls that were answered from the cache.
+        self.hits = 0
+        #: The number of calls that had to reach the server.
+        self.misses = 0
+        #: The number of responses removed from the cache to make room for new ones.
+        self.evictions = 0
+        #: The number of stale responses returned while they were refreshed in the background.
+        self.stale_hits = 0
+        #: The number of stale responses returned because the server failed.
+        self.stale_errors = 0
+        #: The number of lookups answered by a cached 404 Not Found.
+        self.not_found_hits = 0
+        self._entries = collections.OrderedDict()
+        self._not_found = collections.OrderedDict()
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries) + len(self._not_found)
+
+    def get_ttl(self, operation_id):
+        """Return the number of seconds during which the responses to an operation are cached.
+
+        Args:
+            operation_id (str): the operation id, for example ``get_user``
+
+        Returns:
+            float: the TTL
+        """
+        return self.ttls.get(operation_id, self.ttl)
+
+    def is_cacheable(self, operation):
+        """Tell whether the responses to this operation can be cached.
+
+        Args:
+            operation (bravado_core.operation.Operation): the operation
+
+        Returns:
+            bool: ``True`` if the operation is a ``GET`` with a non-zero TTL
+        """
+        return (
+            operation.http_method.lower() == "get"
+            and self.get_ttl(operation.operation_id) > 0
+        )
+
+    @staticmethod
+    def make_key(operation_id, kwargs, scope=None):
+        """Build the cache key of an operation call.
+
+        The key includes the attribute mask of the ``X-Fields`` header, if any. The other
+        request options, such as timeouts, are ignored.
+
+        Args:
+            operation_id (str): the operation id
+            kwargs (dict): the arguments of the call
+            scope (tuple): the identity of the client making the call, its URL and its Kerberos
+                principal, so that the clients sharing the cache don't get each other's
+                responses
+
+        Returns:
+            tuple: the cache key
+        """
+        request_options = kwargs.get("_request_options") or {}
+        mask = (request_options.get("headers") or {}).get("X-Fields")
+        args = {
+            key: value for key, value in kwargs.items() if key != "_request_options"
+        }
+        return (operation_id, _normalize(args), _normalize_mask(mask), scope)
+
+    def _lookup(self, key):
+        """Return the cached response and its age, dropping it if it can't be used anymore.
+
+        Must be called with the lock held.
+        """
+        try:
+            stored_at, response = self._entries[key]
+        except KeyError:
+            return None, None
+        age = time.monotonic() - stored_at
+        usable_for = self.get_ttl(key[0]) + max(
+            self.stale_while_revalidate, self.stale_if_error
+        )
+        if age >= usable_for:
+            del self._entries[key]
+            return None, None
+        self._entries.move_to_end(key)
+        return response, age
+
+    def get(self, key):
+        """Return the fresh cached response for this key, or ``None`` if there is none.
+
+        Args:
+            key (tuple): the cache key, see :meth:`make_key`
+
+        Returns:
+            FASJSONResponse: the cached response
+        """
+        with self._lock:
+            response, age = self._lookup(key)
+            if response is None or age >= self.get_ttl(key[0]):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(response)
+
+    def set(self, key, response):
+        """Store a response in the cache.
+
+        Args:
+            key (tuple): the cache key, see :meth:`make_key`
+            response (FASJSONResponse): the response
+        """
+        with self._lock:
+            self._not_found.pop(key, None)
+            self._entries[key] = (time.monotonic(), copy.deepcopy(response))
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        """Remove the least recently used entries. Must be called with the lock held."""
+        while len(self._entries) + len(self._not_found) > self.maxsize:
+            # The not-found entries are the cheapest to get again.
+            if self._not_found:
+                self._not_found.popitem(last=False)
+            else:
+                self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def is_not_found(self, key):
+        """Tell whether the entity requested by this call is known not to exist.
+
+        Args:
+            key (tuple): the cache key, see :meth:`make_key`
+
+        Returns:
+            bool: ``True`` if the server replied with 404 Not Found less than
+            ``not_found_ttl`` seconds ago
+        """
+        with self._lock:
+            try:
+                expires_at = self._not_found[key]
+            except KeyError:
+                return False
+            if expires_at <= time.monotonic():
+                del self._not_found[key]
+                return False
+            self._not_found.move_to_end(key)
+            self.not_found_hits += 1
+            return True
+
+    def set_not_found(self, key):
+        """Remember that the entity requested by this call does not exist.
+
+        Args:
+            key (tuple): the cache key, see :meth:`make_key`
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            if self.not_found_ttl <= 0:
+                return
+            self._not_found[key] = time.monotonic() + self.not_found_ttl
+            self._not_found.move_to_end(key)
+            self._evict()
+
+    def _store(self, key, response):
+        # The get_*_or_none() lookups return None when the entity does not exist.
+        if response is None:
+            self.set_not_found(key)
+        else:
+            self.set(key, response)
+
+    def _start_fetch(self, key):
+        """Look up a response for :meth:`fetch` and :meth:`fetch_async`.
+
+        Returns:
+            tuple: the response to return right away or ``None``, whether a background refresh
+            must be started, and the stale response to use on error or ``None``
+        """
+        with self._lock:
+            response, age = self._lookup(key)
+            if response is None:
+                self.misses += 1
+                return None, False, None
+            ttl = self.get_ttl(key[0])
+            if age < ttl:
+                self.hits += 1
+                return copy.deepcopy(response), False, None
+            if age < ttl + self.stale_while_revalidate:
+                self.stale_hits += 1
+                refresh = key not in self._refreshing
+                self._refreshing.add(key)
+                return _mark_stale(response), refresh, None
+            # Responses that can't be used on error have been dropped by _lookup().
+            self.misses += 1
+            return None, False, response
+
+    def _on_error(self, key, error, stale_response):
+        """Return the stale response to use instead of raising the error, if any."""
+        if _is_not_found(error):
+            self.set_not_found(key)
+            return None
+        if stale_response is None:
+            return None
+        # Client errors such as 404 are valid answers, they must not be hidden.
+        if isinstance(error, APIError) and error.code is not None and error.code < 500:
+            return None
+        _log.warning("Using a stale response for %s: %s", key[0], error)
+        with self._lock:
+            self.stale_errors += 1
+        return _mark_stale(stale_response)
+
+    def _end_refresh(self, key, response=None, error=None):
+        with self._lock:
+            self._refreshing.discard(key)
+        if error is None:
+            self._store(key, response)
+        elif _is_not_found(error):
+            self.set_not_found(key)
+        else:
+            _log.warning(
+                "Could not refresh the cached response for %s: %s", key[0], error
+            )
+
+    def fetch(self, key, call, errors=(OSError,)):
+        """Return the response for this key, calling the server when necessary.
+
+        Args:
+            key (tuple): the cache key, see :meth:`make_key`
+            call (callable): the function that calls the server and returns the response
+            errors (tuple): the exceptions raised by ``call()`` when the server can't be reached.
+                The server errors (5xx), the open circuit breaker and the exceeded deadlines
+                are handled too.
+
+        Returns:
+            FASJSONResponse: the response
+
+        Raises:
+            APIError: if the API doesn't return a successful response and no stale response
+                can be used instead
+        """
+        response, refresh, stale_response = self._start_fetch(key)
+        if refresh:
+            threading.Thread(
+                target=self._refresh, args=(key, call, errors), daemon=True
+            ).start()
+        if response is not None:
+            return response
+        try:
+            response = call()
+        except UNAVAILABLE_ERRORS + errors as e:
+            response = self._on_error(key, e, stale_response)
+            if response is None:
+                raise
+            return response
+        self._store(key, response)
+        return response
+
+    def _refresh(self, key, call, errors):
+        try:
+            response = call()
+        except UNAVAILABLE_ERRORS + errors as e:
+            self._end_refresh(key, error=e)
+        else:
+            self._end_refresh(key, response)
+
+    async def fetch_async(self, key, call, errors):
+        """Return the response for this key, calling the server when necessary.
+
+        This is the asynchronous version of :meth:`fetch`, ``call()`` must return an awaitable.
+        """
+        response, refresh, stale_response = self._start_fetch(key)
+        if refresh:
+            task = asyncio.ensure_future(self._refresh_async(key, call, errors))
+            # Keep a reference to the task until it is done.
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if response is not None:
+            return response
+        try:
+            response = await call()
+        except UNAVAILABLE_ERRORS + errors as e:
+            response = self._on_error(key, e, stale_response)
+            if response is None:
+                raise
+            return response
+        self._store(key, response)
+        return response
+
+    async def _refresh_async(self, key, call, errors):
+        try:
+            response = await call()
+        except UNAVAILABLE_ERRORS + errors as e:
+            self._end_refresh(key, error=e)
+        else:
+            self._end_refresh(key, response)
+
+    def invalidate(self, operation_id, **kwargs):
+        """Remove cached responses.
+
+        Without arguments, all the responses to the operation are removed. The responses are
+        removed for all the clients sharing the cache.
+
+        Args:
+            operation_id (str): the operation id, for example ``get_user``
+            **kwargs: the arguments of the call whose response must be removed
+
+        Returns:
+            int: the number of removed responses
+        """
+        key_args = self.make_key(operation_id, kwargs)[:2] if kwargs else None
+        removed = 0
+        with self._lock:
+            for entries in (self._entries, self._not_found):
+                keys = [
+                    key
+                    for key in entries
+                    if key[0] == operation_id and key_args in (None, key[:2])
+                ]
+                for key in keys:
+                    del entries[key]
+                removed += len(keys)
+        return removed
+
+    def clear(self):
+        """Remove all the cached responses."""
+        with self._lock:
+            self._entries.clear()
+            self._not_found.clear()
+
+    def stats(self):
+        """Return the cache statistics.
+
+        Returns:
+            dict: the numbers of ``hits``, ``misses``, ``evictions``, ``stale_hits``,
+            ``stale_errors`` and ``not_found_hits``, and the current ``size`` of the cache
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_hits": self.stale_hits,
+                "stale_errors": self.stale_errors,
+                "not_found_hits": self.not_found_hits,
+                "size": len(self._entries) + len(self._not_found),
+            }
@@ -0,0 +1,248 @@
+"""A circuit breaker failing fast while the server is down.
+
+Instead of waiting for every request to time out during an outage, the calls fail right away
+with a :class:`fasjson_client.errors.CircuitOpenError` once the server has failed too often.
+After a while, a few probe requests are let through to find out whether it is back.
+"""
+
+import collections
+import errno
+import logging
+import threading
+import time
+
+from .errors import APIError, CircuitOpenError
+
+
+_log = logging.getLogger(__name__)
+
+#: The state of the circuit when the requests are sent.
+CLOSED = "closed"
+#: The state of the circuit when the requests fail without being sent.
+OPEN = "open"
+#: The state of the circuit when probe requests are sent to check whether the server is back.
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """Stop sending requests to the server for a while when it fails too often.
+
+    Connection errors, timeouts and server errors (5xx) count as failures. The other responses,
+    including client errors such as ``404 Not Found``, show that the server is up.
+
+    The circuit opens after ``failure_threshold`` consecutive failures, or when the failure
+    rate of the last ``window_size`` calls reaches ``failure_rate``. While it is open, the calls
+    raise :class:`fasjson_client.errors.CircuitOpenError`. After ``reset_timeout`` seconds, the
+    circuit is half-open: the next ``half_open_max_calls`` calls are sent as probes, and the
+    others still fail fast. The circuit closes if the probes succeed, and opens again if one of
+    them fails.
+
+    Args:
+        failure_threshold (int): the number of consecutive failures opening the circuit, or
+            ``None`` to only use the failure rate
+        failure_rate (float): the failure rate opening the circuit, between 0 and 1, or
+            ``None`` to only count the consecutive failures
+        window_size (int): the number of recent calls the failure rate is computed on
+        min_calls (int): the minimum number of recent calls for the failure rate to apply
+        reset_timeout (float): the number of seconds during which the circuit stays open
+        half_open_max_calls (int): the number of probe calls sent while the circuit is half-open
+        on_state_change (callable): called with the old state and the new state of the circuit
+            when it changes
+    """
+
+    def __init__(
+        self,
+        failure_threshold=5,
+        failure_rate=None,
+        window_size=20,
+        min_calls=10,
+        reset_timeout=30,
+        half_open_max_calls=1,
+        on_state_change=None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.on_state_change = on_state_change
+        #: The number of times the circuit opened.
+        self.opened = 0
+        #: The number of calls that failed fast because the circuit was open.
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._outcomes = collections.deque(maxlen=window_size)
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self):
+        """The state of the circuit: :data:`CLOSED`, :data:`OPEN` or :data:`HALF_OPEN`."""
+        return self._state
+
+    def is_failure(self, error):
+        """Tell whether an error shows that the server is failing.
+
+        Args:
+            error (Exception): the error raised by the call
+
+        Returns:
+            bool: ``True`` for the server errors and the other errors, such as connection errors
+        """
+        if isinstance(error, APIError):
+            return error.code is not None and error.code >= 500
+        return True
+
+    def _set_state(self, state):
+        """Change the state of the circuit. Must be called with the lock held.
+
+        Returns:
+            tuple: the old and the new state, or ``None`` if the state did not change
+        """
+        if state == self._state:
+            return None
+        old_state, self._state = self._state, state
+        self._probes = self._probe_successes = 0
+        if state == OPEN:
+            self.opened += 1
+            self._opened_at = time.monotonic()
+        else:
+            self._outcomes.clear()
+            self._consecutive_failures = 0
+        return old_state, state
+
+    def _notify(self, transition):
+        if transition is None:
+            return
+        old_state, new_state = transition
+        log = _log.warning if new_state == OPEN else _log.info
+        log("The circuit breaker went from %s to %s", old_state, new_state)
+        if self.on_state_change is not None:
+            self.on_state_change(old_state, new_state)
+
+    def _before_call(self):
+        """Let the call through, or raise ``CircuitOpenError``."""
+        transition = None
+        with self._lock:
+            if self._state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        "the server failed too often, not sending the request",
+                        errno.EAGAIN,
+                        data={"retry_after": remaining},
+                    )
+                transition = self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        "the server is being probed, not sending the request",
+                        errno.EAGAIN,
+                        data={"retry_after": 0},
+                    )
+                self._probes += 1
+        self._notify(transition)
+
+    def _should_open(self):
+        if (
+            self.failure_threshold is not None
+            and self._consecutive_failures >= self.failure_threshold
+        ):
+            return True
+        if self.failure_rate is None or len(self._outcomes) < self.min_calls:
+            return False
+        return self._outcomes.count(False) / len(self._outcomes) >= self.failure_rate
+
+    def _after_call(self, success):
+        """Record the outcome of a call: ``True``, ``False``, or ``None`` if it is unknown."""
+        transition = None
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes -= 1
+                if success is False:
+                    transition = self._set_state(OPEN)
+                elif success:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_max_calls:
+                        transition = self._set_state(CLOSED)
+            elif self._state == CLOSED and success is not None:
+                self._outcomes.append(success)
+                self._consecutive_failures = (
+                    0 if success else self._consecutive_failures + 1
+                )
+                if self._should_open():
+                    transition = self._set_state(OPEN)
+        self._notify(transition)
+
+    def call(self, send, errors=(OSError,)):
+        """Call ``send()``, unless the circuit is open.
+
+        Args:
+            send (callable): the function sending the request
+            errors (tuple): the exceptions raised by ``send()`` when the server can't be
+                reached, in addition to :class:`fasjson_client.errors.APIError`
+
+        Returns:
+            the result of ``send()``
+
+        Raises:
+            CircuitOpenError: if the circuit is open
+        """
+        self._before_call()
+        success = None
+        try:
+            result = send()
+            success = True
+        except (APIError,) + errors as e:
+            success = not self.is_failure(e)
+            raise
+        finally:
+            self._after_call(success)
+        return result
+
+    async def call_async(self, send, errors):
+        """Await ``send()``, unless the circuit is open.
+
+        This is the asynchronous version of :meth:`call`.
+        """
+        self._before_call()
+        success = None
+        try:
+            result = await send()
+            success = True
+        except (APIError,) + errors as e:
+            success = not self.is_failure(e)
+            raise
+        finally:
+            self._after_call(success)
+        return result
+
+    def reset(self):
+        """Close the circuit and forget the recent failures."""
+        with self._lock:
+            transition = self._set_state(CLOSED)
+            self._outcomes.clear()
+            self._consecutive_failures = 0
+        self._notify(transition)
+
+    def stats(self):
+        """Return the state of the circuit and its statistics.
+
+        Returns:
+            dict: the ``state`` of the circuit, the numbers of ``recent_calls`` and
+            ``recent_failures`` it is judged on, the number of times it ``opened``, and the
+            number of ``rejected`` calls
+        """
+        with self._lock:
+            return {
+                "state": self._state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": self._outcomes.count(False),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
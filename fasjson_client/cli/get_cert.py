@@ -21,10 +21,31 @@ from cryptography.x509.oid import NameOID
 from fasjson_client import Client
 from fasjson_client.config import conf
 from fasjson_client.errors import ClientError, APIError
+from fasjson_client.retry import RetryPolicy
+from fasjson_client.spec import DEFAULT_SPEC_CACHE_TTL
 
 
 KEY_SIZE = 2048
 
+# The options of the http section of the configuration that are passed to the client.
+HTTP_OPTIONS = (
+    "pool_maxsize",
+    "pool_block",
+    "timeout",
+    "connect_timeout",
+    "keep_alive",
+)
+
+# The options of the retry section of the configuration that are passed to the retry policy.
+RETRY_OPTIONS = (
+    "max_attempts",
+    "backoff",
+    "max_backoff",
+    "jitter",
+    "statuses",
+    "respect_retry_after",
+)
+
 log = logging.getLogger(__name__)
 
 
@@ -114,6 +135,34 @@ def _load_cert_from_base64(data):
     return x509.load_pem_x509_certificate(pem, default_backend())
 
 
+def _make_client(url):
+    """Build a FASJSON client using the settings from the configuration file
+
+    Args:
+        url (str): the URL to the FASJSON instance
+
+    Returns:
+        fasjson_client.Client: the client
+    """
+    spec_cache = conf["spec-cache"]
+    kwargs = {}
+    if spec_cache.get("enabled", False):
+        kwargs["spec_cache"] = spec_cache.get("path") or True
+        kwargs["spec_cache_ttl"] = spec_cache.get("ttl", DEFAULT_SPEC_CACHE_TTL)
+    cookie_jar = conf["cookie-jar"]
+    if cookie_jar.get("enabled", False):
+        kwargs["cookie_jar"] = cookie_jar.get("path") or True
+    kwargs.update(
+        (key, value) for key, value in conf["http"].items() if key in HTTP_OPTIONS
+    )
+    retry = conf["retry"]
+    if retry.get("enabled"):
+        kwargs["retry"] = RetryPolicy(
+            **{key: value for key, value in retry.items() if key in RETRY_OPTIONS}
+        )
+    return Client(url, **kwargs)
+
+
 def _sign_request(csr, username, url):
     """Sign a CSR by sending it to FASJSON
 
@@ -125,7 +174,7 @@ def _sign_request(csr, username, url):
     Returns:
         x509.Certificate: the signed certificate
     """
-    client = Client(url)
+    client = _make_client(url)
     csr_text = csr.public_bytes(encoding=serialization.Encoding.PEM).decode("ascii")
     try:
         response = client.sign_csr(user=username, csr=csr_text)
@@ -149,17 +198,16 @@ def _get_existing(username, url):
         x509.Certificate: the existing certificate
     """
     try:
-        client = Client(url)
+        client = _make_client(url)
     except ClientError as e:
         raise click.ClickException("could not get existing certificate ({}).".format(e))
 
     try:
-        response = client.get_user(username=username)
+        response = client.get_user_or_none(username=username)
     except APIError as e:
-        if e.code == 404:
-            raise click.ClickException("user {} not found.".format(username))
-        else:
-            raise click.ClickException(str(e))
+        raise click.ClickException(str(e))
+    if response is None:
+        raise click.ClickException("user {} not found.".format(username))
 
     certificates = response.result["certificates"]
     if not certificates:
@@ -1,6 +1,12 @@
+import collections
 import errno
+import itertools
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from urllib.parse import urljoin, urlsplit
 
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
 from requests.exceptions import RequestException
 
 # InvalidJSONError was added in requests 2.26.0.  RHEL 9 only has requests
@@ -13,44 +19,306 @@ except ImportError:  # pragma: no cover
         pass
 
 
-from bravado import requests_client
-from bravado.client import SwaggerClient, CallableOperation
+from bravado.client import SwaggerClient, CallableOperation, construct_request
+from bravado.config import RequestConfig
 from bravado.exception import HTTPError
+from bravado.swagger_model import request
+from bravado.warning import warn_for_deprecated_op
 from swagger_spec_validator.common import SwaggerValidationError
 
+from .bulk import BulkResult, get_lookup, unique
+from .cache import ResponseCache
+from .circuit import CircuitBreaker
+from .coalescing import RequestCoalescer
+from .cookies import PersistentCookieJar
+from .cursor import EntityCrawl, start_crawl
+from .endpoints import EndpointPool, rebase_request
 from .gss_http import GssapiAuthenticator
-from .errors import ClientSetupError
+from .hedge import Hedger
+from .http_client import PooledRequestsClient, make_http_adapter
+from .loader import EntityLoader
+from .prefetch import PagePrefetcher
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .errors import ClientError, ClientSetupError
 from .response import ResponseWrapper
 from .formats import mask_format
+from .shards import Shard, make_shards
+from .spec import (
+    SpecCache,
+    DEFAULT_SPEC_CACHE_TTL,
+    load_local_spec,
+    spec_checksum,
+    spec_registry,
+)
+from .timeouts import Deadline, get_operation_timeouts
+
+_log = logging.getLogger(__name__)
+
+
+class BoundOperation(CallableOperation):
+    """A callable operation that uses its own HTTP client instead of the spec's.
+
+    This allows multiple clients with different sessions and authentication to share the same
+    parsed spec.
+
+    Args:
+        operation (bravado_core.operation.Operation): the bravado operation to wrap
+        http_client (bravado.http_client.HttpClient): the HTTP client to use
+    """
+
+    def __init__(self, operation, http_client, also_return_response=False):
+        super().__init__(operation, also_return_response=also_return_response)
+        self.http_client = http_client
+
+    def __call__(self, **op_kwargs):
+        # The request options are not logged, their headers may hold credentials.
+        _log.debug(
+            "%s(%s)",
+            self.operation.operation_id,
+            {k: v for k, v in op_kwargs.items() if k != "_request_options"},
+        )
+        warn_for_deprecated_op(self.operation)
+        request_options = op_kwargs.pop("_request_options", {})
+        request_config = RequestConfig(request_options, self.also_return_response)
+        request_params = construct_request(self.operation, request_options, **op_kwargs)
+        if "api_url" in request_options:
+            rebase_request(request_params, self.operation, request_options["api_url"])
+        return self.http_client.request(
+            request_params,
+            operation=self.operation,
+            request_config=request_config,
+        )
+
+
+def _config_key(config):
+    return tuple(
+        sorted(
+            (key, tuple(value) if isinstance(value, list) else value)
+            for key, value in config.items()
+        )
+    )
 
 
 class Client:
     """FASJSON client class that builds API methods based on openapi specs.
 
     Args:
-        url (str): the URL to the FASJSON instance
+        url (str or list): the URL to the FASJSON instance, or the URLs to its replicas. The
+            requests are then spread over the replicas, favouring the fastest ones, and the
+            read requests failing on a replica are sent to another one. See
+            :class:`fasjson_client.endpoints.EndpointPool`.
         principal (str): the Kerberos principal to use for authentication
         api_version (int): the FASJSON API version to use
         bravado_config (dict): additional configuration to pass down to bravado
         auth (bool): whether or not the client should use auth. only for testing.
+        spec_cache (bool or str): cache the API spec on disk. Set it to ``True`` to use the
+            default cache directory, or to the path of the directory to use.
+        spec_cache_ttl (int): the number of seconds during which the cached spec is used
+            without checking with the server.
+        spec (str): build the client from a local spec instead of downloading it. Set it to
+            ``"bundled"`` to use the spec shipped with this package, or to the path of a JSON
+            file.
+        spec_check (bool): when using a local spec, compare it with the server's spec in the
+            background the first time the client is used, and log a warning if they differ.
+        lazy (bool): don't load the spec until the client is used. Setup errors are then
+            raised on first use.
+        shared_spec (bool): share the parsed spec with the other clients of this process that
+            use the same URL, API version and bravado configuration. Each client still has its
+            own HTTP session and authentication.
+        opportunistic_auth (bool): send the Kerberos token with the first request instead of
+            waiting for the server's challenge, saving a round trip.
+        cookie_jar (bool, str or http.cookiejar.CookieJar): store the session cookies sent by
+            the server in a file, so that other clients and later runs can reuse the session
+            without negotiating again. Set it to ``True`` to use the default file of the
+            principal, to the path of the file to use, or to a cookie jar to share it with other
+            clients authenticating as the same principal. The cookies are always reused for the
+            lifetime of the client.
+        pool_connections (int): the number of hosts to keep connection pools for
+        pool_maxsize (int): the maximum number of connections kept open to the server. Set it
+            at least to the number of threads using the client at the same time.
+        pool_block (bool): when all the connections are busy, wait for one to be available
+            instead of opening a new one that will be discarded afterwards
+        http_adapter (requests.adapters.HTTPAdapter): the adapter holding the connection pool,
+            to share it with other clients. The other pool arguments are then ignored. See
+            :func:`fasjson_client.http_client.make_http_adapter`.
+        timeout (float): the default number of seconds to wait for the server to send data.
+            No timeout by default.
+        connect_timeout (float): the default number of seconds to wait for a connection to the
+            server. No timeout by default.
+        keep_alive (bool): whether to keep the connections open between requests
+        response_cache (bool or fasjson_client.cache.ResponseCache): cache the responses to the
+            read operations. Set it to ``True`` to use a cache with the default settings, or
+            pass a cache to configure it or share it with other clients.
+        coalesce_requests (bool): share one request between the identical read calls made
+            while it is in flight, for example by several threads missing the cache at once.
+        prefetch_pages (int or fasjson_client.prefetch.PagePrefetcher): the number of pages to
+            fetch in the background when a paginated response is returned, so that
+            ``next_page()`` doesn't wait for the server. Disabled by default. Pass a prefetcher to
+            configure it further.
+        retry (bool or fasjson_client.retry.RetryPolicy): retry the read operations that fail
+            with a transient error, such as a connection error or a 503 Service Unavailable
+            response. Set it to ``True`` to use the default policy, or pass a policy to
+            configure it.
+        circuit_breaker (bool or fasjson_client.circuit.CircuitBreaker): stop sending requests
+            for a while when the server fails too often, raising
+            :class:`fasjson_client.errors.CircuitOpenError` instead. Set it to ``True`` to use
+            the default settings, or pass a circuit breaker to configure it or share it with
+            other clients.
+        rate_limit (float or fasjson_client.ratelimit.RateLimiter): the maximum number of
+            requests per second sent by the threads using the client. No limit by default. Pass
+            a limiter to set the burst size, or to share it with other clients or processes.
+        operation_timeouts (dict): the timeouts of some operations, keyed by operation id, to
+            use instead of ``timeout`` and ``connect_timeout``. A timeout is either the number
+            of seconds to wait for the server to send data, or a
+            ``(connect_timeout, timeout)`` tuple.
+        hedge (bool or fasjson_client.hedge.Hedger): send a duplicate of the read requests
+            that are slower than usual, and use the first response to arrive. Set it to
+            ``True`` to hedge the requests slower than 95% of the recent ones, or pass a hedger
+            to configure it.
     """
 
     def __init__(
-        self, url, principal=None, api_version=1, bravado_config=None, auth=True
+        self,
+        url,
+        principal=None,
+        api_version=1,
+        bravado_config=None,
+        auth=True,
+        spec_cache=None,
+        spec_cache_ttl=DEFAULT_SPEC_CACHE_TTL,
+        spec=None,
+        spec_check=True,
+        lazy=False,
+        shared_spec=False,
+        opportunistic_auth=False,
+        cookie_jar=None,
+        pool_connections=DEFAULT_POOLSIZE,
+        pool_maxsize=DEFAULT_POOLSIZE,
+        pool_block=DEFAULT_POOLBLOCK,
+        http_adapter=None,
+        timeout=None,
+        connect_timeout=None,
+        keep_alive=True,
+        response_cache=None,
+        coalesce_requests=False,
+        prefetch_pages=0,
+        retry=None,
+        circuit_breaker=None,
+        rate_limit=None,
+        operation_timeouts=None,
+        hedge=None,
     ):
-        self._base_url = url
+        self._api = None
+        self._ops = None
+        self._http_client = None
+        self._setup_lock = threading.Lock()
+        self._spec = spec
+        self._spec_check_pending = spec is not None and spec_check
+        self._spec_check_thread = None
+        urls = [url] if isinstance(url, str) else list(url)
+        self._base_url = urls[0]
         if not self._base_url.endswith("/"):
             self._base_url += "/"
         self._principal = principal
         self._api_version = api_version
+        #: The pool of the replicas the requests are spread over, or ``None`` if there is one.
+        self.endpoint_pool = (
+            EndpointPool(urls, api_version=api_version) if len(urls) > 1 else None
+        )
         self._bravado_config = bravado_config or {}
         self._auth = auth
+        self._opportunistic_auth = opportunistic_auth
+        if cookie_jar is True:
+            cookie_jar = PersistentCookieJar(principal=principal)
+        elif isinstance(cookie_jar, str):
+            cookie_jar = PersistentCookieJar(cookie_jar)
+        elif cookie_jar is False:
+            cookie_jar = None
+        self._cookie_jar = cookie_jar
+        self._http_adapter = http_adapter or make_http_adapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        self._operation_timeouts = operation_timeouts
+        self._keep_alive = keep_alive
+        if response_cache is True:
+            response_cache = ResponseCache()
+        elif response_cache is False:
+            response_cache = None
+        #: The cache of the responses, or ``None`` if they are not cached.
+        self.response_cache = response_cache
+        #: The coalescer of the identical requests, or ``None`` if they are not coalesced.
+        self.request_coalescer = RequestCoalescer() if coalesce_requests else None
+        #: The prefetcher of the next pages, or ``None`` if they are not prefetched.
+        if isinstance(prefetch_pages, PagePrefetcher):
+            self.page_prefetcher = prefetch_pages
+        else:
+            self.page_prefetcher = (
+                PagePrefetcher(prefetch_pages) if prefetch_pages else None
+            )
+        #: The policy retrying the failed read requests, or ``None`` if they are not retried.
+        self.retry_policy = RetryPolicy() if retry is True else retry or None
+        #: The circuit breaker, or ``None`` if the calls never fail fast.
+        self.circuit_breaker = (
+            CircuitBreaker() if circuit_breaker is True else circuit_breaker or None
+        )
+        #: The limiter throttling the requests, or ``None`` if they are not throttled.
+        if isinstance(rate_limit, RateLimiter):
+            self.rate_limiter = rate_limit
+        else:
+            self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        #: The hedger of the slow read requests, or ``None`` if they are not hedged.
+        self.hedger = Hedger() if hedge is True else hedge or None
+        if spec_cache:
+            cache_path = None if spec_cache is True else spec_cache
+            self._spec_cache = SpecCache(cache_path, ttl=spec_cache_ttl)
+        else:
+            self._spec_cache = None
         # self._bravado_config.setdefault("disable_fallback_results", True)
         # Register the mask format
         self._bravado_config.setdefault("formats", []).append(mask_format)
+        if shared_spec:
+            self._registry_key = (
+                self._spec_url,
+                self._spec,
+                _config_key(self._bravado_config),
+            )
+            try:
+                hash(self._registry_key)
+            except TypeError:
+                raise ValueError(
+                    "The bravado configuration must only contain hashable values "
+                    "to share the spec"
+                )
+        else:
+            self._registry_key = None
+
+        if not lazy:
+            self._setup()
+
+    def _setup(self):
+        """Load the spec and build the operations, if it hasn't been done yet.
 
-        self._api = self._make_bravado_client()
-        self._ops = self._make_ops_map()
+        Raises:
+            ClientSetupError: if the client could not be set up
+        """
+        if self._ops is not None:
+            return
+        with self._setup_lock:
+            if self._ops is not None:
+                return
+            self._http_client = self._make_http_client()
+            if self._registry_key is None:
+                self._api = self._make_bravado_client()
+            else:
+                self._api = spec_registry.get(
+                    self._registry_key, self._make_bravado_client
+                )
+            self._ops = self._make_ops_map()
 
     @property
     def operations(self):
@@ -59,25 +327,98 @@ class Client:
         Returns:
             list(str): available operation names
         """
+        self._setup()
         return list(self._ops)
 
     @property
     def _spec_url(self):
         return urljoin(self._base_url, f"specs/v{self._api_version}.json")
 
-    def _make_bravado_client(self):
-        http_client = requests_client.RequestsClient()
+    @property
+    def _endpoint_urls(self):
+        if self.endpoint_pool is None:
+            return [self._base_url]
+        return [endpoint.url for endpoint in self.endpoint_pool.endpoints]
+
+    def _load_local_spec(self):
+        return load_local_spec(self._spec, self._base_url, self._api_version)
+
+    def _make_http_client(self):
+        http_client = PooledRequestsClient(
+            http_adapter=self._http_adapter,
+            timeout=self._timeout,
+            connect_timeout=self._connect_timeout,
+            keep_alive=self._keep_alive,
+        )
+        if self._cookie_jar is not None:
+            http_client.session.cookies = self._cookie_jar
         server_hostname = urlsplit(self._base_url).netloc
         if self._auth:
             http_client.authenticator = GssapiAuthenticator(
-                server_hostname, principal=self._principal
+                server_hostname,
+                principal=self._principal,
+                opportunistic_auth=self._opportunistic_auth,
+                other_hosts=[urlsplit(url).netloc for url in self._endpoint_urls[1:]],
+                cookie_jar=(
+                    self._cookie_jar
+                    if isinstance(self._cookie_jar, PersistentCookieJar)
+                    else None
+                ),
             )
+        return http_client
+
+    @property
+    def authenticator(self):
+        """The authenticator used by this client, or ``None`` if auth is disabled.
+
+        Its ``challenges_avoided`` and ``challenges_received`` attributes count the effect of
+        opportunistic authentication.
+        """
+        self._setup()
+        return self._http_client.authenticator
+
+    def _make_bravado_client(self):
+        if self._spec is not None:
+            return self._load_bravado_client(self._spec_url)
+        # The spec is loaded from the first replica that can be reached.
+        spec_urls = [
+            urljoin(url, f"specs/v{self._api_version}.json")
+            for url in self._endpoint_urls
+        ]
+        for spec_url in spec_urls[:-1]:
+            try:
+                return self._load_bravado_client(spec_url)
+            except ClientSetupError as e:
+                if e.code != errno.ECONNABORTED:
+                    raise
+                _log.warning("Could not load the spec from %s: %s", spec_url, e)
+        return self._load_bravado_client(spec_urls[-1])
+
+    def _load_bravado_client(self, spec_url):
+        http_client = self._http_client
+        local_spec = None if self._spec is None else self._load_local_spec()
         try:
-            api = SwaggerClient.from_url(
-                self._spec_url,
-                http_client=http_client,
-                config=self._bravado_config,
-            )
+            if local_spec is not None:
+                api = SwaggerClient.from_spec(
+                    local_spec,
+                    spec_url,
+                    http_client=http_client,
+                    config=self._bravado_config,
+                )
+            elif self._spec_cache is None:
+                api = SwaggerClient.from_url(
+                    spec_url,
+                    http_client=http_client,
+                    config=self._bravado_config,
+                )
+            else:
+                spec_dict = self._spec_cache.load(http_client, spec_url)
+                api = SwaggerClient.from_spec(
+                    spec_dict,
+                    spec_url,
+                    http_client=http_client,
+                    config=self._bravado_config,
+                )
         except (ValueError, InvalidJSONError) as e:
             raise ClientSetupError(
                 "remote data validation failed", errno.EPROTO, data={"exc": e}
@@ -104,22 +445,268 @@ class Client:
         ops = {}
         for res_name, res in self._api.swagger_spec.resources.items():
             for op_name, op in res.operations.items():
-                ops[op_name] = ResponseWrapper(CallableOperation(op))
+                ops[op_name] = ResponseWrapper(
+                    BoundOperation(op, self._http_client),
+                    cache=self.response_cache,
+                    coalescer=self.request_coalescer,
+                    prefetcher=self.page_prefetcher,
+                    retry_policy=self.retry_policy,
+                    circuit_breaker=self.circuit_breaker,
+                    rate_limiter=self.rate_limiter,
+                    hedger=self.hedger,
+                    endpoint_pool=self.endpoint_pool,
+                    cache_scope=(self._base_url, self._principal),
+                    timeouts=get_operation_timeouts(
+                        self._operation_timeouts,
+                        op.operation_id,
+                        self._connect_timeout,
+                        self._timeout,
+                    ),
+                )
         return ops
 
+    def check_spec(self):
+        """Compare the local spec the client was built with to the server's spec.
+
+        Returns:
+            bool: whether the specs are identical, or ``None`` if one of the specs could not be
+            loaded.
+
+        Raises:
+            ValueError: if the client was not built from a local spec
+        """
+        if self._spec is None:
+            raise ValueError("The client was not built from a local spec")
+        self._setup()
+        try:
+            local_spec = self._load_local_spec()
+        except ClientSetupError as e:
+            _log.warning("Could not load the local spec: %s", e)
+            return None
+        try:
+            response = request(self._http_client, self._spec_url, {}).result()
+            remote_spec = response.json()
+        except (HTTPError, RequestException, ValueError) as e:
+            _log.warning("Could not retrieve the spec from %s: %s", self._spec_url, e)
+            return None
+        if spec_checksum(remote_spec) == spec_checksum(local_spec):
+            return True
+        _log.warning(
+            "The local spec (version %s) differs from the spec at %s (version %s), "
+            "you may need to update fasjson-client.",
+            local_spec.get("info", {}).get("version"),
+            self._spec_url,
+            remote_spec.get("info", {}).get("version"),
+        )
+        return False
+
+    def close(self):
+        """Stop the background threads prefetching the pages and hedging the requests.
+
+        The client can still be used afterwards, the threads are started again when needed.
+        """
+        if self.page_prefetcher is not None:
+            self.page_prefetcher.close()
+        if self.hedger is not None:
+            self.hedger.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def _check_spec_on_first_use(self):
+        if not self._spec_check_pending:
+            return
+        self._spec_check_pending = False
+        self._spec_check_thread = threading.Thread(
+            target=self.check_spec, name="fasjson-spec-check", daemon=True
+        )
+        self._spec_check_thread.start()
+
     def __getattr__(self, name):
+        # The operations are never private. Private and special names are looked up by copy,
+        # pickle, hasattr() or mocks, and must not set the client up.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        self._setup()
+        self._check_spec_on_first_use()
         try:
             return self._ops[name]
         except KeyError:
-            raise AttributeError("No such operation: {!r}".format(name))
+            pass
+        # get_user_or_none() returns None instead of raising if the user does not exist.
+        if name.startswith("get_") and name.endswith("_or_none"):
+            try:
+                return self._ops[name[: -len("_or_none")]].call_or_none
+            except KeyError:
+                pass
+        raise AttributeError("No such operation: {!r}".format(name))
+
+    def resumable_list_all_entities(
+        self, entity_name, page_size=1000, cursor=None, checkpoint=None, **kwargs
+    ):
+        """Iterate over all the entities of a given type, in a way that can be resumed.
+
+        The pages are fetched one after the other. The position of the iteration is available in
+        the ``cursor`` attribute of the returned object, and iterating over it again after an
+        error resumes after the last page that was completely consumed.
+
+        Args:
+            entity_name (str): the plural name of the entity, for example ``users``
+            page_size (int): the number of entities per page
+            cursor (fasjson_client.cursor.Cursor or dict): the cursor of a previous iteration to
+                resume from
+            checkpoint (str): the path of a file where the cursor is saved after each page. If
+                the file exists, the iteration resumes from the cursor it holds. The file is
+                removed when the iteration is finished.
+            **kwargs: additional arguments for the list operation. They must be serializable to
+                JSON.
+
+        Returns:
+            EntityCrawl: the iteration, to use in a ``for`` loop
 
-    def list_all_entities(self, entity_name, page_size=1000, **kwargs):
+        Raises:
+            ValueError: if the cursor belongs to another iteration
+        """
+        cursor = start_crawl(entity_name, page_size, kwargs, cursor, checkpoint)
+        return EntityCrawl(self, cursor, checkpoint)
+
+    def get_shards(self, entity_name, count, page_size=1000, **kwargs):
+        """Split the iteration over all the entities of a given type into page ranges.
+
+        The number of pages is learned by requesting the first page. The shards can be
+        consumed by several processes or hosts with :meth:`iter_shard`.
+
+        Args:
+            entity_name (str): the plural name of the entity, for example ``users``
+            count (int): the number of shards. There are fewer shards if there are fewer pages.
+            page_size (int): the number of entities per page
+            **kwargs: additional arguments for the list operation
+
+        Returns:
+            list: the :class:`fasjson_client.shards.Shard` instances, in the order of the pages
+        """
+        operation = self._list_operation(entity_name)
+        response = operation(page_size=page_size, page_number=1, **kwargs)
+        return make_shards(
+            entity_name, page_size, response.page["total_pages"], count, kwargs
+        )
+
+    def iter_shard(self, shard):
+        """Iterate over the entities of a shard returned by :meth:`get_shards`.
+
+        Args:
+            shard (fasjson_client.shards.Shard or dict): the shard, or its ``_asdict()``
+                serialization
+
+        Yields:
+            dict: the entities, in the order of the pages
+        """
+        if isinstance(shard, dict):
+            shard = Shard(**shard)
+        operation = self._list_operation(shard.entity_name)
+        for page_number in range(shard.first_page, shard.last_page + 1):
+            response = operation(
+                page_size=shard.page_size, page_number=page_number, **shard.kwargs
+            )
+            yield from response.result
+
+    def _list_operation(self, entity_name):
+        """Return the operation listing the entities of a given type."""
+        self._setup()
+        self._check_spec_on_first_use()
         try:
-            operation = self._ops["list_{}".format(entity_name)]
+            return self._ops["list_{}".format(entity_name)]
         except KeyError:
             raise ValueError(
                 "No such entity: {}. Is it plural? It should be.".format(entity_name)
             )
+
+    def _iter_pages_concurrently(
+        self, operation, page_numbers, concurrency, max_buffered_pages, **kwargs
+    ):
+        """Fetch pages in a thread pool and yield the responses in order.
+
+        At most ``max_buffered_pages`` pages are being fetched or waiting to be consumed at any
+        given time.
+        """
+        page_numbers = iter(page_numbers)
+        pending = collections.deque()
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="fasjson-pages"
+        ) as executor:
+
+            def submit(page_number):
+                pending.append(
+                    executor.submit(
+                        operation,
+                        page_number=page_number,
+                        **kwargs,
+                    )
+                )
+
+            try:
+                for page_number in itertools.islice(page_numbers, max_buffered_pages):
+                    submit(page_number)
+                while pending:
+                    response = pending.popleft().result()
+                    for page_number in itertools.islice(page_numbers, 1):
+                        submit(page_number)
+                    yield response
+            finally:
+                # Don't fetch the remaining pages if the consumer stopped early.
+                for future in pending:
+                    future.cancel()
+
+    def list_all_entities(
+        self,
+        entity_name,
+        page_size=1000,
+        concurrency=1,
+        max_buffered_pages=None,
+        deadline=None,
+        **kwargs,
+    ):
+        """Iterate over all the entities of a given type, across all pages.
+
+        Args:
+            entity_name (str): the plural name of the entity, for example ``users``
+            page_size (int): the number of entities per page
+            concurrency (int): the number of pages to fetch in parallel. The first page is
+                always fetched alone to get the number of pages.
+            max_buffered_pages (int): when fetching pages in parallel, the maximum number of
+                pages being fetched or waiting to be consumed. Defaults to twice the
+                concurrency.
+            deadline (float or fasjson_client.timeouts.Deadline): the number of seconds, or the
+                deadline, before which all the pages must be fetched, retries included
+            **kwargs: additional arguments for the list operation
+
+        Yields:
+            dict: the entities, in the order of the pages
+
+        Raises:
+            DeadlineExceeded: if the deadline passes before the last page is fetched
+        """
+        if deadline is not None:
+            kwargs["_deadline"] = Deadline.make(deadline)
+        operation = self._list_operation(entity_name)
+        if concurrency > 1:
+            response = operation(page_size=page_size, page_number=1, **kwargs)
+            yield from response.result
+            responses = self._iter_pages_concurrently(
+                operation,
+                range(2, response.page["total_pages"] + 1),
+                concurrency,
+                max_buffered_pages or concurrency * 2,
+                page_size=page_size,
+                **kwargs,
+            )
+            for response in responses:
+                yield from response.result
+            return
         page_number = 0
         next_page_exists = True
         while next_page_exists:
@@ -127,3 +714,105 @@ class Client:
             response = operation(page_size=page_size, page_number=page_number, **kwargs)
             yield from response.result
             next_page_exists = page_number < response.page["total_pages"]
+
+    def iter_entities(
+        self, entity_name, names, concurrency=10, deadline=None, **kwargs
+    ):
+        """Look up many entities by name in parallel, yielding them as they arrive.
+
+        The errors are yielded instead of being raised, so that one failure does not stop the
+        other lookups. Duplicate names are only looked up once.
+
+        Args:
+            entity_name (str): the plural name of the entity, ``users`` or ``groups``
+            names (iterable): the names of the entities. It is consumed lazily, so it can be a
+                generator of any size.
+            concurrency (int): the number of lookups to run in parallel
+            deadline (float or fasjson_client.timeouts.Deadline): the number of seconds, or the
+                deadline, before which all the lookups must complete. The lookups that can't
+                complete in time get a :class:`fasjson_client.errors.DeadlineExceeded` error.
+            **kwargs: additional arguments for the lookup operation
+
+        Yields:
+            tuple: the name, the entity or ``None`` if it does not exist, and the exception
+            raised by the lookup or ``None``, in the order the lookups complete
+        """
+        self._setup()
+        self._check_spec_on_first_use()
+        operation, arg_name = get_lookup(self._ops, entity_name)
+        names = unique(names)
+        if deadline is not None:
+            kwargs["_deadline"] = Deadline.make(deadline)
+
+        def lookup(name):
+            try:
+                response = operation.call_or_none(**{arg_name: name}, **kwargs)
+            except (ClientError, OSError) as e:
+                return name, None, e
+            return name, None if response is None else response.result, None
+
+        pending = set()
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="fasjson-bulk"
+        ) as executor:
+            try:
+                for name in itertools.islice(names, concurrency):
+                    pending.add(executor.submit(lookup, name))
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for name in itertools.islice(names, 1):
+                            pending.add(executor.submit(lookup, name))
+                        yield future.result()
+            finally:
+                # Don't run the remaining lookups if the consumer stopped early.
+                for future in pending:
+                    future.cancel()
+
+    def get_entities(self, entity_name, names, concurrency=10, deadline=None, **kwargs):
+        """Look up many entities by name in parallel.
+
+        Args:
+            entity_name (str): the plural name of the entity, ``users`` or ``groups``
+            names (iterable): the names of the entities
+            concurrency (int): the number of lookups to run in parallel
+            deadline (float or fasjson_client.timeouts.Deadline): the number of seconds, or the
+                deadline, before which all the lookups must complete
+            **kwargs: additional arguments for the lookup operation
+
+        Returns:
+            BulkResult: the entities and the errors, keyed by name
+        """
+        result = BulkResult({}, {})
+        lookups = self.iter_entities(
+            entity_name, names, concurrency, deadline, **kwargs
+        )
+        for name, entity, error in lookups:
+            if error is None:
+                result.results[name] = entity
+            else:
+                result.errors[name] = error
+        return result
+
+    def get_users(self, usernames, concurrency=10, **kwargs):
+        """Look up many users in parallel, see :meth:`get_entities`."""
+        return self.get_entities("users", usernames, concurrency, **kwargs)
+
+    def get_groups(self, groupnames, concurrency=10, **kwargs):
+        """Look up many groups in parallel, see :meth:`get_entities`."""
+        return self.get_entities("groups", groupnames, concurrency, **kwargs)
+
+    def loader(self, entity_name, **kwargs):
+        """Build a loader that batches the lookups of single entities.
+
+        The lookups made through the loader within a short window are deduplicated and sent
+        together, in parallel.
+
+        Args:
+            entity_name (str): the plural name of the entity, ``users`` or ``groups``
+            **kwargs: the options of the loader, see :class:`fasjson_client.loader.EntityLoader`
+
+        Returns:
+            EntityLoader: the loader
+        """
+        return EntityLoader(self, entity_name, **kwargs)
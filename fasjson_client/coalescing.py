@@ -0,0 +1,126 @@
+"""Coalescing of identical API calls that are in flight at the same time."""
+
+import asyncio
+import copy
+import functools
+import threading
+from concurrent.futures import Future, TimeoutError
+
+
+class RequestCoalescer:
+    """Shares one request between the identical calls made while it is in flight.
+
+    The first call sends the request, the calls made before it completes wait for it and get a
+    copy of its result, or the same exception. It works for threads and for asyncio tasks alike.
+    """
+
+    def __init__(self):
+        #: The number of calls that waited for another call's request instead of sending one.
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._in_flight_async = {}
+
+    def _join(self, in_flight, key, make_future):
+        """Return the future of the call in flight and ``False``, or a new one and ``True``."""
+        with self._lock:
+            future = in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = in_flight[key] = make_future()
+            return future, True
+
+    def _leave(self, in_flight, key):
+        with self._lock:
+            del in_flight[key]
+
+    def call(self, key, send, deadline=None):
+        """Call ``send()``, unless an identical call is in flight.
+
+        Args:
+            key (tuple): the key identifying identical calls
+            send (callable): the function sending the request
+            deadline (fasjson_client.timeouts.Deadline): the deadline of the call. It bounds
+                the wait for the identical call in flight, which may have a later deadline.
+
+        Returns:
+            the result of ``send()``, or a copy of it for the calls that waited
+
+        Raises:
+            DeadlineExceeded: if the deadline passes while waiting for the identical call
+        """
+        future, leader = self._join(self._in_flight, key, Future)
+        if not leader:
+            try:
+                result = future.result(None if deadline is None else deadline.check())
+            except TimeoutError as e:
+                raise deadline.exceeded() from e
+            # The callers can't change each other's results.
+            return copy.deepcopy(result)
+        try:
+            result = send()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(self._in_flight, key)
+        future.set_result(result)
+        return result
+
+    async def call_async(self, key, send, deadline=None):
+        """Await ``send()``, unless an identical call is in flight.
+
+        This is the asynchronous version of :meth:`call`. The request runs in its own task, so
+        that cancelling one of the callers, even the first one, doesn't cancel it for the
+        others. It is only cancelled when all its callers are, or gave up waiting for it.
+        """
+        with self._lock:
+            flight = self._in_flight_async.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight_async[key] = _AsyncFlight(
+                    asyncio.ensure_future(send())
+                )
+                flight.task.add_done_callback(
+                    functools.partial(self._land_async, key, flight)
+                )
+            else:
+                self.coalesced += 1
+            flight.waiters += 1
+        try:
+            if deadline is None:
+                result = await asyncio.shield(flight.task)
+            else:
+                result = await asyncio.wait_for(
+                    asyncio.shield(flight.task), deadline.check()
+                )
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            with self._lock:
+                flight.waiters -= 1
+                abandoned = flight.waiters == 0
+                if abandoned and self._in_flight_async.get(key) is flight:
+                    # The next identical call sends a new request.
+                    del self._in_flight_async[key]
+            if abandoned:
+                flight.task.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise deadline.exceeded() from e
+            raise
+        return result if leader else copy.deepcopy(result)
+
+    def _land_async(self, key, flight, task):
+        with self._lock:
+            if self._in_flight_async.get(key) is flight:
+                del self._in_flight_async[key]
+        if not task.cancelled():
+            # The callers get the exception, don't complain if they were all cancelled.
+            task.exception()
+
+
+class _AsyncFlight:
+    """A request in flight for :meth:`RequestCoalescer.call_async`, and its number of callers."""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
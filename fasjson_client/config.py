@@ -44,6 +44,31 @@ DEFAULTS = {
     "url": "https://fasjson.os.fedoraproject.org",
     "verbose": False,
     "quiet": False,
+    "spec-cache": {
+        "enabled": False,
+        "path": None,
+        "ttl": 3600,
+    },
+    "cookie-jar": {
+        "enabled": False,
+        "path": None,
+    },
+    "http": {
+        "pool_maxsize": 10,
+        "pool_block": False,
+        "timeout": None,
+        "connect_timeout": None,
+        "keep_alive": True,
+    },
+    "retry": {
+        "enabled": False,
+        "max_attempts": 3,
+        "backoff": 0.5,
+        "max_backoff": 30,
+        "jitter": True,
+        "statuses": [429, 502, 503, 504],
+        "respect_retry_after": True,
+    },
     "get-cert": {
         "username": None,
         "existing": False,
@@ -55,10 +80,15 @@ DEFAULTS = {
 
 
 def _validate_url(value):
-    if not value.startswith("http://") and not value.startswith("https://"):
-        raise ConfigurationException(
-            "the url value must start with http:// or https://."
-        )
+    # A list holds the URLs to the replicas of the FASJSON instance.
+    urls = value if isinstance(value, list) else [value]
+    if not urls:
+        raise ConfigurationException("the url value must not be an empty list.")
+    for url in urls:
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            raise ConfigurationException(
+                "the url value must start with http:// or https://."
+            )
 
 
 VALIDATORS = {
@@ -0,0 +1,149 @@
+"""Persistence of the session cookies handed out by the FASJSON server.
+
+When FASJSON is deployed behind ``mod_auth_gssapi`` with sessions enabled, the server sets a
+session cookie after a successful Kerberos negotiation. Sending it back lets the server skip the
+negotiation until the session expires.
+"""
+
+import http.cookiejar
+import logging
+import os
+import tempfile
+import threading
+
+
+_log = logging.getLogger(__name__)
+
+#: The line of the cookie jar file recording the principal the cookies were issued to.
+PRINCIPAL_HEADER = "#Principal: "
+
+
+def default_cookie_jar_path(principal=None):
+    """Return the default path of the on-disk cookie jar.
+
+    It honors the ``XDG_CACHE_HOME`` environment variable.
+
+    Args:
+        principal (str): the Kerberos principal the client authenticates as, if it is not the
+            default one. Each principal gets its own file.
+
+    Returns:
+        str: the path to the cookie jar
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    if principal is None:
+        filename = "cookies.txt"
+    else:
+        filename = "cookies-{}.txt".format(principal.replace("/", "_"))
+    return os.path.join(cache_home, "fasjson-client", filename)
+
+
+class PersistentCookieJar(http.cookiejar.LWPCookieJar):
+    """A cookie jar that is loaded from a file and saved to it when its cookies change.
+
+    The file is only readable by its owner, since the cookies grant access to the server. Session
+    cookies are saved too, and expired cookies are dropped when the file is loaded.
+
+    The session cookies authenticate the requests as the principal they were issued to. The
+    file records that principal, and the cookies are dropped when the client authenticates as
+    another one, for example after ``kinit`` with another user.
+
+    Args:
+        path (str): the path to the file, defaults to :func:`default_cookie_jar_path`
+        principal (str): the Kerberos principal the client authenticates as, used to choose
+            the default path
+    """
+
+    def __init__(self, path=None, principal=None):
+        super().__init__(os.path.expanduser(path or default_cookie_jar_path(principal)))
+        #: The principal the cookies were issued to, or ``None`` if it is not known yet.
+        self.principal = None
+        self._save_lock = threading.Lock()
+        try:
+            self.load(ignore_discard=True)
+            self.principal = self._load_principal()
+        except FileNotFoundError:
+            pass
+        except (OSError, http.cookiejar.LoadError) as e:
+            _log.warning("Could not load the cookie jar %s: %s", self.filename, e)
+        self._saved_state = self._state()
+
+    def _load_principal(self):
+        with open(self.filename) as f:
+            f.readline()
+            line = f.readline().rstrip("\n")
+        if line.startswith(PRINCIPAL_HEADER):
+            return line.replace(PRINCIPAL_HEADER, "", 1)
+        return None
+
+    def as_lwp_str(self, ignore_discard=True, ignore_expires=True):
+        text = super().as_lwp_str(ignore_discard, ignore_expires)
+        if self.principal is None:
+            return text
+        return "{}{}\n{}".format(PRINCIPAL_HEADER, self.principal, text)
+
+    def _state(self):
+        return self.principal, {
+            (cookie.domain, cookie.path, cookie.name, cookie.value, cookie.expires)
+            for cookie in self
+        }
+
+    def set_principal(self, principal):
+        """Record the principal the client authenticates as, dropping the cookies of another one.
+
+        The cookies whose principal is unknown are dropped too.
+
+        Args:
+            principal (str): the name of the Kerberos credentials of the client
+        """
+        if principal == self.principal:
+            return
+        dropped = len(self) > 0
+        if dropped:
+            _log.debug(
+                "Dropping the session cookies of %s in %s",
+                self.principal or "an unknown principal",
+                self.filename,
+            )
+            self.clear()
+        with self._save_lock:
+            self.principal = principal
+            if not dropped:
+                # The principal is saved with the next cookies, there are none to save now.
+                self._saved_state = self._state()
+        if dropped:
+            self.save_if_changed()
+
+    def extract_cookies(self, response, request):
+        super().extract_cookies(response, request)
+        self.save_if_changed()
+
+    def save_if_changed(self):
+        """Save the cookies to the file if they changed since they were last saved or loaded.
+
+        Errors are logged and otherwise ignored: the cookies are only an optimization.
+        """
+        with self._save_lock:
+            state = self._state()
+            if state == self._saved_state:
+                return
+            try:
+                self._save_atomically()
+            except OSError as e:
+                _log.warning("Could not save the cookie jar %s: %s", self.filename, e)
+                return
+            self._saved_state = state
+
+    def _save_atomically(self):
+        directory = os.path.dirname(self.filename) or "."
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # The temporary file is created with 0600 permissions, and other processes never read a
+        # partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            self.save(tmp_path, ignore_discard=True)
+            os.replace(tmp_path, self.filename)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
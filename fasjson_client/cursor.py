@@ -0,0 +1,248 @@
+"""Resumable iteration over all the entities of a given type.
+
+The position of the iteration is kept in a :class:`Cursor` that can be serialized, and
+optionally saved to a file after each page, so that a long crawl interrupted by an error or a
+restart of the process can resume where it stopped instead of starting over.
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+
+_log = logging.getLogger(__name__)
+
+
+def _json_roundtrip(value):
+    return json.loads(json.dumps(value))
+
+
+class Cursor:
+    """The position of an iteration over all the entities of a given type.
+
+    Args:
+        entity_name (str): the plural name of the entity, for example ``users``
+        page_size (int): the number of entities per page
+        page_number (int): the number of the last page that was completely consumed
+        total_pages (int): the number of pages, ``None`` until the first page is fetched
+        kwargs (dict): additional arguments for the list operation. They must be serializable
+            to JSON.
+    """
+
+    def __init__(
+        self, entity_name, page_size=1000, page_number=0, total_pages=None, kwargs=None
+    ):
+        self.entity_name = entity_name
+        self.page_size = page_size
+        self.page_number = page_number
+        self.total_pages = total_pages
+        self.kwargs = kwargs or {}
+
+    def __repr__(self):
+        return "<Cursor {} page {}/{} of {} per page>".format(
+            self.entity_name, self.page_number, self.total_pages, self.page_size
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, Cursor) and self.to_dict() == other.to_dict()
+
+    @property
+    def finished(self):
+        """Whether all the pages were consumed."""
+        return self.total_pages is not None and self.page_number >= self.total_pages
+
+    def matches(self, entity_name, page_size, kwargs):
+        """Tell whether this cursor is the position of this iteration.
+
+        Args:
+            entity_name (str): the plural name of the entity
+            page_size (int): the number of entities per page
+            kwargs (dict): additional arguments for the list operation
+
+        Returns:
+            bool: ``True`` if the cursor was created for the same iteration
+        """
+        return (
+            self.entity_name == entity_name
+            and self.page_size == page_size
+            and _json_roundtrip(self.kwargs) == _json_roundtrip(kwargs)
+        )
+
+    def to_dict(self):
+        """Return the cursor as a dictionary that can be serialized to JSON.
+
+        Returns:
+            dict: the cursor
+        """
+        return {
+            "entity_name": self.entity_name,
+            "page_size": self.page_size,
+            "page_number": self.page_number,
+            "total_pages": self.total_pages,
+            "kwargs": self.kwargs,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a cursor from a dictionary returned by :meth:`to_dict`.
+
+        Args:
+            data (dict): the cursor as a dictionary
+
+        Returns:
+            Cursor: the cursor
+
+        Raises:
+            ValueError: if the dictionary is not a valid cursor
+        """
+        try:
+            return cls(
+                data["entity_name"],
+                page_size=data["page_size"],
+                page_number=data["page_number"],
+                total_pages=data.get("total_pages"),
+                kwargs=data.get("kwargs"),
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError("Invalid cursor: {!r}".format(data)) from e
+
+    def save(self, path):
+        """Save the cursor to a JSON file.
+
+        The file is replaced atomically, so that it is never left half-written.
+
+        Args:
+            path (str): the path to the file
+
+        Raises:
+            OSError: if the file can't be written
+        """
+        directory = os.path.dirname(path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Load a cursor from a JSON file written by :meth:`save`.
+
+        Args:
+            path (str): the path to the file
+
+        Returns:
+            Cursor: the cursor
+
+        Raises:
+            OSError: if the file can't be read
+            ValueError: if the file does not contain a valid cursor
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+class _BaseCrawl:
+    def __init__(self, client, cursor, checkpoint=None):
+        self.client = client
+        #: The position of the crawl, see :class:`Cursor`.
+        self.cursor = cursor
+        self.checkpoint = checkpoint
+
+    def _next_page_args(self):
+        return dict(
+            self.cursor.kwargs,
+            page_size=self.cursor.page_size,
+            page_number=self.cursor.page_number + 1,
+        )
+
+    def _page_done(self, response):
+        """Move the cursor after a page that was completely consumed, and checkpoint it."""
+        self.cursor.page_number += 1
+        # There is always at least one page, even when there are no entities.
+        self.cursor.total_pages = max(response.page["total_pages"], 1)
+        if self.checkpoint is None:
+            return
+        try:
+            if not self.cursor.finished:
+                self.cursor.save(self.checkpoint)
+            elif os.path.exists(self.checkpoint):
+                # Don't resume a finished crawl the next time.
+                os.unlink(self.checkpoint)
+        except OSError as e:
+            _log.warning("Could not save the cursor to %s: %s", self.checkpoint, e)
+
+
+class EntityCrawl(_BaseCrawl):
+    """Iterate over all the entities of a given type, in a way that can be resumed.
+
+    Use :meth:`fasjson_client.Client.resumable_list_all_entities` to build it. Iterating over
+    the crawl again after an error resumes after the last page that was completely consumed,
+    so the entities of the page being consumed when the error happened are yielded again.
+
+    Args:
+        client (fasjson_client.Client): the client sending the requests
+        cursor (Cursor): the position to start from
+        checkpoint (str): the path of a file where the cursor is saved after each page. The file
+            is removed when the crawl is finished.
+    """
+
+    def __iter__(self):
+        operation = self.client._list_operation(self.cursor.entity_name)
+        while not self.cursor.finished:
+            response = operation(**self._next_page_args())
+            yield from response.result
+            self._page_done(response)
+
+
+class AsyncEntityCrawl(_BaseCrawl):
+    """Iterate asynchronously over all the entities of a given type, in a way that can be resumed.
+
+    This is the asynchronous version of :class:`EntityCrawl`, use
+    :meth:`fasjson_client.aio.AsyncClient.resumable_list_all_entities` to build it.
+    """
+
+    async def __aiter__(self):
+        operation = await self.client._list_operation(self.cursor.entity_name)
+        while not self.cursor.finished:
+            response = await operation(**self._next_page_args())
+            for entity in response.result:
+                yield entity
+            self._page_done(response)
+
+
+def start_crawl(entity_name, page_size, kwargs, cursor=None, checkpoint=None):
+    """Return the cursor to start a crawl from.
+
+    Args:
+        entity_name (str): the plural name of the entity
+        page_size (int): the number of entities per page
+        kwargs (dict): additional arguments for the list operation
+        cursor (Cursor or dict): the cursor of a previous crawl to resume
+        checkpoint (str): the path of the file where the cursor is saved. If it exists, the
+            crawl resumes from the cursor it holds.
+
+    Returns:
+        Cursor: the cursor
+
+    Raises:
+        ValueError: if the cursor to resume from belongs to another crawl
+    """
+    if cursor is None and checkpoint is not None and os.path.exists(checkpoint):
+        cursor = Cursor.load(checkpoint)
+        _log.info("Resuming the crawl of %s from %s", entity_name, checkpoint)
+    if cursor is None:
+        return Cursor(entity_name, page_size=page_size, kwargs=kwargs)
+    if isinstance(cursor, dict):
+        cursor = Cursor.from_dict(cursor)
+    if not cursor.matches(entity_name, page_size, kwargs):
+        raise ValueError(
+            "The cursor {!r} belongs to another crawl than {} by {} with {!r}".format(
+                cursor, entity_name, page_size, kwargs
+            )
+        )
+    return cursor
@@ -0,0 +1,270 @@
+"""Spreading the requests over several FASJSON servers, and failing over between them.
+
+The clients parse the API specification once, and build the requests for the first server. The
+requests are then sent to the server selected by an :class:`EndpointPool`, which favours the
+servers responding faster and avoids the servers that recently failed.
+"""
+
+import logging
+import random
+import threading
+import time
+from urllib.parse import urljoin
+
+from .errors import APIError
+
+
+_log = logging.getLogger(__name__)
+
+#: The latency, in seconds, below which the servers are considered equally fast.
+MIN_LATENCY = 0.001
+
+
+def rebase_request(request_params, operation, api_url):
+    """Send a request built from the spec to another server.
+
+    Args:
+        request_params (dict): the request built by :func:`bravado.client.construct_request`
+        operation (bravado_core.operation.Operation): the operation of the request
+        api_url (str): the URL of the API on the other server, such as
+            ``https://fasjson02.example.com/v1``
+    """
+    prefix_length = len(operation.swagger_spec.api_url.rstrip("/"))
+    request_params["url"] = api_url + request_params["url"][prefix_length:]
+
+
+def with_endpoint(kwargs, endpoint):
+    """Return the arguments of a call, with the server to send its request to.
+
+    Args:
+        kwargs (dict): the arguments of the call
+        endpoint (Endpoint): the server, or ``None`` to use the URL of the spec
+
+    Returns:
+        dict: the arguments to send the request with
+    """
+    if endpoint is None:
+        return kwargs
+    options = dict(kwargs.get("_request_options", {}), api_url=endpoint.api_url)
+    return dict(kwargs, _request_options=options)
+
+
+class Endpoint:
+    """A FASJSON server, with the health and the latency of its recent requests.
+
+    Args:
+        url (str): the URL to the FASJSON instance, ending with a slash
+        api_version (int): the FASJSON API version
+    """
+
+    def __init__(self, url, api_version=1):
+        self.url = url
+        #: The URL the requests are sent to.
+        self.api_url = urljoin(url, f"v{api_version}")
+        #: The moving average of the latency of the requests, in seconds.
+        self.latency = None
+        #: The number of requests sent to the server.
+        self.requests = 0
+        #: The number of requests that failed.
+        self.failures = 0
+        #: The time until which the server is avoided, after a failure.
+        self.down_until = None
+
+    def __repr__(self):
+        return "<Endpoint {}>".format(self.url)
+
+    def is_up(self, now):
+        """Tell whether the server can be selected.
+
+        Args:
+            now (float): the current time, from :func:`time.monotonic`
+
+        Returns:
+            bool: ``False`` if the server failed less than ``down_timeout`` seconds ago
+        """
+        return self.down_until is None or self.down_until <= now
+
+
+class EndpointPool:
+    """Select the server each request is sent to, and fail over to the others.
+
+    The servers are selected at random, with a probability inversely proportional to the
+    exponentially weighted moving average (EWMA) of their latency: the faster servers get more
+    requests, and the load still spreads over all of them. A server failing with a connection
+    error, a timeout or a server error (5xx) is avoided for ``down_timeout`` seconds, and the read
+    requests are sent again to another server. When all the servers failed recently, the one
+    that failed first is tried anyway.
+
+    Args:
+        urls (list): the URLs to the FASJSON instances
+        api_version (int): the FASJSON API version
+        ewma_weight (float): the weight of the latest latency in the moving average, between 0
+            and 1. The higher it is, the faster the selection adapts.
+        down_timeout (float): the number of seconds during which a failed server is avoided
+
+    Raises:
+        ValueError: if there are no URLs
+    """
+
+    def __init__(self, urls, api_version=1, ewma_weight=0.3, down_timeout=30):
+        if not urls:
+            raise ValueError("At least one URL is needed")
+        self.endpoints = [
+            Endpoint(url if url.endswith("/") else url + "/", api_version)
+            for url in urls
+        ]
+        self.ewma_weight = ewma_weight
+        self.down_timeout = down_timeout
+        #: The number of requests sent again to another server after a failure.
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def select(self, exclude=()):
+        """Select the server to send a request to.
+
+        Args:
+            exclude (list): the servers that must not be selected
+
+        Returns:
+            Endpoint: the server, or ``None`` if they are all excluded
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.is_up(now)]
+            if not healthy:
+                return min(candidates, key=lambda e: e.down_until)
+            # The servers that were not measured yet are considered as fast as the fastest one.
+            known = [e.latency for e in healthy if e.latency is not None]
+            default = min(known) if known else MIN_LATENCY
+            weights = [
+                1 / max(default if e.latency is None else e.latency, MIN_LATENCY)
+                for e in healthy
+            ]
+        return random.choices(healthy, weights)[0]
+
+    def is_failure(self, error):
+        """Tell whether an error shows that the server is failing.
+
+        Args:
+            error (Exception): the error raised by the request
+
+        Returns:
+            bool: ``True`` for the server errors and the other errors, such as connection errors
+        """
+        if isinstance(error, APIError):
+            return error.code is not None and error.code >= 500
+        return True
+
+    def record_success(self, endpoint, latency):
+        """Record a response from a server.
+
+        Args:
+            endpoint (Endpoint): the server
+            latency (float): the number of seconds the server took to respond
+        """
+        with self._lock:
+            endpoint.requests += 1
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.ewma_weight * (latency - endpoint.latency)
+            endpoint.down_until = None
+
+    def record_failure(self, endpoint):
+        """Record a failure of a server, which is then avoided for a while.
+
+        Args:
+            endpoint (Endpoint): the server
+        """
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.failures += 1
+            endpoint.down_until = time.monotonic() + self.down_timeout
+
+    def _on_error(self, endpoint, error, latency, tried, failover):
+        """Record a failed request, and tell whether to send it to another server."""
+        if not self.is_failure(error):
+            self.record_success(endpoint, latency)
+            return False
+        self.record_failure(endpoint)
+        if not failover or len(tried) >= len(self.endpoints):
+            return False
+        _log.warning("%s failed (%s), failing over", endpoint.url, error)
+        with self._lock:
+            self.failovers += 1
+        return True
+
+    def call(self, send, errors=(OSError,), failover=True):
+        """Call ``send(endpoint)`` with a selected server, and with the others if it fails.
+
+        Args:
+            send (callable): the function sending the request to the server it is given
+            errors (tuple): the exceptions raised by ``send()`` when the server can't be
+                reached or times out. The :class:`fasjson_client.errors.APIError` with a 5xx
+                status code are failures too.
+            failover (bool): send the request to another server after a failure. Only the
+                idempotent requests can be sent again.
+
+        Returns:
+            the result of ``send()``
+        """
+        tried = []
+        while True:
+            endpoint = self.select(exclude=tried)
+            tried.append(endpoint)
+            started = time.monotonic()
+            try:
+                result = send(endpoint)
+            except errors + (APIError,) as e:
+                latency = time.monotonic() - started
+                if not self._on_error(endpoint, e, latency, tried, failover):
+                    raise
+                continue
+            self.record_success(endpoint, time.monotonic() - started)
+            return result
+
+    async def call_async(self, send, errors, failover=True):
+        """Await ``send(endpoint)`` with a selected server, and with the others if it fails.
+
+        This is the asynchronous version of :meth:`call`.
+        """
+        tried = []
+        while True:
+            endpoint = self.select(exclude=tried)
+            tried.append(endpoint)
+            started = time.monotonic()
+            try:
+                result = await send(endpoint)
+            except errors + (APIError,) as e:
+                latency = time.monotonic() - started
+                if not self._on_error(endpoint, e, latency, tried, failover):
+                    raise
+                continue
+            self.record_success(endpoint, time.monotonic() - started)
+            return result
+
+    def stats(self):
+        """Return the health and the latency of the servers.
+
+        Returns:
+            dict: the number of ``failovers``, and the ``endpoints`` statistics keyed by URL:
+            whether the server is ``up``, its average ``latency`` in seconds, and its numbers of
+            ``requests`` and ``failures``
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "failovers": self.failovers,
+                "endpoints": {
+                    e.url: {
+                        "up": e.is_up(now),
+                        "latency": e.latency,
+                        "requests": e.requests,
+                        "failures": e.failures,
+                    }
+                    for e in self.endpoints
+                },
+            }
@@ -65,6 +65,19 @@ class APIError(ClientError):
         )
 
 
+class CircuitOpenError(ClientError):
+    """
+    Raised without sending the request while the circuit breaker is open, because the server
+    failed too often recently.
+    """
+
+
+class DeadlineExceeded(ClientError):
+    """
+    Raised when the time budget of a call or of an iteration runs out.
+    """
+
+
 class ConfigurationException(ClientSetupError):
     """
     Raised when there's an invalid configuration setting
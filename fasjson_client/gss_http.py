@@ -1,23 +1,130 @@
 import errno
+import threading
+import time
+from urllib.parse import urlsplit
 
 import gssapi
 from requests_gssapi import HTTPSPNEGOAuth
+from requests_gssapi.exceptions import SPNEGOExchangeError
 from bravado import requests_client
 
 from .errors import ClientSetupError
 
 
 class GssapiAuthenticator(requests_client.Authenticator):
-    """HTTP client class used in SwaggerClient for GSSAPI authentication."""
+    """HTTP client class used in SwaggerClient for GSSAPI authentication.
 
-    def __init__(self, host, principal=None):
+    The credentials and the SPNEGO auth object are reused across requests, and refreshed
+    shortly before the credentials expire.
+
+    Args:
+        host (str): the host to authenticate to
+        principal (str): the Kerberos principal to use for authentication
+        opportunistic_auth (bool): send the authentication token with the first request
+            instead of waiting for the server's 401 challenge. If the server still replies with
+            a challenge, the usual negotiation takes place.
+        other_hosts (list): the other hosts to authenticate to, such as the replicas of the
+            FASJSON instance
+        cookie_jar (fasjson_client.cookies.PersistentCookieJar): the jar of the session
+            cookies, told which principal the credentials belong to so that it drops the cookies
+            of another one
+    """
+
+    #: Refresh the credentials when they expire in less than this number of seconds.
+    creds_refresh_margin = 60
+
+    def __init__(
+        self,
+        host,
+        principal=None,
+        opportunistic_auth=False,
+        other_hosts=(),
+        cookie_jar=None,
+    ):
         super().__init__(host)
+        self.hosts = {host, *other_hosts}
         self.principal = principal
+        self.opportunistic_auth = opportunistic_auth
+        self.cookie_jar = cookie_jar
+        #: In opportunistic mode, the number of requests that did not need a 401 challenge.
+        self.challenges_avoided = 0
+        #: In opportunistic mode, the number of requests that still got a 401 challenge.
+        self.challenges_received = 0
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._creds_expire_at = None
+        self._auth = None
+
+    def matches(self, url):
+        return urlsplit(url).netloc in self.hosts
 
     def apply(self, request):
-        request.auth = HTTPSPNEGOAuth(creds=self._get_creds())
+        request.auth = self._get_auth()
+        if self.opportunistic_auth:
+            request.register_hook("response", self._on_response)
         return request
 
+    def _on_response(self, response, **kwargs):
+        # This hook runs before the SPNEGO one, so it sees the response to the first attempt.
+        self.record_response(response.status_code)
+
+    def record_response(self, status_code):
+        """Count the challenges avoided by opportunistic authentication.
+
+        Args:
+            status_code (int): the status code of the response to the request that included
+                the opportunistic token
+        """
+        with self._stats_lock:
+            if status_code == 401:
+                self.challenges_received += 1
+            else:
+                self.challenges_avoided += 1
+
+    def _auth_is_valid(self):
+        if self._auth is None:
+            return False
+        if self._creds_expire_at is None:
+            return True
+        return time.monotonic() < self._creds_expire_at - self.creds_refresh_margin
+
+    def _get_auth(self):
+        if self._auth_is_valid():
+            return self._auth
+        with self._lock:
+            if not self._auth_is_valid():
+                creds = self._get_creds()
+                if self.cookie_jar is not None:
+                    self.cookie_jar.set_principal(str(creds.name))
+                lifetime = creds.lifetime
+                self._creds_expire_at = (
+                    None if lifetime is None else time.monotonic() + lifetime
+                )
+                self._auth = HTTPSPNEGOAuth(
+                    creds=creds, opportunistic_auth=self.opportunistic_auth
+                )
+            return self._auth
+
+    def negotiate_header(self, hostname):
+        """Generate an ``Authorization`` header value for transports other than requests.
+
+        Args:
+            hostname (str): the hostname of the server, without the port
+
+        Returns:
+            str: the header value, starting with ``Negotiate``
+
+        Raises:
+            ClientSetupError: if the authentication token could not be generated
+        """
+        auth = self._get_auth()
+        try:
+            return auth.generate_request_header(None, hostname, is_preemptive=True)
+        except SPNEGOExchangeError as e:
+            raise ClientSetupError(
+                "Authentication failed", errno.EPROTO, data={"exc": e}
+            )
+
     def _get_creds(self):
         if self.principal is None:
             name = None
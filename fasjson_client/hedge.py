@@ -0,0 +1,280 @@
+"""Hedged requests, cutting the tail latency of the read operations.
+
+When a response is slower than usual, a second identical request is sent, and the call returns
+the first response to arrive. A slow lookup on the server side then costs the hedging delay
+plus a regular request time, instead of the whole slow request time.
+"""
+
+import asyncio
+import collections
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+#: The default maximum number of threads sending the hedged requests.
+DEFAULT_MAX_WORKERS = 32
+
+#: The default maximum proportion of hedged calls.
+DEFAULT_MAX_HEDGE_RATE = 0.1
+
+#: The default number of calls that can be hedged in a row.
+DEFAULT_MAX_HEDGE_BURST = 10
+
+
+class Hedger:
+    """Send a duplicate request when a read operation does not respond in time.
+
+    The duplicate is sent after ``delay`` seconds, or by default when the request has taken
+    longer than the ``percentile`` of the recent latencies of its operation. No request is
+    hedged until ``min_samples`` responses of the operation have been timed. The call returns the
+    first successful response, and raises the first error if both requests fail.
+
+    The request that loses the race is cancelled. In the synchronous client, a request that is
+    already being sent can't be interrupted: it completes in the background and its response is
+    discarded.
+
+    Only the read operations are hedged, since they are idempotent. Hedging increases the load
+    on the server, by the proportion of hedged calls: use a high percentile to keep it low. The
+    proportion of hedged calls is also capped by a budget: each call earns ``max_hedge_rate``
+    duplicate requests, up to ``max_hedge_burst``, and a call that is slow when the budget is
+    spent is not hedged. This avoids doubling the load when the server slows down as a whole.
+
+    In the synchronous client, the requests are sent by a pool of ``max_workers`` threads. A
+    thread is reserved for each request before it is submitted, so a request never waits in the
+    queue of the pool, and that wait is never mistaken for a slow response. When all the threads
+    are busy, the call is sent in the calling thread and is not hedged, and a slow call is not
+    hedged when no thread is left for its duplicate.
+
+    Args:
+        delay (float): the number of seconds to wait before sending the duplicate request, or
+            ``None`` to compute it from the recent latencies
+        percentile (float): the percentile of the recent latencies after which the duplicate
+            request is sent, between 0 and 100
+        window_size (int): the number of recent latencies kept for each operation
+        min_samples (int): the number of latencies of an operation needed to hedge its calls
+        operations (list): the ids of the operations to hedge, or ``None`` for all the read
+            operations
+        max_workers (int): the maximum number of threads sending the requests of the
+            synchronous client
+        max_hedge_rate (float): the maximum proportion of hedged calls, between 0 and 1
+        max_hedge_burst (float): the maximum number of calls that can be hedged in a row, when
+            the budget has been saved by the previous calls
+    """
+
+    def __init__(
+        self,
+        delay=None,
+        percentile=95,
+        window_size=100,
+        min_samples=20,
+        operations=None,
+        max_workers=DEFAULT_MAX_WORKERS,
+        max_hedge_rate=DEFAULT_MAX_HEDGE_RATE,
+        max_hedge_burst=DEFAULT_MAX_HEDGE_BURST,
+    ):
+        self.delay = delay
+        self.percentile = percentile
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.operations = None if operations is None else set(operations)
+        self.max_workers = max_workers
+        self.max_hedge_rate = max_hedge_rate
+        self.max_hedge_burst = max_hedge_burst
+        #: The number of calls that could be hedged.
+        self.calls = 0
+        #: The number of duplicate requests sent.
+        self.hedged = 0
+        #: The number of calls answered by the duplicate request.
+        self.wins = 0
+        #: The number of slow calls that were not hedged, because the budget was spent or the
+        #: threads were all busy.
+        self.throttled = 0
+        self._budget = max_hedge_burst
+        self._busy_workers = 0
+        self._lock = threading.Lock()
+        self._latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=window_size)
+        )
+        self._executor = None
+
+    def get_delay(self, operation_id):
+        """Return the number of seconds to wait before hedging a call.
+
+        Args:
+            operation_id (str): the id of the operation
+
+        Returns:
+            float: the delay, or ``None`` if there are not enough latencies to compute it
+        """
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            latencies = sorted(self._latencies[operation_id])
+        if not latencies or len(latencies) < self.min_samples:
+            return None
+        index = math.ceil(self.percentile / 100 * len(latencies)) - 1
+        return latencies[max(index, 0)]
+
+    def _record(self, operation_id, started):
+        latency = time.monotonic() - started
+        with self._lock:
+            self._latencies[operation_id].append(latency)
+
+    def _timed(self, operation_id, send):
+        started = time.monotonic()
+        result = send()
+        self._record(operation_id, started)
+        return result
+
+    async def _timed_async(self, operation_id, send):
+        started = time.monotonic()
+        result = await send()
+        self._record(operation_id, started)
+        return result
+
+    def _count(self, hedged=False, won=False):
+        with self._lock:
+            self.calls += 1
+            self._budget = min(self._budget + self.max_hedge_rate, self.max_hedge_burst)
+            self.hedged += hedged
+            self.wins += won
+
+    def _spend_budget(self, need_worker=False):
+        """Take a duplicate request from the budget, and a thread to send it if needed.
+
+        Returns:
+            bool: ``True`` if the call can be hedged
+        """
+        with self._lock:
+            if self._budget < 1 or (
+                need_worker and self._busy_workers >= self.max_workers
+            ):
+                self.throttled += 1
+                return False
+            self._budget -= 1
+            self._busy_workers += need_worker
+            return True
+
+    def _reserve_worker(self):
+        """Reserve a thread of the pool, and tell whether there was one left."""
+        with self._lock:
+            if self._busy_workers >= self.max_workers:
+                return False
+            self._busy_workers += 1
+            return True
+
+    def _release_worker(self, future):
+        with self._lock:
+            self._busy_workers -= 1
+
+    def _submit(self, operation_id, send):
+        """Send the request with a reserved thread of the pool, and return its future."""
+        future = self._get_executor().submit(self._timed, operation_id, send)
+        # The thread is released when the request completes or is cancelled before being sent.
+        future.add_done_callback(self._release_worker)
+        return future
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="fasjson-hedge"
+                )
+            return self._executor
+
+    def call(self, operation_id, send):
+        """Call ``send()``, and call it again if it does not return in time.
+
+        Args:
+            operation_id (str): the id of the operation
+            send (callable): the function sending the request
+
+        Returns:
+            the result of the first successful call to ``send()``
+        """
+        if self.operations is not None and operation_id not in self.operations:
+            return send()
+        delay = self.get_delay(operation_id)
+        if delay is None or not self._reserve_worker():
+            self._count()
+            return self._timed(operation_id, send)
+        first = self._submit(operation_id, send)
+        done, _pending = wait([first], timeout=delay)
+        if done or not self._spend_budget(need_worker=True):
+            self._count()
+            return first.result()
+        second = self._submit(operation_id, send)
+        try:
+            pending = {first, second}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in (first, second):
+                    if future in done and future.exception() is None:
+                        self._count(hedged=True, won=future is second)
+                        return future.result()
+            self._count(hedged=True)
+            return first.result()
+        finally:
+            first.cancel()
+            second.cancel()
+
+    async def call_async(self, operation_id, send):
+        """Await ``send()``, and await it again if it does not return in time.
+
+        This is the asynchronous version of :meth:`call`.
+        """
+        if self.operations is not None and operation_id not in self.operations:
+            return await send()
+        delay = self.get_delay(operation_id)
+        if delay is None:
+            self._count()
+            return await self._timed_async(operation_id, send)
+        first = asyncio.ensure_future(self._timed_async(operation_id, send))
+        second = None
+        try:
+            done, _pending = await asyncio.wait([first], timeout=delay)
+            if done or not self._spend_budget():
+                self._count()
+                return await first
+            second = asyncio.ensure_future(self._timed_async(operation_id, send))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in (first, second):
+                    if task in done and task.exception() is None:
+                        self._count(hedged=True, won=task is second)
+                        return task.result()
+            self._count(hedged=True)
+            return first.result()
+        finally:
+            # Cancel the request that lost, or both if the call itself is cancelled.
+            for task in (first, second):
+                if task is not None:
+                    task.cancel()
+
+    def close(self):
+        """Stop the threads sending the requests of the synchronous client."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self):
+        """Return the hedging statistics.
+
+        Returns:
+            dict: the number of ``calls`` that could be hedged, of ``hedged`` calls, of calls
+            the duplicate request ``wins``, of slow calls that were ``throttled``, and the
+            ``hedge_rate``, the proportion of hedged calls
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "wins": self.wins,
+                "throttled": self.throttled,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+            }
@@ -0,0 +1,62 @@
+"""The HTTP transport used by the synchronous client."""
+
+from bravado import requests_client
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE, HTTPAdapter
+
+
+def make_http_adapter(
+    pool_connections=DEFAULT_POOLSIZE,
+    pool_maxsize=DEFAULT_POOLSIZE,
+    pool_block=DEFAULT_POOLBLOCK,
+):
+    """Build a transport adapter holding a pool of HTTP connections.
+
+    The adapter can be given to several clients so that they share the same connections.
+
+    Args:
+        pool_connections (int): the number of hosts to keep connection pools for
+        pool_maxsize (int): the maximum number of connections kept open to each host
+        pool_block (bool): when all the connections to a host are busy, wait for one to be
+            available instead of opening a new one that will be discarded afterwards
+
+    Returns:
+        requests.adapters.HTTPAdapter: the adapter
+    """
+    return HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+    )
+
+
+class PooledRequestsClient(requests_client.RequestsClient):
+    """A bravado HTTP client with a configurable connection pool and default timeouts.
+
+    Args:
+        http_adapter (requests.adapters.HTTPAdapter): the adapter holding the connection pool,
+            see :func:`make_http_adapter`
+        timeout (float): the default number of seconds to wait for the server to send data
+        connect_timeout (float): the default number of seconds to wait for a connection
+        keep_alive (bool): whether to keep the connections open between requests
+    """
+
+    def __init__(
+        self, http_adapter=None, timeout=None, connect_timeout=None, keep_alive=True
+    ):
+        super().__init__()
+        self.http_adapter = http_adapter or make_http_adapter()
+        self.session.mount("http://", self.http_adapter)
+        self.session.mount("https://", self.http_adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+    def separate_params(self, request_params):
+        sanitized_params, misc_options = super().separate_params(request_params)
+        # The timeouts given in the request options take precedence.
+        if self.timeout is not None:
+            misc_options.setdefault("timeout", self.timeout)
+        if self.connect_timeout is not None:
+            misc_options.setdefault("connect_timeout", self.connect_timeout)
+        return sanitized_params, misc_options
@@ -0,0 +1,275 @@
+"""Automatic batching of the lookups of single entities.
+
+The lookups made within a short window are collected, deduplicated, and sent together as one
+concurrent batch with :meth:`fasjson_client.Client.iter_entities`. Each caller gets a future
+that is resolved when its entity arrives.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future
+
+from .bulk import check_entity_name
+
+#: The default number of seconds during which the lookups are collected before being sent.
+DEFAULT_WINDOW = 0.005
+
+#: The default maximum number of names in a batch.
+DEFAULT_MAX_BATCH_SIZE = 100
+
+
+def _resolve(batch, name, entity, error):
+    future = batch[name]
+    # The caller may have cancelled its asyncio future.
+    if future.done():
+        return
+    if error is None:
+        future.set_result(entity)
+    else:
+        future.set_exception(error)
+
+
+def _fail(batch, error):
+    for future in batch.values():
+        if not future.done():
+            future.set_exception(error)
+
+
+def _cancel(batch, task):
+    for future in batch.values():
+        future.cancel()
+
+
+class EntityLoader:
+    """Collect the lookups of single entities and send them in batches.
+
+    Use :meth:`fasjson_client.Client.loader` to build it. The loader is thread-safe.
+
+    Args:
+        client (fasjson_client.Client): the client sending the lookups
+        entity_name (str): the plural name of the entity, ``users`` or ``groups``
+        window (float): the number of seconds during which the lookups are collected
+        concurrency (int): the number of lookups of a batch to run in parallel
+        max_batch_size (int): send the batch right away when it holds that many names
+        **kwargs: additional arguments for the lookup operation
+    """
+
+    def __init__(
+        self,
+        client,
+        entity_name,
+        window=DEFAULT_WINDOW,
+        concurrency=10,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        **kwargs,
+    ):
+        check_entity_name(entity_name)
+        self.client = client
+        self.entity_name = entity_name
+        self.window = window
+        self.concurrency = concurrency
+        self.max_batch_size = max_batch_size
+        self.kwargs = kwargs
+        #: The number of batches sent.
+        self.batches = 0
+        #: The number of lookups that joined an identical lookup of the pending batch.
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def load(self, name):
+        """Schedule the lookup of an entity.
+
+        Args:
+            name (str): the name of the entity
+
+        Returns:
+            concurrent.futures.Future: the future of the entity, or of ``None`` if it does not
+            exist. It raises the error of the lookup, if any.
+        """
+        batch = None
+        with self._lock:
+            future = self._pending.get(name)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            future = self._pending[name] = Future()
+            if len(self._pending) >= self.max_batch_size:
+                batch = self._take_batch()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.dispatch)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch is not None:
+            threading.Thread(
+                target=self._send, args=(batch,), name="fasjson-loader", daemon=True
+            ).start()
+        return future
+
+    def load_many(self, names):
+        """Schedule the lookup of several entities, see :meth:`load`.
+
+        Args:
+            names (iterable): the names of the entities
+
+        Returns:
+            list: the futures of the entities, in the order of the names
+        """
+        return [self.load(name) for name in names]
+
+    def get(self, name):
+        """Look up an entity in the next batch and wait for it.
+
+        Args:
+            name (str): the name of the entity
+
+        Returns:
+            dict: the entity, or ``None`` if it does not exist
+        """
+        return self.load(name).result()
+
+    def dispatch(self):
+        """Send the pending lookups now, and wait for them to complete."""
+        with self._lock:
+            batch = self._take_batch()
+        if batch:
+            self._send(batch)
+
+    def _take_batch(self):
+        """Return the pending lookups and start a new batch. Must be called with the lock held."""
+        batch, self._pending = self._pending, {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _send(self, batch):
+        # Once running, the futures can't be cancelled while they are being resolved. The names
+        # of the futures already cancelled are not looked up.
+        batch = {
+            name: future
+            for name, future in batch.items()
+            if future.set_running_or_notify_cancel()
+        }
+        if not batch:
+            return
+        with self._lock:
+            self.batches += 1
+        try:
+            lookups = self.client.iter_entities(
+                self.entity_name, list(batch), self.concurrency, **self.kwargs
+            )
+            for name, entity, error in lookups:
+                _resolve(batch, name, entity, error)
+        except Exception as e:
+            # For example a setup error, it fails the whole batch.
+            _fail(batch, e)
+
+
+class AsyncEntityLoader:
+    """Collect the lookups of single entities and send them in batches.
+
+    This is the asynchronous version of :class:`EntityLoader`, use
+    :meth:`fasjson_client.aio.AsyncClient.loader` to build it. By default, the lookups made
+    during one iteration of the event loop are sent together.
+    """
+
+    def __init__(
+        self,
+        client,
+        entity_name,
+        window=0,
+        concurrency=10,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        **kwargs,
+    ):
+        check_entity_name(entity_name)
+        self.client = client
+        self.entity_name = entity_name
+        self.window = window
+        self.concurrency = concurrency
+        self.max_batch_size = max_batch_size
+        self.kwargs = kwargs
+        #: The number of batches sent.
+        self.batches = 0
+        #: The number of lookups that joined an identical lookup of the pending batch.
+        self.deduplicated = 0
+        self._pending = {}
+        self._handle = None
+        self._tasks = set()
+
+    def load(self, name):
+        """Schedule the lookup of an entity.
+
+        It must be called from a running event loop.
+
+        Args:
+            name (str): the name of the entity
+
+        Returns:
+            asyncio.Future: the future of the entity, or of ``None`` if it does not exist
+        """
+        future = self._pending.get(name)
+        if future is not None:
+            self.deduplicated += 1
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._pending[name] = loop.create_future()
+        if len(self._pending) >= self.max_batch_size:
+            self.dispatch()
+        elif self._handle is None:
+            if self.window > 0:
+                self._handle = loop.call_later(self.window, self.dispatch)
+            else:
+                self._handle = loop.call_soon(self.dispatch)
+        return future
+
+    def load_many(self, names):
+        """Schedule the lookup of several entities, see :meth:`load`.
+
+        Args:
+            names (iterable): the names of the entities
+
+        Returns:
+            list: the futures of the entities, in the order of the names
+        """
+        return [self.load(name) for name in names]
+
+    async def get(self, name):
+        """Look up an entity in the next batch and wait for it.
+
+        Args:
+            name (str): the name of the entity
+
+        Returns:
+            dict: the entity, or ``None`` if it does not exist
+        """
+        return await self.load(name)
+
+    def dispatch(self):
+        """Send the pending lookups now, without waiting for them."""
+        batch, self._pending = self._pending, {}
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(batch))
+        # Keep a reference to the task until it is done.
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # The task may be cancelled, even before it starts.
+        task.add_done_callback(functools.partial(_cancel, batch))
+
+    async def _send(self, batch):
+        self.batches += 1
+        try:
+            lookups = self.client.iter_entities(
+                self.entity_name, list(batch), self.concurrency, **self.kwargs
+            )
+            async for name, entity, error in lookups:
+                _resolve(batch, name, entity, error)
+        except Exception as e:
+            _fail(batch, e)
@@ -0,0 +1,173 @@
+"""Read-ahead of the pages of paginated responses."""
+
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+#: The default maximum number of prefetched pages waiting to be consumed.
+DEFAULT_MAX_PENDING = 32
+
+#: The default number of seconds after which a prefetched page that was not consumed is dropped.
+DEFAULT_MAX_AGE = 60
+
+
+def _retrieve_exception(task):
+    # The error is raised when the page is consumed, don't complain if it never is.
+    if not task.cancelled():
+        task.exception()
+
+
+class PagePrefetcher:
+    """Fetch the next pages of the paginated responses in the background.
+
+    When a paginated response is returned, its next pages are requested right away, and the
+    calls asking for them, such as ``next_page()``, get the prefetched responses. The network
+    time then overlaps with the time spent processing the current page.
+
+    Args:
+        pages (int): the number of pages to fetch ahead
+        max_pending (int): the maximum number of prefetched pages waiting to be consumed. The
+            oldest ones are dropped when it is reached.
+        max_age (float): the number of seconds after which a prefetched page that was not
+            consumed is dropped, so that a stale page is fetched again when it is asked for
+    """
+
+    def __init__(
+        self, pages=1, max_pending=DEFAULT_MAX_PENDING, max_age=DEFAULT_MAX_AGE
+    ):
+        self.pages = pages
+        self.max_pending = max_pending
+        self.max_age = max_age
+        #: The number of calls answered by a prefetched page.
+        self.hits = 0
+        #: The number of prefetched pages dropped before being consumed.
+        self.dropped = 0
+        self._lock = threading.Lock()
+        # The futures of the prefetched pages and the time they were requested, oldest first.
+        self._pending = collections.OrderedDict()
+        self._executor = None
+
+    def _expire(self):
+        """Drop the prefetched pages older than ``max_age``. The lock must be held."""
+        expired = time.monotonic() - self.max_age
+        while self._pending:
+            key, (future, started) = next(iter(self._pending.items()))
+            if started > expired:
+                break
+            del self._pending[key]
+            future.cancel()
+            self.dropped += 1
+
+    def _pop(self, key):
+        with self._lock:
+            self._expire()
+            future, _started = self._pending.pop(key, (None, None))
+            if future is not None:
+                self.hits += 1
+            return future
+
+    def _next_pages(self, wrapper, response):
+        """Return the keys and the arguments of the pages to prefetch after this response."""
+        page = response.page
+        if page is None:
+            return []
+        last_page = min(page["page_number"] + self.pages, page["total_pages"])
+        next_pages = []
+        for page_number in range(page["page_number"] + 1, last_page + 1):
+            kwargs = response._page_args(page_number)
+            next_pages.append((wrapper._request_key(kwargs), kwargs))
+        return next_pages
+
+    def _add(self, key, start, *args):
+        """Call ``start(*args)`` and store the future it returns, unless the page is pending."""
+        with self._lock:
+            self._expire()
+            if key in self._pending:
+                return
+            self._pending[key] = (start(*args), time.monotonic())
+            while len(self._pending) > self.max_pending:
+                _key, (future, _started) = self._pending.popitem(last=False)
+                future.cancel()
+                self.dropped += 1
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.pages, thread_name_prefix="fasjson-prefetch"
+                )
+            return self._executor
+
+    def call(self, wrapper, kwargs, deadline=None):
+        """Call an operation, and prefetch the next pages of its response.
+
+        Args:
+            wrapper (fasjson_client.response.ResponseWrapper): the operation
+            kwargs (dict): the arguments of the call
+            deadline (fasjson_client.timeouts.Deadline): the deadline of the call. It also
+                bounds the wait for a prefetched page.
+
+        Returns:
+            FASJSONResponse: the response, prefetched if it was requested ahead of time
+        """
+        key = wrapper._request_key(kwargs)
+        if key is None:
+            return wrapper._fetch(wrapper._call, kwargs, deadline)
+        future = self._pop(key)
+        if future is None:
+            response = wrapper._fetch(wrapper._call, kwargs, deadline)
+        elif deadline is None:
+            response = future.result()
+        else:
+            try:
+                response = future.result(deadline.check())
+            except TimeoutError as e:
+                raise deadline.exceeded() from e
+        executor = None
+        for next_key, next_kwargs in self._next_pages(wrapper, response):
+            executor = executor or self._get_executor()
+            self._add(
+                next_key, executor.submit, wrapper._fetch, wrapper._call, next_kwargs
+            )
+        return response
+
+    async def call_async(self, wrapper, kwargs, deadline=None):
+        """Call an operation, and prefetch the next pages of its response.
+
+        This is the asynchronous version of :meth:`call`, the pages are fetched in tasks.
+        """
+        key = wrapper._request_key(kwargs)
+        if key is None:
+            return await wrapper._fetch(wrapper._call, kwargs, deadline)
+        task = self._pop(key)
+        if task is None:
+            response = await wrapper._fetch(wrapper._call, kwargs, deadline)
+        elif deadline is None:
+            response = await task
+        else:
+            try:
+                response = await asyncio.wait_for(task, deadline.check())
+            except asyncio.TimeoutError as e:
+                raise deadline.exceeded() from e
+        for next_key, next_kwargs in self._next_pages(wrapper, response):
+            self._add(next_key, self._start_task, wrapper, next_kwargs)
+        return response
+
+    def _start_task(self, wrapper, kwargs):
+        task = asyncio.ensure_future(wrapper._fetch(wrapper._call, kwargs))
+        task.add_done_callback(_retrieve_exception)
+        return task
+
+    def close(self):
+        """Cancel the prefetches that were not consumed, and stop the background threads."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            executor, self._executor = self._executor, None
+        for future, _started in pending:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
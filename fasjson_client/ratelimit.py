@@ -0,0 +1,157 @@
+"""Throttling of the requests sent to the server, with a token bucket.
+
+The bucket holds up to ``burst`` tokens and is refilled at ``rate`` tokens per second. Each
+request takes a token, and waits for one to be available if the bucket is empty.
+"""
+
+import asyncio
+import fcntl
+import os
+import struct
+import threading
+import time
+
+
+# The number of tokens and the time they were counted at, in the file of a FileRateLimiter.
+_FILE_STATE = struct.Struct("dd")
+
+
+class RateLimiter:
+    """Limit the rate of the requests sent by the threads or tasks sharing this limiter.
+
+    Args:
+        rate (float): the number of requests per second
+        burst (int): the number of requests that can be sent at once after a quiet period.
+            Defaults to the rate, and at least 1.
+
+    Raises:
+        ValueError: if the rate is not positive
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("The rate must be positive, not {!r}".format(rate))
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        #: The number of requests that had to wait for a token.
+        self.throttled = 0
+        #: The total number of seconds the requests waited for a token.
+        self.waited = 0.0
+        self._lock = threading.Lock()
+        self._state = (self.burst, time.monotonic())
+
+    def _take(self, state, now):
+        """Take a token from the bucket.
+
+        The token is reserved even when the bucket is empty, so that the waiting requests are
+        served in order.
+
+        Args:
+            state (tuple): the number of tokens and the time they were counted at
+            now (float): the current time
+
+        Returns:
+            tuple: the new state of the bucket, and the number of seconds to wait for the token
+        """
+        tokens, updated = state
+        tokens = min(self.burst, tokens + max(now - updated, 0) * self.rate) - 1
+        delay = -tokens / self.rate if tokens < 0 else 0
+        return (tokens, now), delay
+
+    def _reserve(self):
+        """Take a token and return the number of seconds to wait for it."""
+        with self._lock:
+            self._state, delay = self._take(self._state, time.monotonic())
+        return delay
+
+    def _record(self, delay):
+        if delay <= 0:
+            return
+        with self._lock:
+            self.throttled += 1
+            self.waited += delay
+
+    def acquire(self):
+        """Wait until a request can be sent."""
+        delay = self._reserve()
+        self._record(delay)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Wait asynchronously until a request can be sent."""
+        delay = self._reserve()
+        self._record(delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def call(self, send):
+        """Call ``send()`` when the rate allows it.
+
+        Args:
+            send (callable): the function sending the request
+
+        Returns:
+            the result of ``send()``
+        """
+        self.acquire()
+        return send()
+
+    async def call_async(self, send):
+        """Await ``send()`` when the rate allows it.
+
+        This is the asynchronous version of :meth:`call`.
+        """
+        await self.acquire_async()
+        return await send()
+
+    def stats(self):
+        """Return the throttling statistics.
+
+        Returns:
+            dict: the number of ``throttled`` requests and the number of seconds they ``waited``
+        """
+        with self._lock:
+            return {"throttled": self.throttled, "waited": self.waited}
+
+
+class FileRateLimiter(RateLimiter):
+    """Limit the rate of the requests sent by all the processes sharing a file.
+
+    The bucket is stored in the file, which is locked while a token is taken. Use it to share a
+    rate limit between the workers of a preforking server, or the processes of
+    :func:`fasjson_client.shards.list_all_entities_in_processes`. The limiter can be pickled to
+    be sent to another process. The statistics are those of the current process.
+
+    Args:
+        path (str): the path to the file, created if it does not exist. It must be on a local
+            filesystem.
+        rate (float): the number of requests per second
+        burst (int): the number of requests that can be sent at once after a quiet period.
+            Defaults to the rate, and at least 1.
+    """
+
+    def __init__(self, path, rate, burst=None):
+        super().__init__(rate, burst)
+        self.path = path
+
+    def __reduce__(self):
+        return (self.__class__, (self.path, self.rate, self.burst))
+
+    def _reserve(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # The processes don't share a monotonic clock on every system.
+            now = time.time()
+            data = os.pread(fd, _FILE_STATE.size, 0)
+            if len(data) == _FILE_STATE.size:
+                state = _FILE_STATE.unpack(data)
+            else:
+                state = (self.burst, now)
+            state, delay = self._take(state, now)
+            os.pwrite(fd, _FILE_STATE.pack(*state), 0)
+        finally:
+            # This releases the lock.
+            os.close(fd)
+        return delay
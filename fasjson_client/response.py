@@ -1,6 +1,13 @@
+import copy
+import functools
+import threading
+
 from bravado.exception import HTTPError
 
+from .cache import ResponseCache
+from .endpoints import with_endpoint
 from .errors import APIError
+from .timeouts import Deadline, request_args
 
 
 class PaginationError(Exception):
@@ -18,10 +25,56 @@ class ResponseWrapper:
 
     Args:
         operation (bravado_core.operation.Operation): the bravado operation to wrap
+        cache (fasjson_client.cache.ResponseCache): the cache to store the responses in
+        coalescer (fasjson_client.coalescing.RequestCoalescer): the coalescer sharing the
+            identical read requests that are in flight
+        prefetcher (fasjson_client.prefetch.PagePrefetcher): the prefetcher requesting the next
+            pages of the paginated responses ahead of time
+        retry_policy (fasjson_client.retry.RetryPolicy): the policy retrying the read requests
+            that fail with a transient error
+        circuit_breaker (fasjson_client.circuit.CircuitBreaker): the circuit breaker failing
+            fast while the server is down
+        rate_limiter (fasjson_client.ratelimit.RateLimiter): the limiter throttling the requests
+        timeouts (tuple): the connect and read timeouts of the operation
+        hedger (fasjson_client.hedge.Hedger): the hedger sending a duplicate of the slow read
+            requests
+        endpoint_pool (fasjson_client.endpoints.EndpointPool): the pool selecting the server
+            each request is sent to
+        cache_scope (tuple): the identity of the client, added to the cache keys so that the
+            clients sharing a cache don't share their responses
     """
 
-    def __init__(self, operation):
+    # bravado_core builds the functions unmarshalling a schema the first time it is used, and
+    # that is not thread-safe. Until an operation has unmarshalled a response with a given status
+    # code, the unmarshalling is serialized.
+    _unmarshal_lock = threading.Lock()
+
+    def __init__(
+        self,
+        operation,
+        cache=None,
+        coalescer=None,
+        prefetcher=None,
+        retry_policy=None,
+        circuit_breaker=None,
+        rate_limiter=None,
+        timeouts=None,
+        hedger=None,
+        endpoint_pool=None,
+        cache_scope=None,
+    ):
         self.operation = operation
+        self.cache = cache
+        self.coalescer = coalescer
+        self.prefetcher = prefetcher
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.timeouts = timeouts
+        self.hedger = hedger
+        self.endpoint_pool = endpoint_pool
+        self.cache_scope = cache_scope
+        self._unmarshalled_statuses = set()
 
     def __getattr__(self, name):
         """Forward requests for attrs not found on this decorator to the delegate."""
@@ -30,18 +83,115 @@ class ResponseWrapper:
     def __call__(self, **kwargs):
         """Invoke the actual HTTP request and return a FASJSONResponse.
 
+        The ``_deadline`` argument sets the number of seconds, or the
+        :class:`fasjson_client.timeouts.Deadline`, before which the call must complete, retries
+        included.
+
         Returns:
             FASJSONResponse: the API call result
 
         Raises:
             APIError: if the API doesn't return a successful response
+            DeadlineExceeded: if the deadline has passed
         """
+        deadline = Deadline.make(kwargs.pop("_deadline", None))
+        if self.prefetcher is not None:
+            return self.prefetcher.call(self, kwargs, deadline)
+        return self._fetch(self._call, kwargs, deadline)
+
+    def _call(self, kwargs, deadline=None, endpoint=None):
+        args = with_endpoint(request_args(kwargs, self.timeouts, deadline), endpoint)
+        future = self.operation(**args)
+        # HttpFuture.response() doesn't give the response before unmarshalling it. This private
+        # method does, the bravado versions it was tested with are pinned in pyproject.toml.
+        return self._get_response(future, future._get_incoming_response(), kwargs)
+
+    def call_or_none(self, **kwargs):
+        """Invoke the HTTP request, returning ``None`` if the server replies with 404 Not Found.
+
+        This is cheaper than catching the :class:`APIError`, which is not even built.
+
+        Returns:
+            FASJSONResponse: the API call result, or ``None``
+
+        Raises:
+            APIError: if the API doesn't return a successful response, except 404
+        """
+        deadline = Deadline.make(kwargs.pop("_deadline", None))
+        return self._fetch(self._call_or_none, kwargs, deadline)
+
+    def _call_or_none(self, kwargs, deadline=None, endpoint=None):
+        args = with_endpoint(request_args(kwargs, self.timeouts, deadline), endpoint)
+        future = self.operation(**args)
+        # Check the status before bravado turns the response into an exception.
+        incoming_response = future._get_incoming_response()
+        if incoming_response.status_code == 404:
+            return None
+        return self._get_response(future, incoming_response, kwargs)
+
+    def _get_response(self, future, incoming_response, kwargs):
         try:
-            call_result = self.operation(**kwargs).response().result
+            call_result = self._unmarshal(future, incoming_response)
         except HTTPError as e:
             raise APIError.from_bravado_error(e)
         return FASJSONResponse(call_result, operation=self, operation_args=kwargs)
 
+    def _unmarshal(self, future, incoming_response):
+        # The private HttpFuture._get_swagger_result() unmarshals a response that was already
+        # received, so that the lock is not held during the request. See the bravado
+        # requirement in pyproject.toml.
+        status_code = incoming_response.status_code
+        if status_code in self._unmarshalled_statuses:
+            return future._get_swagger_result(incoming_response)
+        with self._unmarshal_lock:
+            try:
+                return future._get_swagger_result(incoming_response)
+            finally:
+                self._unmarshalled_statuses.add(status_code)
+
+    def _fetch(self, call, kwargs, deadline=None):
+        """Get the response from the cache or from ``call(kwargs)``, sharing identical calls."""
+        key = self._request_key(kwargs)
+        send = functools.partial(call, kwargs, deadline)
+        if self.endpoint_pool is not None:
+            # Only the read requests are sent again to another server.
+            send = functools.partial(
+                self.endpoint_pool.call, send, failover=key is not None
+            )
+        if self.rate_limiter is not None:
+            send = functools.partial(self.rate_limiter.call, send)
+        if self.circuit_breaker is not None:
+            send = functools.partial(self.circuit_breaker.call, send)
+        if deadline is not None:
+            send = functools.partial(deadline.call, send)
+        if key is None:
+            return send()
+        if self.hedger is not None:
+            send = functools.partial(self.hedger.call, self.operation_id, send)
+        if self.retry_policy is not None:
+            send = functools.partial(
+                self.retry_policy.call, self.operation_id, send, deadline=deadline
+            )
+        if self.coalescer is not None:
+            # The regular calls and the _or_none calls don't share their requests.
+            send = functools.partial(
+                self.coalescer.call, key + (call.__name__,), send, deadline
+            )
+        if self.cache is None or not self.cache.is_cacheable(self.operation.operation):
+            return send()
+        if call == self._call_or_none and self.cache.is_not_found(key):
+            return None
+        return self.cache.fetch(key, send)
+
+    def _request_key(self, kwargs):
+        """Return the key identifying this call, or ``None`` if it is not a read operation."""
+        operation = self.operation.operation
+        if operation.http_method.lower() != "get":
+            return None
+        return ResponseCache.make_key(
+            operation.operation_id, kwargs, scope=self.cache_scope
+        )
+
 
 class FASJSONResponse:
     """Wraps an API response in a dict-like object.
@@ -49,11 +199,21 @@ class FASJSONResponse:
     The object has methods and properties for pagination.
     """
 
+    #: Whether this response comes from the cache and is past its time-to-live.
+    stale = False
+
     def __init__(self, response, operation, operation_args):
         self._response = response
         self._operation = operation
         self._operation_args = operation_args
 
+    def __deepcopy__(self, memo):
+        copied = copy.copy(self)
+        # The operation is shared, it holds the client.
+        copied._response = copy.deepcopy(self._response, memo)
+        copied._operation_args = copy.deepcopy(self._operation_args, memo)
+        return copied
+
     def __repr__(self):
         op_id = self._operation.operation.operation.operation_id
         op_args = ", ".join(
@@ -75,21 +235,35 @@ class FASJSONResponse:
         except KeyError:
             return None
 
-    def _get_paged_result(self, shift_by):
+    def _get_paged_result(self, shift_by, deadline=None):
         if self.page is None:
             raise PaginationError("No pagination available")
         page_number = self.page["page_number"]
         page_to_get = page_number + shift_by
         if page_to_get < 1 or page_to_get > self.page["total_pages"]:
             raise PaginationError("There is no page {}".format(page_to_get))
-        args = self._operation_args.copy()
-        args.update(
-            {"page_size": self.page["page_size"], "page_number": page_number + shift_by}
-        )
+        args = self._page_args(page_to_get)
+        if deadline is not None:
+            args["_deadline"] = deadline
         return self._operation(**args)
 
-    def prev_page(self):
-        return self._get_paged_result(-1)
+    def _page_args(self, page_number):
+        """Return the arguments of the call requesting another page."""
+        args = self._operation_args.copy()
+        args.update({"page_size": self.page["page_size"], "page_number": page_number})
+        return args
+
+    def prev_page(self, deadline=None):
+        return self._get_paged_result(-1, deadline)
+
+    def next_page(self, deadline=None):
+        """Request the next page.
 
-    def next_page(self):
-        return self._get_paged_result(1)
+        Args:
+            deadline (float or fasjson_client.timeouts.Deadline): the number of seconds, or the
+                deadline, before which the page must be fetched
+
+        Returns:
+            FASJSONResponse: the next page
+        """
+        return self._get_paged_result(1, deadline)
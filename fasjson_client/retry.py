@@ -0,0 +1,201 @@
+"""Automatic retries of the read operations that fail with a transient error.
+
+Only the ``GET`` operations are retried, since they are idempotent.
+"""
+
+import asyncio
+import datetime
+import email.utils
+import logging
+import random
+import threading
+import time
+
+from .errors import APIError
+
+
+_log = logging.getLogger(__name__)
+
+
+#: The default HTTP status codes of the responses that are retried.
+DEFAULT_RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def parse_retry_after(value):
+    """Parse the value of a ``Retry-After`` header.
+
+    Args:
+        value (str): the number of seconds to wait, or the date after which to retry
+
+    Returns:
+        float: the number of seconds to wait, or ``None`` if the value is not valid
+    """
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max((retry_at - now).total_seconds(), 0)
+
+
+class RetryPolicy:
+    """Retry the read operations that fail with a transient error.
+
+    The delay before each retry grows exponentially, and a random jitter spreads the retries of
+    several clients over time. When the server sends a ``Retry-After`` header, its delay is
+    used instead.
+
+    Args:
+        max_attempts (int): the maximum number of attempts, including the first one
+        backoff (float): the delay in seconds before the first retry, doubled for each of the
+            next ones
+        max_backoff (float): the maximum delay in seconds before a retry, including the delay
+            requested with a ``Retry-After`` header
+        jitter (bool): wait a random delay between zero and the computed delay
+        statuses (iterable): the HTTP status codes of the responses to retry
+        respect_retry_after (bool): use the delay requested by the server in the
+            ``Retry-After`` header
+        on_retry (callable): called before each retry with the operation id, the number of
+            the failed attempt, the error, and the delay before the retry
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        backoff=0.5,
+        max_backoff=30,
+        jitter=True,
+        statuses=DEFAULT_RETRY_STATUSES,
+        respect_retry_after=True,
+        on_retry=None,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.respect_retry_after = respect_retry_after
+        self.on_retry = on_retry
+        #: The number of retries.
+        self.retries = 0
+        #: The number of calls that still failed after the last attempt.
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def is_retryable(self, error):
+        """Tell whether an error is transient.
+
+        Args:
+            error (Exception): the error raised by the call
+
+        Returns:
+            bool: ``True`` for the API errors with a retryable status, and the other errors
+        """
+        if isinstance(error, APIError):
+            return error.code in self.statuses
+        # The connection errors and timeouts.
+        return True
+
+    def get_delay(self, attempt, error):
+        """Return the number of seconds to wait before retrying.
+
+        Args:
+            attempt (int): the number of the failed attempt, starting at 1
+            error (Exception): the error raised by the failed attempt
+
+        Returns:
+            float: the delay
+        """
+        if self.respect_retry_after and isinstance(error, APIError):
+            response = (error.data or {}).get("response")
+            headers = getattr(response, "headers", None) or {}
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def _on_error(self, operation_id, attempt, error, deadline):
+        """Return the delay before retrying after this error, or ``None`` to raise it."""
+        if not self.is_retryable(error):
+            return None
+        delay = None if attempt >= self.max_attempts else self.get_delay(attempt, error)
+        if delay is None or (deadline is not None and delay >= deadline.remaining()):
+            with self._lock:
+                self.exhausted += 1
+            if delay is not None:
+                raise deadline.exceeded() from error
+            return None
+        with self._lock:
+            self.retries += 1
+        _log.warning(
+            "Attempt %d of %s failed, retrying in %.2f seconds: %s",
+            attempt,
+            operation_id,
+            delay,
+            error,
+        )
+        if self.on_retry is not None:
+            self.on_retry(operation_id, attempt, error, delay)
+        return delay
+
+    def call(self, operation_id, send, errors=(OSError,), deadline=None):
+        """Call ``send()``, retrying it when it fails with a transient error.
+
+        Args:
+            operation_id (str): the id of the operation, for logging
+            send (callable): the function sending the request
+            errors (tuple): the exceptions raised by ``send()`` when the server can't be
+                reached, in addition to :class:`fasjson_client.errors.APIError`
+            deadline (fasjson_client.timeouts.Deadline): the deadline of the call. The call is
+                not retried if the deadline would pass during the delay.
+
+        Returns:
+            the result of ``send()``
+
+        Raises:
+            DeadlineExceeded: if the deadline would pass before the next attempt
+        """
+        attempt = 1
+        while True:
+            try:
+                return send()
+            except (APIError,) + errors as e:
+                delay = self._on_error(operation_id, attempt, e, deadline)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, operation_id, send, errors, deadline=None):
+        """Await ``send()``, retrying it when it fails with a transient error.
+
+        This is the asynchronous version of :meth:`call`.
+        """
+        attempt = 1
+        while True:
+            try:
+                return await send()
+            except (APIError,) + errors as e:
+                delay = self._on_error(operation_id, attempt, e, deadline)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        """Return the retry statistics.
+
+        Returns:
+            dict: the numbers of ``retries`` and of ``exhausted`` calls
+        """
+        with self._lock:
+            return {"retries": self.retries, "exhausted": self.exhausted}
@@ -0,0 +1,119 @@
+"""Splitting of the iteration over all the entities of a given type into page ranges.
+
+The shards can be consumed by several processes or hosts: they are made of basic types, so
+they can be pickled or serialized to JSON with ``shard._asdict()`` and rebuilt with
+``Shard(**data)``.
+"""
+
+import collections
+import multiprocessing
+import os
+
+
+#: A range of pages of the entities of a given type, from ``first_page`` to ``last_page``
+#: included.
+Shard = collections.namedtuple(
+    "Shard", ["entity_name", "page_size", "first_page", "last_page", "kwargs"]
+)
+
+#: The default number of shards given to each process by
+#: :func:`list_all_entities_in_processes`, so that a slow shard does not hold the others back.
+DEFAULT_SHARDS_PER_PROCESS = 4
+
+
+def split_pages(total_pages, count):
+    """Split the pages into contiguous ranges of about the same size.
+
+    Args:
+        total_pages (int): the number of pages
+        count (int): the number of ranges. There are fewer ranges if there are fewer pages.
+
+    Returns:
+        list: the first and last page of each range, in order
+    """
+    # There is always at least one page, even when there are no entities.
+    total_pages = max(total_pages, 1)
+    count = max(1, min(count, total_pages))
+    size, extra = divmod(total_pages, count)
+    ranges = []
+    first_page = 1
+    for index in range(count):
+        last_page = first_page + size - 1 + (1 if index < extra else 0)
+        ranges.append((first_page, last_page))
+        first_page = last_page + 1
+    return ranges
+
+
+def make_shards(entity_name, page_size, total_pages, count, kwargs):
+    """Build the shards of an iteration over all the entities of a given type.
+
+    Args:
+        entity_name (str): the plural name of the entity, for example ``users``
+        page_size (int): the number of entities per page
+        total_pages (int): the number of pages
+        count (int): the number of shards
+        kwargs (dict): additional arguments for the list operation
+
+    Returns:
+        list: the shards, in the order of the pages
+    """
+    return [
+        Shard(entity_name, page_size, first_page, last_page, kwargs)
+        for first_page, last_page in split_pages(total_pages, count)
+    ]
+
+
+_worker_client = None
+
+
+def _init_worker(client_kwargs):
+    from .client import Client
+
+    global _worker_client
+    _worker_client = Client(**client_kwargs)
+
+
+def _fetch_shard(shard):
+    return list(_worker_client.iter_shard(shard))
+
+
+def list_all_entities_in_processes(
+    client_kwargs,
+    entity_name,
+    processes=None,
+    page_size=1000,
+    shards_per_process=DEFAULT_SHARDS_PER_PROCESS,
+    mp_context=None,
+    **kwargs,
+):
+    """Iterate over all the entities of a given type, fetching the pages in a pool of processes.
+
+    Each process builds its own client and fetches whole shards. The entities are yielded in
+    the order of the pages, one shard at a time.
+
+    Args:
+        client_kwargs (dict): the arguments to build the :class:`fasjson_client.Client` of each
+            process with. They must be picklable.
+        entity_name (str): the plural name of the entity, for example ``users``
+        processes (int): the number of processes, defaults to the number of CPUs
+        page_size (int): the number of entities per page
+        shards_per_process (int): the number of shards to split the pages into, per process
+        mp_context (multiprocessing.context.BaseContext): the multiprocessing context to use,
+            for example to choose the start method
+        **kwargs: additional arguments for the list operation
+
+    Yields:
+        dict: the entities, in the order of the pages
+    """
+    from .client import Client
+
+    processes = processes or os.cpu_count() or 1
+    shards = Client(**client_kwargs).get_shards(
+        entity_name, processes * shards_per_process, page_size=page_size, **kwargs
+    )
+    mp_context = mp_context or multiprocessing.get_context()
+    with mp_context.Pool(
+        min(processes, len(shards)), initializer=_init_worker, initargs=(client_kwargs,)
+    ) as pool:
+        for entities in pool.imap(_fetch_shard, shards):
+            yield from entities
@@ -0,0 +1,306 @@
+"""Loading of the FASJSON OpenAPI specification.
+
+The specification can be cached on disk to avoid downloading it every time a
+:class:`fasjson_client.Client` is built, or loaded from the snapshot bundled with this package.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from bravado.exception import HTTPError
+from bravado.swagger_model import request
+from requests.exceptions import RequestException
+
+from .errors import ClientSetupError
+
+
+_log = logging.getLogger(__name__)
+
+#: The default time, in seconds, during which a cached spec is used without asking the server.
+DEFAULT_SPEC_CACHE_TTL = 3600
+
+#: The directory containing the specs bundled with this package.
+BUNDLED_SPECS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "specs")
+
+
+def bundled_spec_path(api_version):
+    """Return the path to the spec snapshot bundled for this API version.
+
+    Args:
+        api_version (int): the FASJSON API version
+
+    Returns:
+        str: the path to the spec file
+    """
+    return os.path.join(BUNDLED_SPECS_DIR, f"v{api_version}.json")
+
+
+def load_spec_file(path):
+    """Load a spec from a JSON file.
+
+    Args:
+        path (str): the path to the spec file
+
+    Returns:
+        dict: the spec
+
+    Raises:
+        OSError: if the file can't be read
+        ValueError: if the file does not contain valid JSON
+    """
+    with open(os.path.expanduser(path)) as f:
+        return json.load(f)
+
+
+def load_local_spec(spec, base_url, api_version):
+    """Load a local spec and adjust it to the FASJSON instance at ``base_url``.
+
+    Args:
+        spec (str): ``"bundled"`` for the spec shipped with this package, or the path to a
+            JSON file
+        base_url (str): the URL to the FASJSON instance, ending with a slash
+        api_version (int): the FASJSON API version
+
+    Returns:
+        dict: the spec
+
+    Raises:
+        ClientSetupError: if the spec can't be loaded
+    """
+    if spec == "bundled":
+        path = bundled_spec_path(api_version)
+    else:
+        path = spec
+    try:
+        spec_dict = load_spec_file(path)
+    except OSError as e:
+        raise ClientSetupError(
+            "could not read the spec file",
+            e.errno,
+            data={"exc": e, "path": path},
+        )
+    except ValueError as e:
+        raise ClientSetupError(
+            "spec file validation failed",
+            errno.EPROTO,
+            data={"exc": e, "path": path},
+        )
+    # The base path depends on where FASJSON is deployed.
+    spec_dict["basePath"] = f"{urlsplit(base_url).path}v{api_version}"
+    return spec_dict
+
+
+def spec_checksum(spec):
+    """Compute a checksum of a spec, to detect differences between two specs.
+
+    The ``basePath`` is ignored because it depends on where FASJSON is deployed.
+
+    Args:
+        spec (dict): the spec
+
+    Returns:
+        str: the checksum
+    """
+    spec = {key: value for key, value in spec.items() if key != "basePath"}
+    serialized = json.dumps(spec, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(serialized).hexdigest()
+
+
+def default_spec_cache_dir():
+    """Return the default directory where specs are cached.
+
+    It honors the ``XDG_CACHE_HOME`` environment variable.
+
+    Returns:
+        str: the cache directory
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "fasjson-client", "specs")
+
+
+class SpecCache:
+    """On-disk cache of the OpenAPI specs, keyed by spec URL.
+
+    Cached specs are used as-is for ``ttl`` seconds. After that they are revalidated with a
+    conditional request using the ``ETag`` and ``Last-Modified`` headers sent by the server
+    when the spec was downloaded.
+
+    Args:
+        path (str): the directory to store the specs in, defaults to
+            :func:`default_spec_cache_dir`
+        ttl (int): the number of seconds during which a cached spec is considered fresh
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_SPEC_CACHE_TTL):
+        self.path = os.path.expanduser(path or default_spec_cache_dir())
+        self.ttl = ttl
+
+    def _entry_path(self, spec_url):
+        key = hashlib.sha256(spec_url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, spec_url):
+        """Return the cache entry for this URL, or ``None`` if there isn't any.
+
+        Args:
+            spec_url (str): the URL of the spec
+
+        Returns:
+            dict: the cache entry, with the ``spec`` key holding the spec itself
+        """
+        try:
+            with open(self._entry_path(spec_url)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != spec_url or "spec" not in entry:
+            return None
+        return entry
+
+    def set(self, spec_url, spec, headers=None, fetched_at=None):
+        """Store a spec in the cache.
+
+        Errors are logged and otherwise ignored: the cache is only an optimization.
+
+        Args:
+            spec_url (str): the URL of the spec
+            spec (dict): the spec
+            headers (dict): the HTTP response headers the spec was served with
+            fetched_at (float): when the spec was validated with the server, defaults to now
+        """
+        headers = headers or {}
+        entry = {
+            "url": spec_url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": time.time() if fetched_at is None else fetched_at,
+            "spec": spec,
+        }
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            # Write atomically so that concurrent processes never read a partial file.
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(spec_url))
+        except OSError as e:
+            _log.warning("Could not write the spec cache in %s: %s", self.path, e)
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def load(self, http_client, spec_url):
+        """Return the spec from the cache, downloading or revalidating it when necessary.
+
+        Args:
+            http_client (bravado.http_client.HttpClient): the HTTP client to use
+            spec_url (str): the URL of the spec
+
+        Returns:
+            dict: the spec
+
+        Raises:
+            bravado.exception.HTTPError: if the server replies with an error and there is no
+                cached spec
+            requests.exceptions.RequestException: if the server can't be reached and there is
+                no cached spec
+            ValueError: if the server does not return valid JSON
+        """
+        entry = self.get(spec_url)
+        if entry is not None and self.is_fresh(entry):
+            _log.debug("Using the cached spec for %s", spec_url)
+            return entry["spec"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = request(http_client, spec_url, headers).result()
+        except HTTPError as e:
+            if entry is None:
+                raise
+            if e.status_code != 304:
+                _log.warning(
+                    "Could not revalidate the cached spec for %s, using it anyway: %s",
+                    spec_url,
+                    e,
+                )
+                return entry["spec"]
+            _log.debug("The cached spec for %s is still valid", spec_url)
+            self.set(
+                spec_url,
+                entry["spec"],
+                headers={
+                    "ETag": entry["etag"],
+                    "Last-Modified": entry["last_modified"],
+                },
+            )
+            return entry["spec"]
+        except RequestException as e:
+            if entry is None:
+                raise
+            _log.warning(
+                "Could not revalidate the cached spec for %s, using it anyway: %s",
+                spec_url,
+                e,
+            )
+            return entry["spec"]
+
+        spec = response.json()
+        self.set(spec_url, spec, headers=response.headers)
+        return spec
+
+
+class SpecRegistry:
+    """Process-wide registry of loaded specs, to share them between clients.
+
+    The loading function is only called once per key, even if several threads ask for the same
+    key at the same time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = {}
+
+    def get(self, key, load):
+        """Return the entry for this key, calling ``load()`` to build it if necessary.
+
+        Args:
+            key (tuple): the registry key
+            load (callable): the function that builds the entry
+
+        Returns:
+            the registry entry
+        """
+        try:
+            return self._entries[key]
+        except KeyError:
+            pass
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._entries:
+                self._entries[key] = load()
+            return self._entries[key]
+
+    def clear(self):
+        """Forget all the entries, they will be loaded again on the next request."""
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+
+#: The registry used by the clients built with ``shared_spec=True``.
+spec_registry = SpecRegistry()
@@ -1,6 +1,7 @@
 import os
 
 import pytest
+from requests.cookies import MockRequest, MockResponse
 
 from .utils import FasJsonMock
 
@@ -17,3 +18,14 @@ def server(fixture_dir):
         spec = f.read()
     with FasJsonMock(spec=spec, url="http://example.com/fasjson") as server:
         yield server
+
+
+@pytest.fixture
+def session_cookies(mocker):
+    # requests_mock does not store the cookies it sets in the session, but real responses do.
+    def extract_cookies_to_jar(jar, request, response):
+        jar.extract_cookies(MockResponse(response.headers), MockRequest(request))
+
+    mocker.patch(
+        "requests.sessions.extract_cookies_to_jar", side_effect=extract_cookies_to_jar
+    )
@@ -0,0 +1,969 @@
+import asyncio
+import os
+import re
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses, CallbackResult
+
+from fasjson_client.aio import AsyncClient
+from fasjson_client.cache import ResponseCache
+from fasjson_client.circuit import OPEN, CircuitBreaker
+from fasjson_client.errors import (
+    APIError,
+    CircuitOpenError,
+    ClientSetupError,
+    DeadlineExceeded,
+)
+from fasjson_client.gss_http import GssapiAuthenticator
+from fasjson_client.hedge import Hedger
+from fasjson_client.loader import AsyncEntityLoader
+from fasjson_client.prefetch import PagePrefetcher
+from fasjson_client.ratelimit import RateLimiter
+from fasjson_client.response import PaginationError
+from fasjson_client.retry import RetryPolicy
+
+from .utils import users_page
+
+BASE_URL = "http://example.com/fasjson"
+SPEC_URL = f"{BASE_URL}/specs/v1.json"
+
+
+@pytest.fixture
+def aio_server(fixture_dir):
+    with open(f"{fixture_dir}/spec.json") as f:
+        spec = f.read()
+    with aioresponses() as m:
+        m.get(SPEC_URL, body=spec, content_type="application/json", repeat=True)
+        yield m
+
+
+def _requests(server, method="GET"):
+    return [
+        (url, call)
+        for (req_method, url), calls in server.requests.items()
+        for call in calls
+        if req_method == method and "specs" not in str(url)
+    ]
+
+
+def _users_pages(total_pages, delays=None):
+    delays = delays or {}
+
+    async def callback(url, **kwargs):
+        page_number = int(url.query.get("page_number", 1))
+        await asyncio.sleep(delays.get(page_number, 0))
+        page_size = int(url.query["page_size"])
+        return CallbackResult(payload=users_page(page_number, page_size, total_pages))
+
+    return callback
+
+
+USERS_URL = re.compile(r"^http://example\.com/fasjson/v1/users/\?.*$")
+
+
+@pytest.fixture
+def clock(mocker):
+    # Only the deadlines use the mocked clock, not the event loop.
+    clock = mocker.patch("fasjson_client.timeouts.time").monotonic
+    clock.return_value = 1000.0
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_aio_success(aio_server):
+    mocked = {"result": {"dn": "SRV/foo@bar,dc=example.test", "service": "SRV/foo"}}
+    aio_server.get(f"{BASE_URL}/v1/me/", payload=mocked)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        response = await client.whoami()
+    assert response.result == mocked["result"]
+    assert repr(response) == "<FASJSONResponse for whoami()>"
+
+
+@pytest.mark.asyncio
+async def test_aio_operations(aio_server):
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        assert "get_user" in client.operations
+        assert client.list_users.produces == ["application/json"]
+        with pytest.raises(AttributeError) as e:
+            client.unknown_op
+    assert str(e.value) == "No such operation: 'unknown_op'"
+
+
+@pytest.mark.asyncio
+async def test_aio_not_set_up():
+    client = AsyncClient(BASE_URL, auth=False)
+    with pytest.raises(ClientSetupError):
+        client.whoami
+    with pytest.raises(ClientSetupError):
+        client.operations
+    # Private and special names don't need the setup.
+    assert not hasattr(client, "_private")
+    assert not hasattr(client, "__deepcopy__")
+
+
+@pytest.mark.asyncio
+async def test_aio_setup_once(fixture_dir):
+    with open(f"{fixture_dir}/spec.json") as f:
+        spec = f.read()
+
+    async def slow_spec(url, **kwargs):
+        await asyncio.sleep(0.01)
+        return CallbackResult(body=spec, content_type="application/json")
+
+    with aioresponses() as m:
+        m.get(SPEC_URL, callback=slow_spec, repeat=True)
+        client = AsyncClient(BASE_URL, auth=False)
+        await asyncio.gather(client.setup(), client.setup())
+        await client.setup()
+        spec_requests = [call for calls in m.requests.values() for call in calls]
+        assert len(spec_requests) == 1
+        await client.close()
+        # Closing twice is harmless
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_aio_args_and_headers(aio_server):
+    aio_server.get(
+        f"{BASE_URL}/v1/users/dummy/", payload={"result": {"username": "dummy"}}
+    )
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        response = await client.get_user(
+            username="dummy",
+            _request_options={
+                "headers": {"X-Fields": ["username", "emails"]},
+                "timeout": 10,
+            },
+        )
+    assert response.result == {"username": "dummy"}
+    [(url, call)] = _requests(aio_server)
+    assert call.kwargs["headers"]["X-Fields"] == "username,emails"
+    assert call.kwargs["timeout"].total == 10
+
+
+@pytest.mark.asyncio
+async def test_aio_post(aio_server):
+    aio_server.post(
+        re.compile(r"^http://example\.com/fasjson/v1/certs/\?.*$"),
+        payload={"result": {"certificate": "dummy"}},
+    )
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        response = await client.sign_csr(user="dummy", csr="dummy-csr")
+    assert response.result == {"certificate": "dummy"}
+    [(url, call)] = _requests(aio_server, "POST")
+    assert url.query == {"user": "dummy", "csr": "dummy-csr"}
+
+
+@pytest.mark.asyncio
+async def test_aio_api_error(aio_server):
+    aio_server.get(
+        f"{BASE_URL}/v1/me/",
+        status=500,
+        reason="Server Error",
+        payload={"message": "Something's wrong"},
+    )
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        with pytest.raises(APIError) as e:
+            await client.whoami()
+    assert e.value.code == 500
+    assert e.value.message == "Something's wrong"
+
+
+@pytest.mark.asyncio
+async def test_aio_auth(aio_server, mocker):
+    negotiate_header = mocker.patch.object(
+        GssapiAuthenticator, "negotiate_header", return_value="Negotiate dummy"
+    )
+    aio_server.get(
+        f"{BASE_URL}/v1/me/",
+        status=401,
+        headers={"WWW-Authenticate": "Negotiate"},
+    )
+    aio_server.get(f"{BASE_URL}/v1/me/", payload={"result": {"username": "dummy"}})
+    async with AsyncClient(BASE_URL, principal="dummy@EXAMPLE.TEST") as client:
+        response = await client.whoami()
+    assert response.result == {"username": "dummy"}
+    negotiate_header.assert_called_once_with("example.com")
+    calls = _requests(aio_server)
+    assert "Authorization" not in calls[0][1].kwargs["headers"]
+    assert calls[1][1].kwargs["headers"]["Authorization"] == "Negotiate dummy"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status", [200, 401])
+async def test_aio_opportunistic_auth(aio_server, mocker, status):
+    negotiate_header = mocker.patch.object(
+        GssapiAuthenticator, "negotiate_header", return_value="Negotiate dummy"
+    )
+    if status == 401:
+        aio_server.get(
+            f"{BASE_URL}/v1/me/", status=401, headers={"WWW-Authenticate": "Negotiate"}
+        )
+    aio_server.get(f"{BASE_URL}/v1/me/", payload={"result": {"username": "dummy"}})
+    async with AsyncClient(
+        BASE_URL, principal="dummy@EXAMPLE.TEST", opportunistic_auth=True
+    ) as client:
+        response = await client.whoami()
+    assert response.result == {"username": "dummy"}
+    calls = _requests(aio_server)
+    assert calls[0][1].kwargs["headers"]["Authorization"] == "Negotiate dummy"
+    # The spec request was also sent with the token
+    assert client.authenticator.challenges_avoided == (2 if status == 200 else 1)
+    assert client.authenticator.challenges_received == (1 if status == 401 else 0)
+    assert negotiate_header.call_count == (2 if status == 200 else 3)
+
+
+@pytest.mark.asyncio
+async def test_aio_response_cache(aio_server):
+    aio_server.get(
+        f"{BASE_URL}/v1/users/dummy/", payload={"result": {"username": "dummy"}}
+    )
+    async with AsyncClient(BASE_URL, auth=False, response_cache=True) as client:
+        response = await client.get_user(username="dummy")
+        response.result["username"] = "changed"
+        cached = await client.get_user(username="dummy")
+        assert cached is not response
+        assert cached.result == {"username": "dummy"}
+    assert len(_requests(aio_server)) == 1
+    assert client.response_cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_aio_response_cache_stale(aio_server, mocker):
+    monotonic = mocker.patch("fasjson_client.cache.time.monotonic", return_value=1000)
+    url = f"{BASE_URL}/v1/users/dummy/"
+    aio_server.get(url, payload={"result": {"version": 1}})
+    aio_server.get(url, payload={"result": {"version": 2}})
+    aio_server.get(url, exception=aiohttp.ClientConnectionError("down"))
+    aio_server.get(url, exception=aiohttp.ClientConnectionError("down"))
+    cache = ResponseCache(ttl=10, stale_while_revalidate=60, stale_if_error=120)
+    async with AsyncClient(BASE_URL, auth=False, response_cache=cache) as client:
+        await client.get_user(username="dummy")
+        monotonic.return_value += 20
+        response = await client.get_user(username="dummy")
+        assert response.stale is True
+        assert response.result == {"version": 1}
+        await asyncio.gather(*cache._tasks)
+        response = await client.get_user(username="dummy")
+        assert response.stale is False
+        assert response.result == {"version": 2}
+        # The refresh fails
+        monotonic.return_value += 20
+        response = await client.get_user(username="dummy")
+        await asyncio.gather(*cache._tasks)
+        assert response.result == {"version": 2}
+        # The server is down
+        monotonic.return_value += 100
+        response = await client.get_user(username="dummy")
+        assert response.stale is True
+        assert response.result == {"version": 2}
+    assert cache.stale_hits == 2
+    assert cache.stale_errors == 1
+
+
+@pytest.mark.asyncio
+async def test_aio_response_cache_error(aio_server):
+    aio_server.get(
+        f"{BASE_URL}/v1/users/dummy/", status=503, payload={"message": "Down"}
+    )
+    cache = ResponseCache(stale_if_error=60)
+    async with AsyncClient(BASE_URL, auth=False, response_cache=cache) as client:
+        with pytest.raises(APIError):
+            await client.get_user(username="dummy")
+
+
+@pytest.mark.asyncio
+async def test_aio_get_or_none(aio_server):
+    url = f"{BASE_URL}/v1/users/dummy/"
+    aio_server.get(url, status=404, payload={"message": "Not Found"})
+    aio_server.get(url, payload={"result": {"username": "dummy"}})
+    aio_server.get(url, status=500, payload={"message": "Oops"})
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        assert await client.get_user_or_none(username="dummy") is None
+        response = await client.get_user_or_none(username="dummy")
+        assert response.result == {"username": "dummy"}
+        with pytest.raises(APIError):
+            await client.get_user_or_none(username="dummy")
+        with pytest.raises(AttributeError):
+            client.get_foobar_or_none
+
+
+@pytest.mark.asyncio
+async def test_aio_get_or_none_negative_cache(aio_server):
+    aio_server.get(
+        f"{BASE_URL}/v1/users/dummy/", status=404, payload={"message": "Not Found"}
+    )
+    cache = ResponseCache(not_found_ttl=30)
+    async with AsyncClient(BASE_URL, auth=False, response_cache=cache) as client:
+        assert await client.get_user_or_none(username="dummy") is None
+        assert await client.get_user_or_none(username="dummy") is None
+    assert len(_requests(aio_server)) == 1
+    assert cache.not_found_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_aio_coalesce_requests(aio_server):
+    async def slow_user(url, **kwargs):
+        await asyncio.sleep(0.05)
+        return CallbackResult(payload={"result": {"username": "dummy"}})
+
+    aio_server.get(f"{BASE_URL}/v1/users/dummy/", callback=slow_user, repeat=True)
+    async with AsyncClient(BASE_URL, auth=False, coalesce_requests=True) as client:
+        responses = await asyncio.gather(
+            *(client.get_user(username="dummy") for _ in range(5))
+        )
+    assert [response.result for response in responses] == [{"username": "dummy"}] * 5
+    assert len({id(response.result) for response in responses}) == 5
+    assert len(_requests(aio_server)) == 1
+    assert client.request_coalescer.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_aio_retry(aio_server, mocker):
+    sleep = mocker.patch("fasjson_client.retry.asyncio.sleep")
+    url = f"{BASE_URL}/v1/users/dummy/"
+    aio_server.get(
+        url,
+        status=503,
+        payload={"message": "Down"},
+        headers={"Retry-After": "2"},
+    )
+    aio_server.get(url, exception=aiohttp.ServerDisconnectedError())
+    aio_server.get(url, payload={"result": {"username": "dummy"}})
+    policy = RetryPolicy(jitter=False)
+    async with AsyncClient(BASE_URL, auth=False, retry=policy) as client:
+        response = await client.get_user(username="dummy")
+    assert response.result == {"username": "dummy"}
+    assert [call.args for call in sleep.call_args_list] == [(2,), (1,)]
+    assert policy.stats() == {"retries": 2, "exhausted": 0}
+
+
+@pytest.mark.asyncio
+async def test_aio_retry_exhausted(aio_server, mocker):
+    mocker.patch("fasjson_client.retry.asyncio.sleep")
+    aio_server.get(
+        f"{BASE_URL}/v1/users/dummy/",
+        status=502,
+        payload={"message": "Bad Gateway"},
+        repeat=True,
+    )
+    async with AsyncClient(BASE_URL, auth=False, retry=True) as client:
+        with pytest.raises(APIError):
+            await client.get_user(username="dummy")
+    assert len(_requests(aio_server)) == 3
+    assert client.retry_policy.exhausted == 1
+
+
+@pytest.mark.asyncio
+async def test_aio_circuit_breaker(aio_server):
+    url = f"{BASE_URL}/v1/users/dummy/"
+    aio_server.get(url, payload={"result": {"username": "dummy"}})
+    aio_server.get(url, exception=aiohttp.ClientConnectionError("down"))
+    aio_server.get(url, status=500, payload={"message": "Oops"})
+    breaker = CircuitBreaker(failure_threshold=2)
+    async with AsyncClient(BASE_URL, auth=False, circuit_breaker=breaker) as client:
+        response = await client.get_user(username="dummy")
+        assert response.result == {"username": "dummy"}
+        with pytest.raises(aiohttp.ClientConnectionError):
+            await client.get_user(username="dummy")
+        with pytest.raises(APIError):
+            await client.get_user(username="dummy")
+        with pytest.raises(CircuitOpenError):
+            await client.get_user(username="dummy")
+    assert breaker.state == OPEN
+    assert len(_requests(aio_server)) == 3
+
+
+@pytest.mark.asyncio
+async def test_aio_circuit_breaker_stale_if_error(aio_server, mocker):
+    monotonic = mocker.patch("fasjson_client.cache.time.monotonic", return_value=1000)
+    url = f"{BASE_URL}/v1/users/dummy/"
+    aio_server.get(url, payload={"result": {"username": "dummy"}})
+    aio_server.get(url, exception=aiohttp.ClientConnectionError("down"))
+    cache = ResponseCache(ttl=10, stale_if_error=60)
+    breaker = CircuitBreaker(failure_threshold=1)
+    async with AsyncClient(
+        BASE_URL, auth=False, circuit_breaker=breaker, response_cache=cache
+    ) as client:
+        await client.get_user(username="dummy")
+        monotonic.return_value += 20
+        assert (await client.get_user(username="dummy")).stale
+        assert breaker.state == OPEN
+        assert (await client.get_user(username="dummy")).stale
+    assert len(_requests(aio_server)) == 2
+
+
+@pytest.mark.asyncio
+async def test_aio_rate_limit(aio_server, mocker):
+    sleep = mocker.patch("fasjson_client.ratelimit.asyncio.sleep")
+    aio_server.get(
+        f"{BASE_URL}/v1/users/dummy/",
+        payload={"result": {"username": "dummy"}},
+        repeat=True,
+    )
+    limiter = RateLimiter(0.1, burst=2)
+    async with AsyncClient(BASE_URL, auth=False, rate_limit=limiter) as client:
+        for _ in range(3):
+            await client.get_user(username="dummy")
+    assert client.rate_limiter is limiter
+    assert limiter.throttled == 1
+    sleep.assert_called_once()
+    assert AsyncClient(BASE_URL, rate_limit=5).rate_limiter.rate == 5
+
+
+@pytest.mark.asyncio
+async def test_aio_operation_timeouts(aio_server):
+    timeouts = []
+
+    async def callback(url, **kwargs):
+        timeouts.append(kwargs.get("timeout"))
+        return CallbackResult(payload={"result": {"username": "dummy"}})
+
+    aio_server.get(f"{BASE_URL}/v1/users/dummy/", callback=callback, repeat=True)
+    async with AsyncClient(
+        BASE_URL,
+        auth=False,
+        timeout=30,
+        connect_timeout=5,
+        operation_timeouts={"get_user": 2},
+    ) as client:
+        await client.get_user(username="dummy")
+        await client.get_user(username="dummy", _deadline=1)
+        with pytest.raises(DeadlineExceeded):
+            await client.get_user(username="dummy", _deadline=0)
+    assert (timeouts[0].connect, timeouts[0].total) == (5, 2)
+    assert 0 < timeouts[1].connect <= 1
+    assert 0 < timeouts[1].total <= 1
+    assert len(timeouts) == 2
+
+
+@pytest.mark.asyncio
+async def test_aio_deadline_timed_out(aio_server, clock):
+    async def callback(url, **kwargs):
+        clock.return_value += 5
+        raise asyncio.TimeoutError()
+
+    aio_server.get(f"{BASE_URL}/v1/users/dummy/", callback=callback, repeat=True)
+    aio_server.get(
+        f"{BASE_URL}/v1/users/other/", status=404, payload={"message": "Nope"}
+    )
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        with pytest.raises(DeadlineExceeded) as e:
+            await client.get_user(username="dummy", _deadline=1)
+        assert isinstance(e.value.__cause__, asyncio.TimeoutError)
+        with pytest.raises(asyncio.TimeoutError):
+            await client.get_user(username="dummy", _deadline=10)
+        assert await client.get_user_or_none(username="other", _deadline=10) is None
+
+
+@pytest.mark.asyncio
+async def test_aio_retry_deadline(aio_server, mocker):
+    sleep = mocker.patch("fasjson_client.retry.asyncio.sleep")
+    aio_server.get(
+        f"{BASE_URL}/v1/users/dummy/",
+        status=503,
+        payload={"message": "Down"},
+        headers={"Retry-After": "10"},
+    )
+    async with AsyncClient(BASE_URL, auth=False, retry=True) as client:
+        with pytest.raises(DeadlineExceeded):
+            await client.get_user(username="dummy", _deadline=5)
+    sleep.assert_not_called()
+    assert client.retry_policy.exhausted == 1
+
+
+@pytest.mark.asyncio
+async def test_aio_list_all_entities_deadline(aio_server, clock):
+    pages = _users_pages(5)
+
+    async def callback(url, **kwargs):
+        if url.query.get("page_number") == "3":
+            clock.return_value += 1
+        return await pages(url, **kwargs)
+
+    aio_server.get(USERS_URL, callback=callback, repeat=True)
+    users = []
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        with pytest.raises(DeadlineExceeded):
+            async for user in client.list_all_entities(
+                "users", page_size=1, deadline=0.5
+            ):
+                users.append(user)
+    # The mocked server ignores the request timeouts, the next page is not requested.
+    assert users == [{"username": f"dummy-{i}"} for i in range(1, 4)]
+
+
+@pytest.mark.asyncio
+async def test_aio_prefetched_page_deadline(aio_server, clock):
+    aio_server.get(USERS_URL, callback=_users_pages(3, delays={2: 1}), repeat=True)
+    async with AsyncClient(BASE_URL, auth=False, prefetch_pages=1) as client:
+        response = await client.list_users(page_size=1)
+        with pytest.raises(DeadlineExceeded):
+            await response.next_page(deadline=0.05)
+        response = await client.list_users(page_size=1, page_number=2)
+        response = await response.next_page(deadline=10)
+    assert response.result == [{"username": "dummy-3"}]
+
+
+@pytest.mark.asyncio
+async def test_aio_get_users_deadline(aio_server):
+    callback, _state = _users()
+    aio_server.get(USER_URL, callback=callback, repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        result = await client.get_users(["dummy", "other"], deadline=0)
+        assert result.results == {}
+        assert all(isinstance(e, DeadlineExceeded) for e in result.errors.values())
+        result = await client.get_users(["dummy"], deadline=10)
+    assert result.results == {"dummy": {"username": "dummy"}}
+
+
+@pytest.mark.asyncio
+async def test_aio_hedge(aio_server):
+    calls = []
+
+    async def callback(url, **kwargs):
+        calls.append(url)
+        try:
+            await asyncio.sleep(1 if len(calls) == 1 else 0)
+        except asyncio.CancelledError:
+            calls.append("cancelled")
+            raise
+        return CallbackResult(payload={"result": {"username": f"dummy-{len(calls)}"}})
+
+    aio_server.get(f"{BASE_URL}/v1/users/dummy/", callback=callback, repeat=True)
+    hedger = Hedger(delay=0.05)
+    async with AsyncClient(BASE_URL, auth=False, hedge=hedger) as client:
+        response = await client.get_user(username="dummy")
+        await asyncio.sleep(0)
+    assert response.result == {"username": "dummy-2"}
+    assert calls[2] == "cancelled"
+    assert hedger.stats() == {
+        "calls": 1,
+        "hedged": 1,
+        "wins": 1,
+        "throttled": 0,
+        "hedge_rate": 1.0,
+    }
+    assert isinstance(AsyncClient(BASE_URL, hedge=True).hedger, Hedger)
+
+
+@pytest.mark.asyncio
+async def test_aio_endpoints(aio_server, fixture_dir, mocker):
+    mocker.patch(
+        "fasjson_client.endpoints.random.choices",
+        side_effect=lambda population, weights: [population[0]],
+    )
+    urls = [
+        "http://fasjson01.example.com/fasjson",
+        "http://fasjson02.example.com/fasjson",
+    ]
+    with open(f"{fixture_dir}/spec.json") as f:
+        spec = f.read()
+    aio_server.get(
+        f"{urls[0]}/specs/v1.json", exception=aiohttp.ClientConnectionError("down")
+    )
+    aio_server.get(
+        f"{urls[1]}/specs/v1.json", body=spec, content_type="application/json"
+    )
+    aio_server.get(
+        f"{urls[0]}/v1/users/dummy/", exception=aiohttp.ClientConnectionError("down")
+    )
+    aio_server.get(
+        f"{urls[1]}/v1/users/dummy/", payload={"result": {"username": "dummy"}}
+    )
+    aio_server.get(
+        f"{urls[1]}/v1/users/missing/", status=404, payload={"message": "Not Found"}
+    )
+    async with AsyncClient(urls, auth=False) as client:
+        response = await client.get_user(username="dummy")
+        with pytest.raises(APIError):
+            await client.get_user(username="missing")
+    assert response.result == {"username": "dummy"}
+    assert client.endpoint_pool.failovers == 1
+    assert AsyncClient(BASE_URL).endpoint_pool is None
+
+
+@pytest.mark.asyncio
+async def test_aio_endpoints_spec_invalid(aio_server):
+    urls = [
+        "http://fasjson01.example.com/fasjson",
+        "http://fasjson02.example.com/fasjson",
+    ]
+    aio_server.get(f"{urls[0]}/specs/v1.json", body="invalid")
+    with pytest.raises(ClientSetupError) as e:
+        async with AsyncClient(urls, auth=False):
+            pass  # pragma: no cover
+    assert e.value.message == "remote data validation failed"
+
+
+@pytest.mark.asyncio
+async def test_aio_no_response_cache():
+    assert AsyncClient(BASE_URL, response_cache=False).response_cache is None
+
+
+@pytest.mark.asyncio
+async def test_aio_pagination(aio_server):
+    aio_server.get(USERS_URL, callback=_users_pages(3), repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        response = await client.list_users(page_size=1)
+        with pytest.raises(PaginationError):
+            await response.prev_page()
+        response = await response.next_page()
+        assert response.result == [{"username": "dummy-2"}]
+        response = await response.prev_page()
+        assert response.result == [{"username": "dummy-1"}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency", [1, 3])
+async def test_aio_list_all_entities(aio_server, concurrency):
+    aio_server.get(USERS_URL, callback=_users_pages(5, delays={3: 0.1}), repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        result = [
+            user
+            async for user in client.list_all_entities(
+                "users", page_size=1, concurrency=concurrency
+            )
+        ]
+    assert result == [{"username": f"dummy-{i}"} for i in range(1, 6)]
+
+
+@pytest.mark.asyncio
+async def test_aio_list_all_entities_early_stop(aio_server):
+    aio_server.get(USERS_URL, callback=_users_pages(10), repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        result = client.list_all_entities(
+            "users", page_size=1, concurrency=2, max_buffered_pages=2
+        )
+        assert await result.__anext__() == {"username": "dummy-1"}
+        assert await result.__anext__() == {"username": "dummy-2"}
+        await result.aclose()
+        await asyncio.sleep(0.1)
+    assert len(_requests(aio_server)) <= 4
+
+
+@pytest.mark.asyncio
+async def test_aio_prefetch_pages(aio_server):
+    aio_server.get(USERS_URL, callback=_users_pages(4), repeat=True)
+    aio_server.post(
+        re.compile(r"^http://example\.com/fasjson/v1/certs/\?.*$"),
+        payload={"result": {"certificate": "dummy"}},
+    )
+    prefetcher = PagePrefetcher(pages=2)
+    async with AsyncClient(BASE_URL, auth=False, prefetch_pages=prefetcher) as client:
+        response = await client.list_users(page_size=1)
+        usernames = [response.result[0]["username"]]
+        while response.page["page_number"] < response.page["total_pages"]:
+            response = await response.next_page()
+            usernames.append(response.result[0]["username"])
+        await client.sign_csr(user="dummy", csr="dummy-csr")
+    assert usernames == [f"dummy-{i}" for i in range(1, 5)]
+    assert len(_requests(aio_server)) == 4
+    assert client.page_prefetcher.hits == 3
+
+
+@pytest.mark.asyncio
+async def test_aio_prefetch_pages_errors(aio_server):
+    async def callback(url, **kwargs):
+        page_number = int(url.query.get("page_number", 1))
+        if page_number == 3:
+            await asyncio.sleep(10)
+        if page_number == 2:
+            return CallbackResult(status=500, payload={"message": "Oops"})
+        return CallbackResult(
+            payload={
+                "result": [],
+                "page": {"page_number": page_number, "page_size": 1, "total_pages": 3},
+            }
+        )
+
+    aio_server.get(USERS_URL, callback=callback, repeat=True)
+    async with AsyncClient(BASE_URL, auth=False, prefetch_pages=2) as client:
+        await client.list_users(page_size=1)
+        await asyncio.sleep(0.05)
+        tasks = [task for task, _started in client.page_prefetcher._pending.values()]
+        assert tasks[0].done()
+    await asyncio.sleep(0)
+    assert all(task.done() for task in tasks)
+    assert tasks[1].cancelled()
+    assert client.page_prefetcher._pending == {}
+
+
+@pytest.mark.asyncio
+async def test_aio_resumable_list_all_entities(aio_server, tmp_path):
+    aio_server.get(USERS_URL, callback=_users_pages(3), repeat=True)
+    checkpoint = str(tmp_path / "users.json")
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        crawl = client.resumable_list_all_entities(
+            "users", page_size=1, checkpoint=checkpoint
+        )
+        async for user in crawl:
+            break
+        assert crawl.cursor.page_number == 0
+        async for user in crawl:
+            if user["username"] == "dummy-2":
+                break
+        assert crawl.cursor.page_number == 1
+        resumed = client.resumable_list_all_entities(
+            "users", page_size=1, checkpoint=checkpoint
+        )
+        assert resumed.cursor.page_number == 1
+        result = [user async for user in resumed]
+        assert resumed.cursor.finished
+    assert result == [{"username": "dummy-2"}, {"username": "dummy-3"}]
+    assert not os.path.exists(checkpoint)
+
+
+@pytest.mark.asyncio
+async def test_aio_shards(aio_server):
+    aio_server.get(USERS_URL, callback=_users_pages(5), repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        shards = await client.get_shards("users", 2, page_size=1)
+        assert [(shard.first_page, shard.last_page) for shard in shards] == [
+            (1, 3),
+            (4, 5),
+        ]
+        result = [
+            user
+            for shard in (shards[0], shards[1]._asdict())
+            async for user in client.iter_shard(shard)
+        ]
+    assert result == [{"username": f"dummy-{i}"} for i in range(1, 6)]
+
+
+@pytest.mark.asyncio
+async def test_aio_list_all_entities_wrong_name(aio_server):
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        with pytest.raises(ValueError):
+            async for _entity in client.list_all_entities("foobar"):
+                pass  # pragma: no cover
+
+
+USER_URL = re.compile(r"^http://example\.com/fasjson/v1/users/([^/]+)/$")
+
+
+def _users(missing=(), failing=(), delay=0):
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    async def callback(url, **kwargs):
+        username = USER_URL.match(str(url)).group(1)
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(delay)
+        state["in_flight"] -= 1
+        if username in missing:
+            return CallbackResult(status=404, payload={"message": "Not Found"})
+        if username in failing:
+            return CallbackResult(status=500, payload={"message": "Server Error"})
+        return CallbackResult(payload={"result": {"username": username}})
+
+    return callback, state
+
+
+@pytest.mark.asyncio
+async def test_aio_get_users(aio_server):
+    callback, state = _users(missing={"missing"}, failing={"failing"}, delay=0.01)
+    aio_server.get(USER_URL, callback=callback, repeat=True)
+    usernames = ["dummy", "missing", "failing", "dummy"] + [f"u{i}" for i in range(8)]
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        result = await client.get_users(usernames, concurrency=3)
+    assert result.results["dummy"] == {"username": "dummy"}
+    assert result.results["missing"] is None
+    assert len(result.results) == 10
+    assert list(result.errors) == ["failing"]
+    assert result.errors["failing"].code == 500
+    assert len(_requests(aio_server)) == 11
+    assert 1 < state["max_in_flight"] <= 3
+
+
+@pytest.mark.asyncio
+async def test_aio_get_groups_connection_error(aio_server):
+    aio_server.get(
+        f"{BASE_URL}/v1/groups/admins/",
+        exception=aiohttp.ClientConnectionError("down"),
+    )
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        result = await client.get_groups(["admins"])
+    assert result.results == {}
+    assert isinstance(result.errors["admins"], aiohttp.ClientConnectionError)
+
+
+@pytest.mark.asyncio
+async def test_aio_iter_entities_early_stop(aio_server):
+    callback, state = _users(delay=0.01)
+    aio_server.get(USER_URL, callback=callback, repeat=True)
+    consumed = []
+
+    def usernames():
+        for i in range(1000):
+            consumed.append(i)
+            yield f"user{i}"
+
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        lookups = client.iter_entities("users", usernames(), concurrency=2)
+        name, entity, error = await lookups.__anext__()
+        assert entity == {"username": name}
+        assert error is None
+        await lookups.aclose()
+        await asyncio.sleep(0.05)
+    assert len(consumed) <= 3
+    assert len(_requests(aio_server)) <= 3
+
+
+@pytest.mark.asyncio
+async def test_aio_get_entities_wrong_name(aio_server):
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        with pytest.raises(ValueError):
+            await client.get_entities("foobar", ["dummy"])
+
+
+@pytest.mark.asyncio
+async def test_aio_loader(aio_server):
+    callback, state = _users(missing={"missing"}, failing={"failing"})
+    aio_server.get(USER_URL, callback=callback, repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        loader = client.loader("users")
+        assert isinstance(loader, AsyncEntityLoader)
+        results = await asyncio.gather(
+            loader.get("dummy"),
+            loader.get("missing"),
+            loader.get("dummy"),
+            loader.get("failing"),
+            return_exceptions=True,
+        )
+        assert results[:3] == [{"username": "dummy"}, None, {"username": "dummy"}]
+        assert isinstance(results[3], APIError)
+        other = await asyncio.gather(*loader.load_many(["other"]))
+        assert other == [{"username": "other"}]
+    assert loader.batches == 2
+    assert loader.deduplicated == 1
+    assert len(_requests(aio_server)) == 4
+
+
+@pytest.mark.asyncio
+async def test_aio_loader_window(aio_server):
+    callback, state = _users()
+    aio_server.get(USER_URL, callback=callback, repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        loader = client.loader("users", window=0.01, max_batch_size=2)
+        first = loader.get("first")
+        await asyncio.sleep(0)
+        results = await asyncio.gather(first, loader.get("second"), loader.get("third"))
+    assert [user["username"] for user in results] == ["first", "second", "third"]
+    assert loader.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_aio_loader_errors(aio_server, mocker):
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        loader = client.loader("users")
+        mocker.patch.object(client, "iter_entities", side_effect=RuntimeError("Oops"))
+        with pytest.raises(RuntimeError):
+            await loader.get("dummy")
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+            yield  # pragma: no cover
+
+        mocker.patch.object(client, "iter_entities", side_effect=hang)
+        future = loader.load("dummy")
+        loader.dispatch()
+        loader.dispatch()
+        for task in loader._tasks:
+            task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await future
+        with pytest.raises(ValueError):
+            client.loader("foobars")
+
+
+@pytest.mark.asyncio
+async def test_aio_loader_cancelled(aio_server, mocker):
+    callback, state = _users()
+    aio_server.get(USER_URL, callback=callback, repeat=True)
+    async with AsyncClient(BASE_URL, auth=False) as client:
+        loader = client.loader("users")
+        cancelled, other = loader.load_many(["dummy", "other"])
+        cancelled.cancel()
+        assert await other == {"username": "other"}
+
+        mocker.patch.object(client, "iter_entities", side_effect=RuntimeError("Oops"))
+        cancelled, failed = loader.load_many(["dummy", "other"])
+        cancelled.cancel()
+        with pytest.raises(RuntimeError):
+            await failed
+
+
+@pytest.mark.asyncio
+async def test_aio_bundled_spec():
+    with aioresponses() as m:
+        m.get("http://example.com/v1/me/", payload={"result": {"username": "dummy"}})
+        async with AsyncClient(
+            "http://example.com/", auth=False, spec="bundled"
+        ) as client:
+            response = await client.whoami()
+    assert response.result == {"username": "dummy"}
+
+
+@pytest.mark.asyncio
+async def test_aio_shared_session(aio_server):
+    async with aiohttp.ClientSession() as session:
+        async with AsyncClient(BASE_URL, auth=False, session=session) as client:
+            assert client._session is session
+        assert not session.closed
+
+
+@pytest.mark.asyncio
+async def test_aio_session_options(aio_server):
+    async with AsyncClient(
+        BASE_URL,
+        auth=False,
+        connection_limit=20,
+        timeout=30,
+        connect_timeout=5,
+        keep_alive=False,
+    ) as client:
+        assert client._session.connector.limit == 20
+        assert client._session.connector.force_close is True
+        assert client._session.timeout.total == 30
+        assert client._session.timeout.connect == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "mock_kwargs,status_code",
+    [
+        ({"status": 404, "reason": "Not Found"}, 404),
+        ({"exception": aiohttp.ClientConnectionError("down")}, None),
+    ],
+)
+async def test_aio_spec_load_error(mock_kwargs, status_code):
+    with aioresponses() as m:
+        m.get(SPEC_URL, **mock_kwargs)
+        client = AsyncClient(BASE_URL, auth=False)
+        with pytest.raises(ClientSetupError) as e:
+            await client.setup()
+        await client.close()
+    assert str(e.value) == (
+        "error loading remote spec, are you sure this is the URL to a FASJSON instance?"
+    )
+    assert e.value.data.get("status_code") == status_code
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "body,message",
+    [
+        ("{somethin: {wrong:", "remote data validation failed"),
+        ('{"foo": "bar"}', "schema validation failed"),
+    ],
+)
+async def test_aio_spec_invalid(body, message):
+    with aioresponses() as m:
+        m.get(SPEC_URL, body=body)
+        client = AsyncClient(BASE_URL, auth=False)
+        with pytest.raises(ClientSetupError) as e:
+            await client.setup()
+        await client.close()
+    assert str(e.value) == message
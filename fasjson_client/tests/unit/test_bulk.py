@@ -0,0 +1,121 @@
+import re
+import threading
+import time
+
+import pytest
+import requests
+
+from fasjson_client.bulk import unique
+from fasjson_client.client import Client
+from fasjson_client.errors import APIError
+
+from .utils import user_requests
+
+USER_URL = re.compile(r"^http://example\.com/fasjson/v1/users/([^/]+)/$")
+
+
+def _users(missing=(), failing=(), delay=0):
+    lock = threading.Lock()
+    state = {"in_flight": 0, "max_in_flight": 0, "threads": set()}
+
+    def callback(request, context):
+        username = USER_URL.match(request.url).group(1)
+        with lock:
+            state["threads"].add(threading.current_thread().name)
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        time.sleep(delay)
+        with lock:
+            state["in_flight"] -= 1
+        if username in missing:
+            context.status_code = 404
+            return {"message": "Not Found"}
+        if username in failing:
+            context.status_code = 500
+            return {"message": "Server Error"}
+        return {"result": {"username": username}}
+
+    return callback, state
+
+
+def test_unique():
+    assert list(unique(["a", "b", "a", "c", "b"])) == ["a", "b", "c"]
+
+
+def test_get_users(server):
+    callback, state = _users(missing={"missing"}, failing={"failing"})
+    server.reqs.get(
+        USER_URL, json=callback, headers={"Content-Type": "application/json"}
+    )
+    client = Client("http://example.com/fasjson")
+    result = client.get_users(["dummy", "missing", "failing", "other", "dummy"])
+    assert result.results == {
+        "dummy": {"username": "dummy"},
+        "other": {"username": "other"},
+        "missing": None,
+    }
+    assert list(result.errors) == ["failing"]
+    assert isinstance(result.errors["failing"], APIError)
+    assert result.errors["failing"].code == 500
+    assert len(user_requests(server)) == 4
+
+
+def test_get_users_concurrency(server):
+    callback, state = _users(delay=0.01)
+    server.reqs.get(
+        USER_URL, json=callback, headers={"Content-Type": "application/json"}
+    )
+    client = Client("http://example.com/fasjson")
+    result = client.get_users([f"user{i}" for i in range(12)], concurrency=3)
+    assert len(result.results) == 12
+    assert state["max_in_flight"] <= 3
+    # requests_mock serializes the requests, check the lookups ran in the worker threads.
+    assert 1 < len(state["threads"]) <= 3
+    assert all(name.startswith("fasjson-bulk") for name in state["threads"])
+
+
+def test_get_users_connection_error(server):
+    server.reqs.get(USER_URL, exc=requests.exceptions.ConnectionError("down"))
+    client = Client("http://example.com/fasjson")
+    result = client.get_users(["dummy"])
+    assert result.results == {}
+    assert isinstance(result.errors["dummy"], requests.exceptions.ConnectionError)
+
+
+def test_iter_entities_lazy(server):
+    callback, state = _users()
+    server.reqs.get(
+        USER_URL, json=callback, headers={"Content-Type": "application/json"}
+    )
+    client = Client("http://example.com/fasjson")
+    consumed = []
+
+    def usernames():
+        for i in range(1000):
+            consumed.append(i)
+            yield f"user{i}"
+
+    lookups = client.iter_entities("users", usernames(), concurrency=2)
+    name, entity, error = next(lookups)
+    assert entity == {"username": name}
+    assert error is None
+    assert len(consumed) <= 3
+    lookups.close()
+    assert len(consumed) <= 3
+
+
+def test_get_groups(server):
+    server.mock_endpoint("/groups/admins/", json={"result": {"groupname": "admins"}})
+    client = Client("http://example.com/fasjson")
+    result = client.get_groups(["admins"])
+    assert result.results == {"admins": {"groupname": "admins"}}
+    assert result.errors == {}
+
+
+def test_get_entities_invalid(server):
+    client = Client("http://example.com/fasjson")
+    with pytest.raises(ValueError) as e:
+        client.get_entities("foobars", ["dummy"])
+    assert str(e.value) == (
+        "Can't look up foobars by name, valid entities are: groups, users."
+    )
@@ -0,0 +1,432 @@
+import errno
+import threading
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from fasjson_client.cache import ResponseCache
+from fasjson_client.client import Client
+from fasjson_client.errors import APIError, DeadlineExceeded
+
+from .utils import user_requests
+
+
+def _operation(operation_id, http_method="get"):
+    return SimpleNamespace(operation_id=operation_id, http_method=http_method)
+
+
+@pytest.fixture
+def monotonic(mocker):
+    return mocker.patch("fasjson_client.cache.time.monotonic", return_value=1000)
+
+
+def test_make_key_normalized():
+    make_key = ResponseCache.make_key
+    assert make_key("list_users", {"page_size": 1, "page_number": 2}) == make_key(
+        "list_users", {"page_number": 2, "page_size": 1}
+    )
+    assert make_key(
+        "get_user",
+        {
+            "username": "dummy",
+            "_request_options": {"headers": {"X-Fields": ["username", "emails"]}},
+        },
+    ) == make_key(
+        "get_user",
+        {
+            "username": "dummy",
+            "_request_options": {
+                "headers": {"X-Fields": "emails, username"},
+                "timeout": 10,
+            },
+        },
+    )
+    assert make_key("get_user", {"username": "dummy"}) != make_key(
+        "get_user",
+        {"username": "dummy", "_request_options": {"headers": {"X-Fields": "emails"}}},
+    )
+    assert make_key("search_users", {"group": ["a", "b"]}) == (
+        "search_users",
+        (("group", ("a", "b")),),
+        None,
+        None,
+    )
+    assert make_key("whoami", {}, scope=("url", "a")) != make_key(
+        "whoami", {}, scope=("url", "b")
+    )
+
+
+def test_is_cacheable():
+    cache = ResponseCache(ttls={"whoami": 0})
+    assert cache.is_cacheable(_operation("get_user"))
+    assert not cache.is_cacheable(_operation("whoami"))
+    assert not cache.is_cacheable(_operation("sign_csr", "POST"))
+
+
+def test_ttl(monotonic):
+    cache = ResponseCache(ttl=10, ttls={"get_group": 60})
+    cache.set(("get_user", (), None), "user")
+    cache.set(("get_group", (), None), "group")
+    monotonic.return_value += 11
+    assert cache.get(("get_user", (), None)) is None
+    assert cache.get(("get_group", (), None)) == "group"
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "stale_hits": 0,
+        "stale_errors": 0,
+        "not_found_hits": 0,
+        "size": 1,
+    }
+
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_invalidate():
+    cache = ResponseCache()
+    cache.set(ResponseCache.make_key("get_user", {"username": "a"}), "a")
+    cache.set(
+        ResponseCache.make_key(
+            "get_user",
+            {"username": "a", "_request_options": {"headers": {"X-Fields": "emails"}}},
+        ),
+        "a-emails",
+    )
+    cache.set(ResponseCache.make_key("get_user", {"username": "b"}), "b")
+    cache.set(ResponseCache.make_key("get_group", {"groupname": "a"}), "group")
+    assert cache.invalidate("get_user", username="a") == 2
+    assert len(cache) == 2
+    assert cache.invalidate("get_user") == 1
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_client_cache(server):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson", response_cache=True)
+    response = client.get_user(username="dummy")
+    # The callers can't change each other's responses.
+    response.result["username"] = "changed"
+    cached = client.get_user(username="dummy")
+    assert cached is not response
+    assert cached.result == {"username": "dummy"}
+    cached.result["username"] = "changed"
+    assert client.get_user(username="dummy").result == {"username": "dummy"}
+    assert len(user_requests(server)) == 1
+    assert client.response_cache.hits == 2
+    # A different mask is a different entry
+    client.get_user(
+        username="dummy", _request_options={"headers": {"X-Fields": "username"}}
+    )
+    assert len(user_requests(server)) == 2
+    # After invalidation, the server is called again
+    client.response_cache.invalidate("get_user", username="dummy")
+    client.get_user(username="dummy")
+    assert len(user_requests(server)) == 3
+
+
+def test_client_cache_errors_not_cached(server):
+    server.mock_endpoint(
+        "/users/dummy/",
+        [
+            {"status_code": 500, "json": {"message": "Server Error"}},
+            {"json": {"result": {"username": "dummy"}}},
+        ],
+    )
+    client = Client("http://example.com/fasjson", response_cache=True)
+    with pytest.raises(APIError):
+        client.get_user(username="dummy")
+    assert client.get_user(username="dummy").result == {"username": "dummy"}
+    assert len(client.response_cache) == 1
+
+
+def test_client_cache_sign_csr_not_cached(server):
+    server.mock_endpoint(
+        "/certs/", method="POST", json={"result": {"certificate": "dummy"}}
+    )
+    client = Client("http://example.com/fasjson", response_cache=True)
+    client.sign_csr(user="dummy", csr="dummy-csr")
+    client.sign_csr(user="dummy", csr="dummy-csr")
+    cert_requests = [r for r in server.reqs.request_history if "certs" in r.url]
+    assert len(cert_requests) == 2
+    assert len(client.response_cache) == 0
+
+
+def test_client_cache_shared(server):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    cache = ResponseCache()
+    Client("http://example.com/fasjson", response_cache=cache).get_user(
+        username="dummy"
+    )
+    Client("http://example.com/fasjson", response_cache=cache).get_user(
+        username="dummy"
+    )
+    assert len(user_requests(server)) == 1
+    # The clients authenticating as another principal don't get the same responses.
+    other = Client(
+        "http://example.com/fasjson",
+        principal="other@EXAMPLE.TEST",
+        response_cache=cache,
+    )
+    other.get_user(username="dummy")
+    other.get_user(username="dummy")
+    assert len(user_requests(server)) == 2
+
+
+def test_client_no_cache(server):
+    assert Client("http://example.com/fasjson").response_cache is None
+    client = Client("http://example.com/fasjson", response_cache=False)
+    assert client.response_cache is None
+
+
+def test_stale_while_revalidate(server, monotonic):
+    server.mock_endpoint(
+        "/users/dummy/",
+        [
+            {"json": {"result": {"username": "dummy", "version": 1}}},
+            {"json": {"result": {"username": "dummy", "version": 2}}},
+        ],
+    )
+    cache = ResponseCache(ttl=10, stale_while_revalidate=60)
+    client = Client("http://example.com/fasjson", response_cache=cache)
+    response = client.get_user(username="dummy")
+    assert response.stale is False
+    monotonic.return_value += 20
+    refreshed = threading.Event()
+    end_refresh = cache._end_refresh
+
+    def _end_refresh(*args, **kwargs):
+        end_refresh(*args, **kwargs)
+        refreshed.set()
+
+    cache._end_refresh = _end_refresh
+    # The stale response is returned right away and refreshed in the background
+    stale = client.get_user(username="dummy")
+    assert stale.stale is True
+    assert stale.result["version"] == 1
+    assert response.stale is False
+    assert refreshed.wait(5)
+    response = client.get_user(username="dummy")
+    assert response.stale is False
+    assert response.result["version"] == 2
+    assert cache.stale_hits == 1
+    # Past the stale period, the server is called again
+    monotonic.return_value += 100
+    server.mock_endpoint("/users/dummy/", json={"result": {"version": 3}})
+    assert client.get_user(username="dummy").result == {"version": 3}
+
+
+def test_stale_while_revalidate_single_refresh(monotonic, mocker):
+    cache = ResponseCache(ttl=10, stale_while_revalidate=60)
+    thread = mocker.patch("fasjson_client.cache.threading.Thread")
+    key = ("get_user", (), None)
+    cache.set(key, SimpleNamespace(stale=False))
+    monotonic.return_value += 20
+    assert cache.fetch(key, None).stale is True
+    assert cache.fetch(key, None).stale is True
+    thread.assert_called_once()
+
+
+def test_stale_while_revalidate_refresh_error(monotonic, caplog):
+    cache = ResponseCache(ttl=10, stale_while_revalidate=60)
+    key = ("get_user", (), None)
+    cache.set(key, SimpleNamespace(stale=False))
+
+    def call():
+        raise requests.exceptions.ConnectionError("down")
+
+    cache._refresh(key, call, (OSError,))
+    assert "Could not refresh the cached response for get_user: down" in caplog.text
+    assert cache._refreshing == set()
+
+
+@pytest.mark.parametrize(
+    "mock_kwargs",
+    [
+        {"status_code": 503, "json": {"message": "Service Unavailable"}},
+        {"exc": requests.exceptions.ConnectionError("down")},
+    ],
+)
+def test_stale_if_error(server, monotonic, mock_kwargs, caplog):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    cache = ResponseCache(ttl=10, stale_if_error=60)
+    client = Client("http://example.com/fasjson", response_cache=cache)
+    client.get_user(username="dummy")
+    monotonic.return_value += 20
+    server.reqs.get("http://example.com/fasjson/v1/users/dummy/", **mock_kwargs)
+    response = client.get_user(username="dummy")
+    assert response.stale is True
+    assert response.result == {"username": "dummy"}
+    assert cache.stale_errors == 1
+    assert "Using a stale response for get_user" in caplog.text
+    # Past the stale period, the error is raised
+    monotonic.return_value += 100
+    with pytest.raises((APIError, requests.exceptions.ConnectionError)):
+        client.get_user(username="dummy")
+
+
+def test_stale_if_error_deadline(monotonic):
+    cache = ResponseCache(ttl=10, stale_if_error=60)
+    cache.set(("get_user", (), None, None), SimpleNamespace(result="user"))
+    monotonic.return_value += 20
+
+    def call():
+        raise DeadlineExceeded("Deadline exceeded", errno.ETIMEDOUT)
+
+    response = cache.fetch(("get_user", (), None, None), call)
+    assert response.result == "user"
+    assert response.stale
+    assert cache.stale_errors == 1
+
+
+@pytest.mark.parametrize("status_code", [403, 404])
+def test_stale_if_error_client_error(server, monotonic, status_code):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    cache = ResponseCache(ttl=10, stale_if_error=60)
+    client = Client("http://example.com/fasjson", response_cache=cache)
+    client.get_user(username="dummy")
+    monotonic.return_value += 20
+    server.mock_endpoint(
+        "/users/dummy/", status_code=status_code, json={"message": "Nope"}
+    )
+    with pytest.raises(APIError) as e:
+        client.get_user(username="dummy")
+    assert e.value.code == status_code
+
+
+def test_stale_if_error_no_cached_response(server):
+    server.mock_endpoint("/users/dummy/", status_code=503, json={"message": "Down"})
+    client = Client(
+        "http://example.com/fasjson",
+        response_cache=ResponseCache(stale_if_error=60),
+    )
+    with pytest.raises(APIError):
+        client.get_user(username="dummy")
+
+
+def test_negative_cache(server, monotonic):
+    server.mock_endpoint(
+        "/users/dummy/", status_code=404, json={"message": "Not Found"}
+    )
+    cache = ResponseCache(not_found_ttl=30)
+    client = Client("http://example.com/fasjson", response_cache=cache)
+    assert client.get_user_or_none(username="dummy") is None
+    assert client.get_user_or_none(username="dummy") is None
+    assert len(user_requests(server)) == 1
+    assert cache.not_found_hits == 1
+    # The regular lookup still raises
+    with pytest.raises(APIError):
+        client.get_user(username="dummy")
+    assert len(user_requests(server)) == 2
+    # The entry expires
+    monotonic.return_value += 31
+    assert client.get_user_or_none(username="dummy") is None
+    assert len(user_requests(server)) == 3
+    # The user is created
+    cache.invalidate("get_user", username="dummy")
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    assert client.get_user_or_none(username="dummy").result == {"username": "dummy"}
+    assert client.get_user_or_none(username="dummy").result == {"username": "dummy"}
+    assert len(user_requests(server)) == 4
+
+
+def test_negative_cache_from_regular_lookup(server):
+    server.mock_endpoint(
+        "/users/dummy/", status_code=404, json={"message": "Not Found"}
+    )
+    cache = ResponseCache(not_found_ttl=30)
+    client = Client("http://example.com/fasjson", response_cache=cache)
+    with pytest.raises(APIError):
+        client.get_user(username="dummy")
+    assert client.get_user_or_none(username="dummy") is None
+    assert len(user_requests(server)) == 1
+
+
+def test_negative_cache_disabled(server):
+    server.mock_endpoint(
+        "/users/dummy/", status_code=404, json={"message": "Not Found"}
+    )
+    client = Client("http://example.com/fasjson", response_cache=True)
+    assert client.get_user_or_none(username="dummy") is None
+    assert client.get_user_or_none(username="dummy") is None
+    assert len(user_requests(server)) == 2
+    assert len(client.response_cache) == 0
+
+
+def test_negative_cache_refresh(monotonic):
+    cache = ResponseCache(ttl=10, stale_while_revalidate=60, not_found_ttl=30)
+    key = ("get_user", (), None)
+    cache.set(key, SimpleNamespace(stale=False))
+    # The entity was deleted
+    cache._refresh(key, lambda: None, (OSError,))
+    assert cache.get(key) is None
+    assert cache.is_not_found(key)
+    cache.set(key, SimpleNamespace(stale=False))
+    assert not cache.is_not_found(key)
+
+    def call():
+        raise APIError("Not Found", 404)
+
+    cache._refresh(key, call, (OSError,))
+    assert cache.is_not_found(key)
+
+
+def test_negative_cache_eviction():
+    cache = ResponseCache(maxsize=2, not_found_ttl=30)
+    cache.set("a", 1)
+    cache.set_not_found("b")
+    cache.set("c", 3)
+    assert not cache.is_not_found("b")
+    assert cache.get("a") == 1
+    cache.set("d", 4)
+    assert cache.get("c") is None
+    assert cache.get("a") == 1
+    assert cache.evictions == 2
+
+
+def test_negative_cache_invalidate_and_clear():
+    cache = ResponseCache(not_found_ttl=30)
+    cache.set_not_found(ResponseCache.make_key("get_user", {"username": "a"}))
+    cache.set_not_found(ResponseCache.make_key("get_user", {"username": "b"}))
+    assert cache.invalidate("get_user", username="a") == 1
+    assert cache.stats()["size"] == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_get_or_none_no_cache(server):
+    server.mock_endpoint(
+        "/users/dummy/", status_code=404, json={"message": "Not Found"}
+    )
+    server.mock_endpoint("/groups/dummy/", json={"result": {"groupname": "dummy"}})
+    client = Client("http://example.com/fasjson")
+    assert client.get_user_or_none(username="dummy") is None
+    response = client.get_group_or_none(groupname="dummy")
+    assert response.result == {"groupname": "dummy"}
+    assert repr(response) == "<FASJSONResponse for get_group(groupname=dummy)>"
+    server.mock_endpoint("/users/dummy/", status_code=500, json={"message": "Oops"})
+    with pytest.raises(APIError) as e:
+        client.get_user_or_none(username="dummy")
+    assert e.value.code == 500
+    assert e.value.message == "Oops"
+
+
+@pytest.mark.parametrize("name", ["get_foobar_or_none", "list_users_or_none"])
+def test_get_or_none_unknown(server, name):
+    client = Client("http://example.com/fasjson")
+    with pytest.raises(AttributeError):
+        getattr(client, name)
@@ -0,0 +1,269 @@
+import pytest
+from requests.exceptions import ConnectionError
+
+from fasjson_client.cache import ResponseCache
+from fasjson_client.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from fasjson_client.client import Client
+from fasjson_client.errors import APIError, CircuitOpenError
+from fasjson_client.retry import RetryPolicy
+
+from .utils import user_requests
+
+USER_URL = "http://example.com/fasjson/v1/users/dummy/"
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+@pytest.fixture
+def monotonic(mocker):
+    return mocker.patch("fasjson_client.circuit.time.monotonic", return_value=1000)
+
+
+def _fail():
+    raise ConnectionError("down")
+
+
+def _server_error():
+    raise APIError("Oops", 500)
+
+
+def _not_found():
+    raise APIError("Not Found", 404)
+
+
+def test_circuit_opens_after_consecutive_failures(server, monotonic):
+    server.mock_endpoint("/users/dummy/", status_code=503, json={"message": "Down"})
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    client = Client("http://example.com/fasjson", circuit_breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(APIError):
+            client.get_user(username="dummy")
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as e:
+        client.get_user(username="dummy")
+    assert e.value.data == {"retry_after": 10}
+    assert len(user_requests(server, "/users/dummy/")) == 3
+    assert breaker.stats() == {
+        "state": OPEN,
+        "recent_calls": 3,
+        "recent_failures": 3,
+        "opened": 1,
+        "rejected": 1,
+    }
+
+
+def test_circuit_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2)
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.state == CLOSED
+
+
+def test_circuit_client_errors_are_successes():
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(APIError):
+        breaker.call(_not_found)
+    assert breaker.state == CLOSED
+    with pytest.raises(APIError):
+        breaker.call(_server_error)
+    assert breaker.state == OPEN
+
+
+def test_circuit_failure_rate():
+    breaker = CircuitBreaker(
+        failure_threshold=None, failure_rate=0.5, window_size=4, min_calls=4
+    )
+    for send in (_fail, lambda: None, _fail):
+        try:
+            breaker.call(send)
+        except ConnectionError:
+            pass
+    # Not enough calls yet.
+    assert breaker.state == CLOSED
+    breaker.call(lambda: None)
+    assert breaker.state == OPEN
+
+
+def test_circuit_half_open(monotonic):
+    transitions = []
+    breaker = CircuitBreaker(
+        failure_threshold=1,
+        reset_timeout=10,
+        on_state_change=lambda *args: transitions.append(args),
+    )
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    monotonic.return_value += 10
+
+    def probe():
+        assert breaker.state == HALF_OPEN
+        # Only one probe at a time.
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: None)
+        return "ok"
+
+    assert breaker.call(probe) == "ok"
+    assert breaker.state == CLOSED
+    assert transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+    assert breaker.rejected == 1
+
+
+def test_circuit_half_open_probe_fails(monotonic):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    monotonic.return_value += 10
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: None)
+
+
+def test_circuit_half_open_unknown_outcome(monotonic):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    monotonic.return_value += 10
+
+    def bug():
+        raise ValueError("bug")
+
+    with pytest.raises(ValueError):
+        breaker.call(bug)
+    # The probe slot was released.
+    assert breaker.state == HALF_OPEN
+    breaker.call(lambda: None)
+    assert breaker.state == CLOSED
+
+
+def test_circuit_several_probes(monotonic):
+    breaker = CircuitBreaker(
+        failure_threshold=1, reset_timeout=10, half_open_max_calls=2
+    )
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    monotonic.return_value += 10
+    breaker.call(lambda: None)
+    assert breaker.state == HALF_OPEN
+    breaker.call(lambda: None)
+    assert breaker.state == CLOSED
+
+
+def test_circuit_outcome_after_opening():
+    breaker = CircuitBreaker(failure_threshold=1)
+
+    def slow_success():
+        # Another call opens the circuit while this one is in flight.
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+
+    breaker.call(slow_success)
+    assert breaker.state == OPEN
+    assert breaker.stats()["recent_calls"] == 1
+
+
+def test_circuit_reset():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.reset()
+    assert breaker.state == CLOSED
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    breaker.reset()
+    assert breaker.state == CLOSED
+    assert breaker.stats()["recent_calls"] == 0
+
+
+def test_circuit_post(server, monotonic):
+    server.mock_endpoint(
+        "/certs/", method="POST", status_code=502, json={"message": "Bad Gateway"}
+    )
+    client = Client(
+        "http://example.com/fasjson",
+        circuit_breaker=CircuitBreaker(failure_threshold=1),
+    )
+    with pytest.raises(APIError):
+        client.sign_csr(user="dummy", csr="dummy-csr")
+    with pytest.raises(CircuitOpenError):
+        client.sign_csr(user="dummy", csr="dummy-csr")
+
+
+def test_circuit_list_all_entities(server, monotonic):
+    server.reqs.get(
+        "http://example.com/fasjson/v1/users/",
+        exc=ConnectionError("down"),
+    )
+    client = Client(
+        "http://example.com/fasjson",
+        circuit_breaker=CircuitBreaker(failure_threshold=1),
+    )
+    with pytest.raises(ConnectionError):
+        list(client.list_all_entities("users"))
+    with pytest.raises(CircuitOpenError):
+        list(client.list_all_entities("users"))
+
+
+def test_circuit_bulk(server, monotonic):
+    server.reqs.get(USER_URL, exc=ConnectionError("down"))
+    client = Client(
+        "http://example.com/fasjson",
+        circuit_breaker=CircuitBreaker(failure_threshold=1),
+    )
+    with pytest.raises(ConnectionError):
+        client.get_user(username="dummy")
+    result = client.get_users(["dummy"])
+    assert isinstance(result.errors["dummy"], CircuitOpenError)
+
+
+def test_circuit_with_retry(server, monotonic, mocker):
+    sleep = mocker.patch("fasjson_client.retry.time.sleep")
+    server.reqs.get(
+        USER_URL, status_code=503, json={"message": "Down"}, headers=JSON_HEADERS
+    )
+    client = Client(
+        "http://example.com/fasjson",
+        retry=RetryPolicy(max_attempts=5),
+        circuit_breaker=CircuitBreaker(failure_threshold=2),
+    )
+    # The retries stop as soon as the circuit opens.
+    with pytest.raises(CircuitOpenError):
+        client.get_user(username="dummy")
+    assert len(user_requests(server, "/users/dummy/")) == 2
+    assert sleep.call_count == 2
+
+
+def test_circuit_stale_if_error(server, monotonic, mocker):
+    cache_monotonic = mocker.patch(
+        "fasjson_client.cache.time.monotonic", return_value=1000
+    )
+    server.reqs.get(
+        USER_URL,
+        [
+            {"json": {"result": {"username": "dummy"}}, "headers": JSON_HEADERS},
+            {"status_code": 503, "json": {"message": "Down"}, "headers": JSON_HEADERS},
+        ],
+    )
+    client = Client(
+        "http://example.com/fasjson",
+        circuit_breaker=CircuitBreaker(failure_threshold=1),
+        response_cache=ResponseCache(ttl=10, stale_if_error=60),
+    )
+    client.get_user(username="dummy")
+    cache_monotonic.return_value += 20
+    # The cached response is still used while the circuit is open.
+    assert client.get_user(username="dummy").stale
+    assert client.circuit_breaker.state == OPEN
+    response = client.get_user(username="dummy")
+    assert response.stale
+    assert response.result == {"username": "dummy"}
+    assert len(user_requests(server, "/users/dummy/")) == 2
+    assert client.response_cache.stale_errors == 2
+
+
+def test_circuit_disabled(server):
+    assert Client("http://example.com/fasjson").circuit_breaker is None
+    client = Client("http://example.com/fasjson", circuit_breaker=True)
+    assert client.circuit_breaker.state == CLOSED
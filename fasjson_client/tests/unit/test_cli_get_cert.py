@@ -269,3 +269,255 @@ def test_sign_bad_pkey(invoker, tmp_path, mocker, fixture_dir):
     )
     assert any(result.output.startswith(msg) for msg in expected_msgs)
     make_csr.assert_not_called()
+
+
+def test_existing_spec_cache(server, tmp_path):
+    dest_file = os.path.join(tmp_path, "dummy")
+    cache_dir = os.path.join(tmp_path, "specs")
+    config_path = os.path.join(tmp_path, "config.toml")
+    with open(config_path, "w") as f:
+        f.write(f'[spec-cache]\nenabled = true\npath = "{cache_dir}"\nttl = 60\n')
+    server.mock_endpoint("/users/dummy/", json={"result": {"certificates": []}})
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.exit_code == 1
+    assert result.output == "Error: No existing certificate, you need to request one.\n"
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_example_config(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    dest_file = os.path.join(tmp_path, "dummy")
+    config_path = os.path.join(
+        os.path.dirname(__file__), "..", "..", "..", "config.toml.example"
+    )
+    server.mock_endpoint("/users/dummy/", json={"result": {"certificates": []}})
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.output == "Error: No existing certificate, you need to request one.\n"
+    assert result.exit_code == 1
+    assert len(os.listdir(os.path.join(tmp_path, "fasjson-client", "specs"))) == 1
+
+
+def test_partial_spec_cache_config(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    dest_file = os.path.join(tmp_path, "dummy")
+    config_path = os.path.join(tmp_path, "config.toml")
+    with open(config_path, "w") as f:
+        f.write("[spec-cache]\nttl = 10\n")
+    server.mock_endpoint("/users/dummy/", json={"result": {"certificates": []}})
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.output == "Error: No existing certificate, you need to request one.\n"
+    assert result.exit_code == 1
+    # The cache is disabled when the section doesn't enable it.
+    assert not os.path.exists(os.path.join(tmp_path, "fasjson-client"))
+
+
+def test_existing_cookie_jar(server, session_cookies, tmp_path):
+    dest_file = os.path.join(tmp_path, "dummy")
+    jar_path = os.path.join(tmp_path, "cookies.txt")
+    config_path = os.path.join(tmp_path, "config.toml")
+    with open(config_path, "w") as f:
+        f.write(f'[cookie-jar]\nenabled = true\npath = "{jar_path}"\n')
+    server.mock_endpoint(
+        "/users/dummy/",
+        json={"result": {"certificates": []}},
+        headers={"Set-Cookie": "session=dummy-session; Path=/"},
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.exit_code == 1
+    with open(jar_path) as f:
+        assert 'session="dummy-session"' in f.read()
+
+
+def test_existing_cookie_jar_default_path(
+    server, session_cookies, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    dest_file = os.path.join(tmp_path, "dummy")
+    config_path = os.path.join(tmp_path, "config.toml")
+    with open(config_path, "w") as f:
+        f.write("[cookie-jar]\nenabled = true\n")
+    server.mock_endpoint(
+        "/users/dummy/",
+        json={"result": {"certificates": []}},
+        headers={"Set-Cookie": "session=dummy-session; Path=/"},
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.exit_code == 1
+    with open(os.path.join(tmp_path, "fasjson-client", "cookies.txt")) as f:
+        assert 'session="dummy-session"' in f.read()
+
+
+def test_partial_cookie_jar_config(server, tmp_path):
+    dest_file = os.path.join(tmp_path, "dummy")
+    cookies_path = os.path.join(tmp_path, "cookies.txt")
+    config_path = os.path.join(tmp_path, "config.toml")
+    with open(config_path, "w") as f:
+        f.write(f'[cookie-jar]\npath = "{cookies_path}"\n')
+    server.mock_endpoint(
+        "/users/dummy/",
+        json={"result": {"certificates": []}},
+        headers={"Set-Cookie": "session=dummy-session; Path=/"},
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.output == "Error: No existing certificate, you need to request one.\n"
+    assert result.exit_code == 1
+    # The cookie jar is disabled when the section doesn't enable it.
+    assert not os.path.exists(cookies_path)
+
+
+def test_existing_http_options(server, tmp_path):
+    dest_file = os.path.join(tmp_path, "dummy")
+    config_path = os.path.join(tmp_path, "config.toml")
+    with open(config_path, "w") as f:
+        f.write("[http]\ntimeout = 12\nconnect_timeout = 3\npool_maxsize = 4\n")
+    server.mock_endpoint("/users/dummy/", json={"result": {"certificates": []}})
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.exit_code == 1
+    assert server.reqs.last_request.timeout == (3, 12)
+
+
+def test_existing_retry(server, tmp_path, mocker):
+    sleep = mocker.patch("fasjson_client.retry.time.sleep")
+    dest_file = os.path.join(tmp_path, "dummy")
+    config_path = os.path.join(tmp_path, "config.toml")
+    with open(config_path, "w") as f:
+        f.write("[retry]\nenabled = true\nmax_attempts = 2\nstatuses = [503]\n")
+    server.mock_endpoint(
+        "/users/dummy/",
+        [
+            {"status_code": 503, "json": {"message": "Service Unavailable"}},
+            {"json": {"result": {"certificates": []}}},
+        ],
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "-c",
+            config_path,
+            "--url",
+            "http://example.com/fasjson",
+            "get-cert",
+            "--existing",
+            "-u",
+            "dummy",
+            "--save-to",
+            dest_file,
+        ],
+    )
+    assert result.exit_code == 1
+    assert "No existing certificate" in result.output
+    sleep.assert_called_once()
@@ -1,9 +1,15 @@
+import copy
+import logging
+import threading
+import time
+
 import pytest
 import requests
 import requests_mock
 
 from fasjson_client.client import Client
 from fasjson_client import errors
+from fasjson_client.spec import SpecRegistry, spec_registry
 
 
 def test_client_normalize_url(mocker):
@@ -45,6 +51,25 @@ def test_client_auth(mocker):
     gss.assert_called()
 
 
+def test_client_opportunistic_auth(server, mocker):
+    mocker.patch(
+        "requests_gssapi.HTTPSPNEGOAuth.generate_request_header",
+        return_value="Negotiate dummy",
+    )
+    server.mock_endpoint("/me/", json={"result": {"username": "dummy"}})
+    c = Client("http://example.com/fasjson", opportunistic_auth=True)
+    assert c.whoami().result == {"username": "dummy"}
+    assert server.reqs.last_request.headers["Authorization"] == "Negotiate dummy"
+    # The spec request also avoided the challenge
+    assert c.authenticator.challenges_avoided == 2
+    assert c.authenticator.challenges_received == 0
+
+
+def test_client_authenticator_no_auth(server):
+    c = Client("http://example.com/fasjson", auth=False)
+    assert c.authenticator is None
+
+
 def test_client_spec_parse_error(mocker):
     mocker.patch("fasjson_client.client.GssapiAuthenticator", return_value=None)
     with requests_mock.Mocker() as m, pytest.raises(errors.ClientSetupError) as e:
@@ -96,3 +121,152 @@ def test_client_response_error(mocker):
     assert str(err) == expected_msg
     assert err.data["status_code"] == 403
     assert err.data["message"] == "403 Forbidden"
+
+
+def test_client_lazy(server):
+    server.mock_endpoint("/me/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson", lazy=True)
+    assert server.reqs.call_count == 0
+    assert "whoami" in client.operations
+    assert server.reqs.call_count == 1
+    assert client.whoami().result == {"username": "dummy"}
+    assert server.reqs.call_count == 2
+
+
+def test_client_lazy_private_names(server):
+    client = Client("http://example.com/fasjson", lazy=True)
+    assert not hasattr(client, "_private")
+    assert not hasattr(client, "__deepcopy__")
+    copied = copy.copy(client)
+    assert copied._base_url == client._base_url
+    assert server.reqs.call_count == 0
+
+
+def test_client_lazy_list_all_entities(server):
+    server.mock_endpoint(
+        "/groups/",
+        json={"result": [{"groupname": "dummy"}], "page": {"total_pages": 1}},
+    )
+    client = Client("http://example.com/fasjson", lazy=True)
+    assert list(client.list_all_entities("groups")) == [{"groupname": "dummy"}]
+
+
+def test_client_lazy_setup_error(mocker):
+    mocker.patch("fasjson_client.client.GssapiAuthenticator", return_value=None)
+    with requests_mock.Mocker() as m:
+        m.get("http://example.com/specs/v1.json", status_code=404, reason="Not Found")
+        client = Client("http://example.com/", lazy=True)
+        assert m.call_count == 0
+        with pytest.raises(errors.ClientSetupError) as e:
+            client.whoami()
+    assert e.value.data["message"] == "404 Not Found"
+
+
+def test_client_lazy_thread_safe(mocker):
+    def make_bravado_client():
+        time.sleep(0.1)
+        return mocker.Mock()
+
+    make_bravado_client = mocker.patch.object(
+        Client, "_make_bravado_client", side_effect=make_bravado_client
+    )
+    mocker.patch.object(Client, "_make_ops_map", return_value={})
+    client = Client("http://localhost/fasjson", lazy=True)
+    threads = [threading.Thread(target=client._setup) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    make_bravado_client.assert_called_once_with()
+
+
+@pytest.fixture
+def clear_registry():
+    spec_registry.clear()
+    yield
+    spec_registry.clear()
+
+
+def test_client_shared_spec(server, clear_registry):
+    server.mock_endpoint("/me/", json={"result": {"username": "dummy"}})
+    client1 = Client("http://example.com/fasjson", shared_spec=True)
+    client2 = Client(
+        "http://example.com/fasjson", principal="other@EXAMPLE.TEST", shared_spec=True
+    )
+    spec_requests = [r for r in server.reqs.request_history if "specs" in r.url]
+    assert len(spec_requests) == 1
+    assert client1._api is client2._api
+    # Each client has its own HTTP session and authentication
+    assert client1._http_client is not client2._http_client
+    assert client2._http_client.authenticator.principal == "other@EXAMPLE.TEST"
+    assert client1.whoami.operation.http_client is client1._http_client
+    assert client2.whoami.operation.http_client is client2._http_client
+    assert client2.whoami().result == {"username": "dummy"}
+
+
+def test_client_operation_log(server, caplog):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson")
+    with caplog.at_level(logging.DEBUG, logger="fasjson_client.client"):
+        client.get_user(
+            username="dummy", _request_options={"headers": {"X-Token": "secret"}}
+        )
+    assert "get_user({'username': 'dummy'})" in caplog.text
+    assert "secret" not in caplog.text
+
+
+def test_client_shared_spec_different_config(server, clear_registry):
+    client1 = Client("http://example.com/fasjson", shared_spec=True)
+    client2 = Client(
+        "http://example.com/fasjson",
+        shared_spec=True,
+        bravado_config={"validate_responses": False},
+    )
+    client3 = Client("http://example.com/fasjson", shared_spec=True, spec="bundled")
+    assert client1._api is not client2._api
+    assert client1._api is not client3._api
+
+
+def test_client_shared_spec_unhashable_config(mocker):
+    with pytest.raises(ValueError):
+        Client(
+            "http://example.com/fasjson",
+            shared_spec=True,
+            bravado_config={"dummy": {"un": "hashable"}},
+        )
+
+
+def test_client_shared_spec_error_not_cached(mocker, clear_registry):
+    mocker.patch("fasjson_client.client.GssapiAuthenticator", return_value=None)
+    with requests_mock.Mocker() as m:
+        m.get("http://example.com/specs/v1.json", status_code=503)
+        with pytest.raises(errors.ClientSetupError):
+            Client("http://example.com/", shared_spec=True)
+        assert m.call_count == 1
+        with pytest.raises(errors.ClientSetupError):
+            Client("http://example.com/", shared_spec=True)
+        assert m.call_count == 2
+
+
+def test_spec_registry_thread_safe():
+    registry = SpecRegistry()
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get("key", load)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    registry.clear()
+    assert registry.get("key", load) is not results[0]
@@ -1,3 +1,5 @@
+import time
+
 import pytest
 
 from fasjson_client.client import Client
@@ -157,3 +159,71 @@ def test_list_entities_fields_as_string(server_with_empty_response):
     assert list(result) == []
     req = server.reqs.request_history[-1]
     assert req.headers.get("X-Fields") == "field1"
+
+
+@pytest.fixture
+def server_with_pages(server):
+    def users_page(request, context):
+        page_number = int(request.qs["page_number"][0])
+        if page_number == 4:
+            # Make sure the results are yielded in order
+            time.sleep(0.1)
+        return {
+            "result": [{"username": f"dummy-{page_number}"}],
+            "page": {"page_number": page_number, "page_size": 1, "total_pages": 6},
+        }
+
+    server.mock_endpoint("/users/", json=users_page, method="GET")
+    return server
+
+
+def test_get_all_users_concurrent(server_with_pages):
+    client = Client("http://example.com/fasjson")
+    result = client.list_all_entities("users", page_size=1, concurrency=3)
+    assert list(result) == [{"username": f"dummy-{i}"} for i in range(1, 7)]
+    qs = [
+        req.qs for req in server_with_pages.reqs.request_history if "users" in req.url
+    ]
+    assert sorted(int(q["page_number"][0]) for q in qs) == list(range(1, 7))
+    assert all(q["page_size"] == ["1"] for q in qs)
+
+
+def test_get_all_users_concurrent_buffer(server_with_pages, mocker):
+    client = Client("http://example.com/fasjson")
+    result = client.list_all_entities(
+        "users", page_size=1, concurrency=2, max_buffered_pages=2
+    )
+    # Page 1, then only 2 pages buffered ahead
+    assert next(result) == {"username": "dummy-1"}
+    assert next(result) == {"username": "dummy-2"}
+    time.sleep(0.2)
+    users_requests = [
+        r for r in server_with_pages.reqs.request_history if "users" in r.url
+    ]
+    assert len(users_requests) == 4
+    # Stopping early does not fetch the remaining pages
+    result.close()
+    users_requests = [
+        r for r in server_with_pages.reqs.request_history if "users" in r.url
+    ]
+    assert len(users_requests) == 4
+
+
+def test_get_all_users_concurrent_error(server):
+    def users_page(request, context):
+        page_number = int(request.qs["page_number"][0])
+        if page_number == 2:
+            context.status_code = 500
+            return {"message": "Something's wrong"}
+        return {
+            "result": [{"username": f"dummy-{page_number}"}],
+            "page": {"page_number": page_number, "page_size": 1, "total_pages": 3},
+        }
+
+    server.mock_endpoint("/users/", json=users_page, method="GET")
+    client = Client("http://example.com/fasjson")
+    result = client.list_all_entities("users", page_size=1, concurrency=2)
+    assert next(result) == {"username": "dummy-1"}
+    with pytest.raises(APIError) as e:
+        next(result)
+    assert e.value.code == 500
@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fasjson_client.client import Client
+from fasjson_client.coalescing import RequestCoalescer
+from fasjson_client.errors import DeadlineExceeded
+from fasjson_client.timeouts import Deadline
+
+from .utils import user_requests
+
+
+def _run_in_threads(target, count):
+    results = []
+    errors = []
+
+    def run():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_coalesce_threads():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    def send():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"username": "dummy"}
+
+    results, errors = _run_in_threads(lambda: coalescer.call("key", send), 5)
+    assert len(calls) == 1
+    assert errors == []
+    assert results == [{"username": "dummy"}] * 5
+    # Each caller gets its own result
+    assert len({id(result) for result in results}) == 5
+    assert coalescer.coalesced == 4
+    # Once the call is done, the next one sends a request again
+    coalescer.call("key", send)
+    assert len(calls) == 2
+
+
+def test_coalesce_threads_error():
+    coalescer = RequestCoalescer()
+    error = ValueError("failed")
+
+    def send():
+        time.sleep(0.2)
+        raise error
+
+    results, errors = _run_in_threads(lambda: coalescer.call("key", send), 3)
+    assert results == []
+    assert errors == [error] * 3
+    assert coalescer._in_flight == {}
+
+
+def test_coalesce_different_keys():
+    coalescer = RequestCoalescer()
+    assert coalescer.call("a", lambda: 1) == 1
+    assert coalescer.call("b", lambda: 2) == 2
+    assert coalescer.coalesced == 0
+
+
+@pytest.mark.asyncio
+async def test_coalesce_async():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def send():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"username": "dummy"}
+
+    results = await asyncio.gather(
+        *(coalescer.call_async("key", send) for _ in range(5))
+    )
+    assert len(calls) == 1
+    assert results == [{"username": "dummy"}] * 5
+    assert len({id(result) for result in results}) == 5
+    assert coalescer.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_coalesce_async_error():
+    coalescer = RequestCoalescer()
+
+    async def send():
+        await asyncio.sleep(0.05)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(
+        *(coalescer.call_async("key", send) for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert coalescer._in_flight_async == {}
+
+
+@pytest.mark.asyncio
+async def test_coalesce_async_leader_cancelled():
+    coalescer = RequestCoalescer()
+
+    async def send():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    leader = asyncio.ensure_future(coalescer.call_async("key", send))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(coalescer.call_async("key", send))
+    await asyncio.sleep(0)
+    leader.cancel()
+    # The request goes on for the other caller.
+    assert await follower == "result"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert coalescer._in_flight_async == {}
+
+
+@pytest.mark.asyncio
+async def test_coalesce_async_all_cancelled():
+    coalescer = RequestCoalescer()
+    cancelled = []
+
+    async def send():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    callers = [
+        asyncio.ensure_future(coalescer.call_async("key", send)) for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert cancelled == [True]
+    assert coalescer._in_flight_async == {}
+
+
+def test_coalesce_threads_deadline():
+    coalescer = RequestCoalescer()
+    started = threading.Event()
+
+    def send():
+        started.set()
+        time.sleep(0.3)
+        return "result"
+
+    leader = threading.Thread(target=coalescer.call, args=("key", send))
+    leader.start()
+    started.wait(5)
+    # The follower doesn't wait for the leader past its own deadline.
+    with pytest.raises(DeadlineExceeded):
+        coalescer.call("key", send, Deadline(0.05))
+    assert coalescer.coalesced == 1
+    with pytest.raises(DeadlineExceeded):
+        coalescer.call("key", send, Deadline(0))
+    assert coalescer.call("other", lambda: "other", Deadline(1)) == "other"
+    leader.join()
+
+
+@pytest.mark.asyncio
+async def test_coalesce_async_deadline():
+    coalescer = RequestCoalescer()
+    cancelled = []
+
+    async def send():
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "result"
+
+    leader = asyncio.ensure_future(coalescer.call_async("key", send))
+    await asyncio.sleep(0)
+    with pytest.raises(DeadlineExceeded):
+        await coalescer.call_async("key", send, Deadline(0.05))
+    # The request goes on for the other caller.
+    assert await leader == "result"
+    # The request is cancelled when no caller waits for it anymore.
+    with pytest.raises(DeadlineExceeded):
+        await coalescer.call_async("key", send, Deadline(0.05))
+    await asyncio.sleep(0)
+    assert cancelled == [True]
+    assert coalescer._in_flight_async == {}
+
+
+def test_client_coalesce_requests(server):
+    def slow_user(request, context):
+        time.sleep(0.2)
+        return {"result": {"username": "dummy"}}
+
+    server.mock_endpoint("/users/dummy/", json=slow_user)
+    client = Client("http://example.com/fasjson", coalesce_requests=True)
+    results, errors = _run_in_threads(lambda: client.get_user(username="dummy"), 5)
+    assert errors == []
+    assert [result.result for result in results] == [{"username": "dummy"}] * 5
+    assert len({id(result.result) for result in results}) == 5
+    assert len(user_requests(server)) == 1
+    assert client.request_coalescer.coalesced == 4
+
+
+def test_client_coalesce_requests_with_cache(server):
+    def slow_user(request, context):
+        time.sleep(0.2)
+        return {"result": {"username": "dummy"}}
+
+    server.mock_endpoint("/users/dummy/", json=slow_user)
+    client = Client(
+        "http://example.com/fasjson", coalesce_requests=True, response_cache=True
+    )
+    _run_in_threads(lambda: client.get_user(username="dummy"), 5)
+    _run_in_threads(lambda: client.get_user_or_none(username="dummy"), 5)
+    assert len(user_requests(server)) == 1
+    assert client.response_cache.misses == 5
+    assert client.response_cache.hits == 5
+
+
+def test_client_no_coalescing(server):
+    assert Client("http://example.com/fasjson").request_coalescer is None
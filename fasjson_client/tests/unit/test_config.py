@@ -209,3 +209,36 @@ def test_config_invalid_url(conf, tmpdir):
     with pytest.raises(ConfigurationException) as e:
         conf.load_config(config_path)
     assert e.value.message == "the url value must start with http:// or https://."
+
+
+def test_config_url_list(conf, tmpdir):
+    config_path = os.path.join(tmpdir, "config.toml")
+    with open(config_path, "w") as f:
+        f.write(
+            "url = ['https://fasjson01.example.com', 'https://fasjson02.example.com']"
+        )
+    conf.load_config(config_path)
+    assert conf["url"] == [
+        "https://fasjson01.example.com",
+        "https://fasjson02.example.com",
+    ]
+
+
+@pytest.mark.parametrize(
+    "value,message",
+    [
+        ("[]", "the url value must not be an empty list."),
+        (
+            "['https://fasjson.example.com', 'invalid']",
+            "the url value must start with http:// or https://.",
+        ),
+        ("[42]", "the url value must start with http:// or https://."),
+    ],
+)
+def test_config_invalid_url_list(conf, tmpdir, value, message):
+    config_path = os.path.join(tmpdir, "config.toml")
+    with open(config_path, "w") as f:
+        f.write(f"url = {value}")
+    with pytest.raises(ConfigurationException) as e:
+        conf.load_config(config_path)
+    assert e.value.message == message
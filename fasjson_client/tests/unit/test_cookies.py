@@ -0,0 +1,149 @@
+import os
+import stat
+from types import SimpleNamespace
+
+import requests
+
+from fasjson_client.client import Client
+from fasjson_client.cookies import PersistentCookieJar, default_cookie_jar_path
+
+SESSION_COOKIE = {"Set-Cookie": "session=dummy-session; Path=/; HttpOnly"}
+
+
+def test_default_cookie_jar_path(monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", "/tmp/dummy-cache")
+    assert default_cookie_jar_path() == "/tmp/dummy-cache/fasjson-client/cookies.txt"
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert default_cookie_jar_path() == os.path.expanduser(
+        "~/.cache/fasjson-client/cookies.txt"
+    )
+    assert default_cookie_jar_path("host/app@EXAMPLE.TEST") == os.path.expanduser(
+        "~/.cache/fasjson-client/cookies-host_app@EXAMPLE.TEST.txt"
+    )
+
+
+def test_client_cookie_jar(server, session_cookies, tmp_path):
+    path = os.path.join(tmp_path, "jar", "cookies.txt")
+    server.mock_endpoint(
+        "/me/", json={"result": {"username": "dummy"}}, headers=SESSION_COOKIE
+    )
+    client = Client("http://example.com/fasjson", cookie_jar=path)
+    client.whoami()
+    assert "Cookie" not in server.reqs.last_request.headers
+    # The cookie is reused by the same client
+    client.whoami()
+    assert server.reqs.last_request.headers["Cookie"] == "session=dummy-session"
+    # The file is only readable by its owner
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    # Another client loads the cookie from the file
+    client = Client("http://example.com/fasjson", cookie_jar=path)
+    client.whoami()
+    assert server.reqs.last_request.headers["Cookie"] == "session=dummy-session"
+
+
+def test_client_cookie_jar_default_path(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    client = Client("http://example.com/fasjson", cookie_jar=True)
+    assert client._cookie_jar.filename == default_cookie_jar_path()
+    assert client._http_client.session.cookies is client._cookie_jar
+
+
+def test_client_cookie_jar_principal_path(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    client = Client(
+        "http://example.com/fasjson", principal="dummy@EXAMPLE.TEST", cookie_jar=True
+    )
+    assert client._cookie_jar.filename == default_cookie_jar_path("dummy@EXAMPLE.TEST")
+
+
+def test_client_cookie_jar_other_principal(server, session_cookies, tmp_path, mocker):
+    path = os.path.join(tmp_path, "cookies.txt")
+    server.mock_endpoint(
+        "/me/", json={"result": {"username": "dummy"}}, headers=SESSION_COOKIE
+    )
+    Client("http://example.com/fasjson", cookie_jar=path).whoami()
+    jar = PersistentCookieJar(path)
+    assert jar.principal == "dummy@EXAMPLE.TEST"
+    assert len(jar) == 1
+    # After a kinit with another user, the cookies of the previous one are not sent.
+    mocker.patch(
+        "gssapi.Credentials",
+        return_value=SimpleNamespace(lifetime=10, name="other@EXAMPLE.TEST"),
+    )
+    client = Client("http://example.com/fasjson", cookie_jar=path)
+    client.whoami()
+    assert "Cookie" not in server.reqs.last_request.headers
+    assert PersistentCookieJar(path).principal == "other@EXAMPLE.TEST"
+
+
+def test_cookie_jar_unknown_principal(tmp_path):
+    path = os.path.join(tmp_path, "cookies.txt")
+    jar = PersistentCookieJar(path)
+    jar.set_cookie(requests.cookies.create_cookie("session", "dummy-session"))
+    jar.save_if_changed()
+    jar = PersistentCookieJar(path)
+    assert jar.principal is None
+    jar.set_principal("dummy@EXAMPLE.TEST")
+    assert len(jar) == 0
+    jar.set_principal("dummy@EXAMPLE.TEST")
+    assert PersistentCookieJar(path).principal == "dummy@EXAMPLE.TEST"
+
+
+def test_client_cookie_jar_disabled(server):
+    client = Client("http://example.com/fasjson", cookie_jar=False)
+    assert client._cookie_jar is None
+
+
+def test_client_cookie_jar_shared(server, tmp_path):
+    jar = PersistentCookieJar(os.path.join(tmp_path, "cookies.txt"))
+    client1 = Client("http://example.com/fasjson", cookie_jar=jar)
+    client2 = Client("http://example.com/fasjson", cookie_jar=jar)
+    assert client1._http_client.session.cookies is jar
+    assert client2._http_client.session.cookies is jar
+
+
+def test_cookie_jar_saved_only_on_change(server, session_cookies, tmp_path, mocker):
+    jar = PersistentCookieJar(os.path.join(tmp_path, "cookies.txt"))
+    save = mocker.spy(jar, "save")
+    server.mock_endpoint(
+        "/me/", json={"result": {"username": "dummy"}}, headers=SESSION_COOKIE
+    )
+    client = Client("http://example.com/fasjson", cookie_jar=jar)
+    client.whoami()
+    client.whoami()
+    save.assert_called_once()
+
+
+def test_cookie_jar_corrupted(tmp_path, caplog):
+    path = os.path.join(tmp_path, "cookies.txt")
+    with open(path, "w") as f:
+        f.write("not a cookie jar\n")
+    jar = PersistentCookieJar(path)
+    assert len(jar) == 0
+    assert "Could not load the cookie jar" in caplog.text
+
+
+def test_cookie_jar_unwritable(server, session_cookies, tmp_path, caplog):
+    not_a_dir = os.path.join(tmp_path, "file")
+    open(not_a_dir, "w").close()
+    server.mock_endpoint(
+        "/me/", json={"result": {"username": "dummy"}}, headers=SESSION_COOKIE
+    )
+    client = Client(
+        "http://example.com/fasjson", cookie_jar=os.path.join(not_a_dir, "cookies.txt")
+    )
+    client.whoami()
+    assert "Could not save the cookie jar" in caplog.text
+    # The cookie is still used in memory
+    client.whoami()
+    assert server.reqs.last_request.headers["Cookie"] == "session=dummy-session"
+
+
+def test_cookie_jar_save_error_cleans_up(tmp_path, mocker, caplog):
+    jar = PersistentCookieJar(os.path.join(tmp_path, "cookies.txt"))
+    jar._saved_state = {"something else"}
+    mocker.patch.object(jar, "save", side_effect=OSError("disk full"))
+    jar.save_if_changed()
+    assert "disk full" in caplog.text
+    assert os.listdir(tmp_path) == []
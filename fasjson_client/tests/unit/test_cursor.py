@@ -0,0 +1,149 @@
+import json
+import logging
+import re
+
+import pytest
+
+from fasjson_client.client import Client
+from fasjson_client.cursor import Cursor, start_crawl
+from fasjson_client.errors import APIError
+
+from .utils import users_pages
+
+USERS_URL = re.compile(r"^http://example\.com/fasjson/v1/users/(\?.*)?$")
+
+
+def _mock_users(server, *args, **kwargs):
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(*args, **kwargs),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+def _page_numbers(server):
+    return [
+        int(r.qs["page_number"][0])
+        for r in server.reqs.request_history
+        if "/users/" in r.url
+    ]
+
+
+def test_crawl(server, tmp_path):
+    _mock_users(server, 3)
+    checkpoint = tmp_path / "users.json"
+    client = Client("http://example.com/fasjson")
+    request_options = {"headers": {"X-Fields": ["username"]}}
+    crawl = client.resumable_list_all_entities(
+        "users",
+        page_size=1,
+        checkpoint=str(checkpoint),
+        _request_options=request_options,
+    )
+    assert [user["username"] for user in crawl] == ["dummy-1", "dummy-2", "dummy-3"]
+    assert crawl.cursor.finished
+    assert crawl.cursor.to_dict() == {
+        "entity_name": "users",
+        "page_size": 1,
+        "page_number": 3,
+        "total_pages": 3,
+        "kwargs": {"_request_options": request_options},
+    }
+    assert not checkpoint.exists()
+    assert server.reqs.last_request.headers["X-Fields"] == "username"
+
+
+def test_crawl_resume_after_error(server):
+    _mock_users(server, 4, failures={3: 1})
+    client = Client("http://example.com/fasjson")
+    crawl = client.resumable_list_all_entities("users", page_size=1)
+    usernames = []
+    with pytest.raises(APIError):
+        for user in crawl:
+            usernames.append(user["username"])
+    assert crawl.cursor.page_number == 2
+    usernames.extend(user["username"] for user in crawl)
+    assert usernames == [f"dummy-{i}" for i in range(1, 5)]
+    assert _page_numbers(server) == [1, 2, 3, 3, 4]
+
+
+def test_crawl_resume_from_checkpoint(server, tmp_path):
+    _mock_users(server, 4, failures={3: 1})
+    checkpoint = str(tmp_path / "users.json")
+    client = Client("http://example.com/fasjson")
+    crawl = client.resumable_list_all_entities("users", 1, checkpoint=checkpoint)
+    with pytest.raises(APIError):
+        list(crawl)
+    with open(checkpoint) as f:
+        assert json.load(f)["page_number"] == 2
+    # Another process resumes the crawl.
+    client = Client("http://example.com/fasjson")
+    crawl = client.resumable_list_all_entities("users", 1, checkpoint=checkpoint)
+    assert list(crawl) == [{"username": "dummy-3"}, {"username": "dummy-4"}]
+    assert _page_numbers(server) == [1, 2, 3, 3, 4]
+
+
+def test_crawl_resume_from_cursor(server):
+    _mock_users(server, 3)
+    client = Client("http://example.com/fasjson")
+    cursor = {"entity_name": "users", "page_size": 1, "page_number": 2}
+    crawl = client.resumable_list_all_entities("users", 1, cursor=cursor)
+    assert list(crawl) == [{"username": "dummy-3"}]
+    with pytest.raises(ValueError):
+        client.resumable_list_all_entities("groups", 1, cursor=cursor)
+    with pytest.raises(ValueError):
+        client.resumable_list_all_entities("users", 1, cursor=cursor, status="active")
+
+
+def test_crawl_no_entities(server):
+    server.mock_endpoint(
+        "/users/",
+        json={"result": [], "page": {"page_number": 1, "total_pages": 0}},
+    )
+    client = Client("http://example.com/fasjson")
+    crawl = client.resumable_list_all_entities("users")
+    assert list(crawl) == []
+    assert crawl.cursor.finished
+
+
+def test_crawl_checkpoint_error(server, tmp_path, caplog):
+    _mock_users(server, 2)
+    checkpoint = tmp_path / "missing" / "users.json"
+    client = Client("http://example.com/fasjson")
+    crawl = client.resumable_list_all_entities("users", 1, checkpoint=str(checkpoint))
+    with caplog.at_level(logging.WARNING):
+        assert len(list(crawl)) == 2
+    assert "Could not save the cursor" in caplog.text
+
+
+def test_cursor_save_error(tmp_path):
+    path = tmp_path / "cursor.json"
+    path.mkdir()
+    with pytest.raises(OSError):
+        Cursor("users").save(str(path))
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_crawl_wrong_name(server):
+    client = Client("http://example.com/fasjson")
+    with pytest.raises(ValueError):
+        list(client.resumable_list_all_entities("foobar"))
+
+
+def test_cursor():
+    cursor = Cursor("users", page_size=10, page_number=2, total_pages=3)
+    assert repr(cursor) == "<Cursor users page 2/3 of 10 per page>"
+    assert Cursor.from_dict(cursor.to_dict()) == cursor
+    assert cursor != cursor.to_dict()
+    assert not cursor.finished
+    with pytest.raises(ValueError):
+        Cursor.from_dict({"entity_name": "users"})
+    with pytest.raises(ValueError):
+        Cursor.from_dict(None)
+
+
+def test_start_crawl_kwargs_roundtrip(tmp_path):
+    path = str(tmp_path / "cursor.json")
+    Cursor("users", kwargs={"fields": ("username",)}).save(path)
+    cursor = start_crawl("users", 1000, {"fields": ("username",)}, checkpoint=path)
+    assert cursor.kwargs == {"fields": ["username"]}
@@ -0,0 +1,191 @@
+import pytest
+from requests.exceptions import ConnectionError
+
+from fasjson_client.client import Client
+from fasjson_client.endpoints import EndpointPool
+from fasjson_client.errors import APIError, ClientSetupError
+
+URL_1 = "http://fasjson01.example.com/fasjson"
+URL_2 = "http://fasjson02.example.com/fasjson"
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = mocker.Mock(return_value=1000.0)
+    mocker.patch("fasjson_client.endpoints.time.monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def first_choice(mocker):
+    # Select the first healthy replica instead of a random one.
+    return mocker.patch(
+        "fasjson_client.endpoints.random.choices",
+        side_effect=lambda population, weights: [population[0]],
+    )
+
+
+@pytest.fixture
+def replicas(server, fixture_dir, first_choice):
+    with open(f"{fixture_dir}/spec.json") as f:
+        spec = f.read()
+    for url in (URL_1, URL_2):
+        server.reqs.get(f"{url}/specs/v1.json", text=spec)
+    return server
+
+
+def _mock_user(server, url, **kwargs):
+    if "exc" not in kwargs:
+        kwargs.setdefault("headers", JSON_HEADERS)
+    server.reqs.get(f"{url}/v1/users/dummy/", **kwargs)
+
+
+def _requests(server, url):
+    return [r for r in server.reqs.request_history if r.url.startswith(url)]
+
+
+def test_pool_select(first_choice):
+    pool = EndpointPool([URL_1, URL_2 + "/"])
+    first, second = pool.endpoints
+    assert first.url == URL_1 + "/"
+    assert second.api_url == URL_2 + "/v1"
+    assert repr(first) == f"<Endpoint {URL_1}/>"
+    # The replicas that were not measured are considered as fast as the fastest one.
+    pool.select()
+    assert first_choice.call_args.args[1] == [1000, 1000]
+    pool.record_success(first, 0.01)
+    pool.select()
+    assert first_choice.call_args.args[1] == pytest.approx([100, 100])
+    pool.record_success(second, 0.1)
+    pool.select()
+    assert first_choice.call_args.args[1] == pytest.approx([100, 10])
+    assert pool.select(exclude=[first]) is second
+    assert pool.select(exclude=[first, second]) is None
+
+
+def test_pool_ewma():
+    pool = EndpointPool([URL_1, URL_2], ewma_weight=0.5)
+    endpoint = pool.endpoints[0]
+    pool.record_success(endpoint, 0.1)
+    assert endpoint.latency == 0.1
+    pool.record_success(endpoint, 0.3)
+    assert endpoint.latency == pytest.approx(0.2)
+
+
+def test_pool_health(clock, first_choice):
+    pool = EndpointPool([URL_1, URL_2], down_timeout=10)
+    first, second = pool.endpoints
+    pool.record_failure(first)
+    assert pool.select() is second
+    clock.return_value += 5
+    pool.record_failure(second)
+    # When all the replicas are down, the first one to fail is tried anyway.
+    assert pool.select() is first
+    clock.return_value += 5
+    assert pool.select() is first
+    pool.record_success(second, 0.1)
+    assert pool.stats() == {
+        "failovers": 0,
+        "endpoints": {
+            URL_1 + "/": {"up": True, "latency": None, "requests": 1, "failures": 1},
+            URL_2 + "/": {"up": True, "latency": 0.1, "requests": 2, "failures": 1},
+        },
+    }
+
+
+def test_pool_invalid():
+    with pytest.raises(ValueError):
+        EndpointPool([])
+
+
+def test_client_endpoints(replicas):
+    _mock_user(replicas, URL_1, json={"result": {"username": "dummy-1"}})
+    _mock_user(replicas, URL_2, json={"result": {"username": "dummy-2"}})
+    client = Client([URL_1, URL_2])
+    assert client.get_user(username="dummy").result == {"username": "dummy-1"}
+    client.endpoint_pool.record_failure(client.endpoint_pool.endpoints[0])
+    assert client.get_user(username="dummy").result == {"username": "dummy-2"}
+    # All the replicas share the spec of the first one.
+    assert len(_requests(replicas, f"{URL_1}/specs/")) == 1
+    assert len(_requests(replicas, f"{URL_2}/specs/")) == 0
+    assert client.authenticator.matches(f"{URL_2}/v1/me/")
+    assert not client.authenticator.matches("http://example.org/fasjson/v1/me/")
+
+
+def test_client_single_endpoint(server):
+    assert Client("http://example.com/fasjson").endpoint_pool is None
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        {"exc": ConnectionError},
+        {"status_code": 503, "json": {"message": "Service Unavailable"}},
+    ],
+)
+def test_client_failover(replicas, failure):
+    _mock_user(replicas, URL_1, **failure)
+    _mock_user(replicas, URL_2, json={"result": {"username": "dummy"}})
+    client = Client([URL_1, URL_2])
+    assert client.get_user(username="dummy").result == {"username": "dummy"}
+    stats = client.endpoint_pool.stats()
+    assert stats["failovers"] == 1
+    assert not stats["endpoints"][URL_1 + "/"]["up"]
+    # The failed replica is avoided.
+    client.get_user(username="dummy")
+    assert len(_requests(replicas, f"{URL_1}/v1/")) == 1
+    assert len(_requests(replicas, f"{URL_2}/v1/")) == 2
+
+
+def test_client_failover_exhausted(replicas):
+    _mock_user(replicas, URL_1, exc=ConnectionError)
+    _mock_user(replicas, URL_2, status_code=502, json={"message": "Bad Gateway"})
+    client = Client([URL_1, URL_2])
+    with pytest.raises(APIError) as e:
+        client.get_user(username="dummy")
+    assert e.value.code == 502
+    assert client.endpoint_pool.failovers == 1
+
+
+def test_client_no_failover(replicas):
+    _mock_user(replicas, URL_1, status_code=404, json={"message": "Not Found"})
+    replicas.reqs.post(f"{URL_2}/v1/certs/", exc=ConnectionError)
+    client = Client([URL_2, URL_1])
+    # Client errors show that the replica is up.
+    client.endpoint_pool.record_failure(client.endpoint_pool.endpoints[0])
+    assert client.get_user_or_none(username="dummy") is None
+    with pytest.raises(APIError):
+        client.get_user(username="dummy")
+    assert client.endpoint_pool.failovers == 0
+    # The write requests are not sent again.
+    client.endpoint_pool.record_success(client.endpoint_pool.endpoints[0], 0.1)
+    with pytest.raises(ConnectionError):
+        client.sign_csr(user="dummy", csr="dummy-csr")
+    assert len(_requests(replicas, f"{URL_1}/v1/certs/")) == 0
+    assert client.endpoint_pool.failovers == 0
+
+
+def test_client_spec_failover(server, fixture_dir, first_choice):
+    with open(f"{fixture_dir}/spec.json") as f:
+        spec = f.read()
+    server.reqs.get(f"{URL_1}/specs/v1.json", exc=ConnectionError)
+    server.reqs.get(f"{URL_2}/specs/v1.json", text=spec)
+    _mock_user(server, URL_1, json={"result": {"username": "dummy"}})
+    client = Client([URL_1, URL_2])
+    assert client.get_user(username="dummy").result == {"username": "dummy"}
+
+
+def test_client_spec_invalid(server):
+    server.reqs.get(f"{URL_1}/specs/v1.json", text="invalid")
+    with pytest.raises(ClientSetupError) as e:
+        Client([URL_1, URL_2])
+    assert e.value.message == "remote data validation failed"
+    assert len(_requests(server, URL_2)) == 0
+
+
+def test_client_local_spec(server, first_choice):
+    _mock_user(server, URL_2, json={"result": {"username": "dummy"}})
+    client = Client([URL_1, URL_2], spec="bundled", spec_check=False)
+    client.endpoint_pool.record_failure(client.endpoint_pool.endpoints[0])
+    assert client.get_user(username="dummy").result == {"username": "dummy"}
@@ -1,8 +1,12 @@
+import threading
+import time
 from types import SimpleNamespace
 
 import gssapi
 import pytest
 
+from requests_gssapi.exceptions import SPNEGOExchangeError
+
 from fasjson_client.gss_http import GssapiAuthenticator
 from fasjson_client.errors import ClientSetupError
 
@@ -63,3 +67,113 @@ def test_auth_expired(mocker):
     err = e.value
     assert "Authentication expired" == str(err)
     assert err.code == 71
+
+
+def test_negotiate_header(mocker):
+    creds = SimpleNamespace(lifetime=3600)
+    mocker.patch.object(GssapiAuthenticator, "_get_creds", return_value=creds)
+    spnego_auth = mocker.patch("fasjson_client.gss_http.HTTPSPNEGOAuth")
+    spnego_auth.return_value.generate_request_header.return_value = "Negotiate dummy"
+    c = GssapiAuthenticator("fasjson.example.com:443", principal="dummy")
+    assert c.negotiate_header("fasjson.example.com") == "Negotiate dummy"
+    spnego_auth.assert_called_once_with(creds=creds, opportunistic_auth=False)
+    spnego_auth.return_value.generate_request_header.assert_called_once_with(
+        None, "fasjson.example.com", is_preemptive=True
+    )
+
+
+def test_negotiate_header_failed(mocker):
+    mocker.patch.object(
+        GssapiAuthenticator, "_get_creds", return_value=SimpleNamespace(lifetime=3600)
+    )
+    spnego_auth = mocker.patch("fasjson_client.gss_http.HTTPSPNEGOAuth")
+    spnego_auth.return_value.generate_request_header.side_effect = SPNEGOExchangeError(
+        "failed"
+    )
+    c = GssapiAuthenticator("fasjson.example.com", principal="dummy")
+    with pytest.raises(ClientSetupError) as e:
+        c.negotiate_header("fasjson.example.com")
+    assert str(e.value) == "Authentication failed"
+
+
+def test_auth_reused(mocker):
+    get_creds = mocker.patch.object(
+        GssapiAuthenticator, "_get_creds", return_value=SimpleNamespace(lifetime=3600)
+    )
+    c = GssapiAuthenticator("fasjson.example.com")
+    request1 = c.apply(SimpleNamespace())
+    request2 = c.apply(SimpleNamespace())
+    assert request1.auth is request2.auth
+    get_creds.assert_called_once_with()
+
+
+def test_auth_refreshed_before_expiry(mocker):
+    monotonic = mocker.patch("fasjson_client.gss_http.time.monotonic", return_value=0)
+    get_creds = mocker.patch.object(
+        GssapiAuthenticator,
+        "_get_creds",
+        side_effect=[SimpleNamespace(lifetime=3600), SimpleNamespace(lifetime=3600)],
+    )
+    c = GssapiAuthenticator("fasjson.example.com")
+    auth1 = c.apply(SimpleNamespace()).auth
+    monotonic.return_value = 3600 - c.creds_refresh_margin - 1
+    assert c.apply(SimpleNamespace()).auth is auth1
+    monotonic.return_value = 3600 - c.creds_refresh_margin + 1
+    auth2 = c.apply(SimpleNamespace()).auth
+    assert auth2 is not auth1
+    assert get_creds.call_count == 2
+
+
+def test_auth_no_expiry(mocker):
+    get_creds = mocker.patch.object(
+        GssapiAuthenticator, "_get_creds", return_value=SimpleNamespace(lifetime=None)
+    )
+    c = GssapiAuthenticator("fasjson.example.com")
+    assert c.apply(SimpleNamespace()).auth is c.apply(SimpleNamespace()).auth
+    get_creds.assert_called_once_with()
+
+
+def test_auth_thread_safe(mocker):
+    def get_creds():
+        time.sleep(0.1)
+        return SimpleNamespace(lifetime=3600)
+
+    get_creds = mocker.patch.object(
+        GssapiAuthenticator, "_get_creds", side_effect=get_creds
+    )
+    c = GssapiAuthenticator("fasjson.example.com")
+    threads = [
+        threading.Thread(target=c.apply, args=(SimpleNamespace(),)) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    get_creds.assert_called_once_with()
+
+
+def test_opportunistic_auth(mocker):
+    creds = SimpleNamespace(lifetime=3600)
+    mocker.patch.object(GssapiAuthenticator, "_get_creds", return_value=creds)
+    spnego_auth = mocker.patch("fasjson_client.gss_http.HTTPSPNEGOAuth")
+    c = GssapiAuthenticator("fasjson.example.com", opportunistic_auth=True)
+    request = mocker.Mock()
+    c.apply(request)
+    spnego_auth.assert_called_once_with(creds=creds, opportunistic_auth=True)
+    request.register_hook.assert_called_once_with("response", c._on_response)
+    c._on_response(SimpleNamespace(status_code=200))
+    c._on_response(SimpleNamespace(status_code=404))
+    c._on_response(SimpleNamespace(status_code=401))
+    assert c.challenges_avoided == 2
+    assert c.challenges_received == 1
+
+
+def test_no_opportunistic_auth_no_hook(mocker):
+    mocker.patch.object(
+        GssapiAuthenticator, "_get_creds", return_value=SimpleNamespace(lifetime=3600)
+    )
+    mocker.patch("fasjson_client.gss_http.HTTPSPNEGOAuth")
+    c = GssapiAuthenticator("fasjson.example.com")
+    request = mocker.Mock()
+    c.apply(request)
+    request.register_hook.assert_not_called()
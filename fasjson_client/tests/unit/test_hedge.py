@@ -0,0 +1,304 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fasjson_client.client import Client
+from fasjson_client.hedge import Hedger
+
+
+def _sender(*behaviors):
+    """Return a function behaving like the next behavior each time it is called.
+
+    A behavior is a number of seconds to sleep before returning, or an exception to raise after
+    sleeping a bit.
+    """
+    calls = []
+    lock = threading.Lock()
+
+    def send():
+        with lock:
+            behavior = behaviors[len(calls)]
+            calls.append(behavior)
+            number = len(calls)
+        if isinstance(behavior, Exception):
+            time.sleep(0.05)
+            raise behavior
+        time.sleep(behavior)
+        return number
+
+    send.calls = calls
+    return send
+
+
+def _async_sender(*behaviors):
+    calls = []
+
+    async def send():
+        behavior = behaviors[len(calls)]
+        calls.append(behavior)
+        number = len(calls)
+        if isinstance(behavior, Exception):
+            await asyncio.sleep(0.05)
+            raise behavior
+        await asyncio.sleep(behavior)
+        return number
+
+    send.calls = calls
+    return send
+
+
+def test_hedger_delay():
+    assert Hedger(delay=0.2).get_delay("get_user") == 0.2
+    hedger = Hedger(percentile=90, min_samples=10)
+    latencies = hedger._latencies["get_user"]
+    latencies.extend(i / 10 for i in range(9, 0, -1))
+    assert hedger.get_delay("get_user") is None
+    latencies.append(1.0)
+    assert hedger.get_delay("get_user") == 0.9
+    assert hedger.get_delay("list_users") is None
+
+
+def test_hedger_window():
+    hedger = Hedger(percentile=50, window_size=3, min_samples=4)
+    for _ in range(5):
+        hedger.call("get_user", _sender(0))
+    assert len(hedger._latencies["get_user"]) == 3
+    assert hedger.get_delay("get_user") is None
+    assert hedger.stats() == {
+        "calls": 5,
+        "hedged": 0,
+        "wins": 0,
+        "throttled": 0,
+        "hedge_rate": 0.0,
+    }
+
+
+def test_hedger_fast_response():
+    hedger = Hedger(delay=1)
+    send = _sender(0)
+    assert hedger.call("get_user", send) == 1
+    assert len(send.calls) == 1
+    assert hedger.stats() == {
+        "calls": 1,
+        "hedged": 0,
+        "wins": 0,
+        "throttled": 0,
+        "hedge_rate": 0.0,
+    }
+
+
+def test_hedger_duplicate_wins():
+    hedger = Hedger(delay=0.05)
+    send = _sender(0.5, 0)
+    started = time.monotonic()
+    assert hedger.call("get_user", send) == 2
+    assert time.monotonic() - started < 0.4
+    assert hedger.stats() == {
+        "calls": 1,
+        "hedged": 1,
+        "wins": 1,
+        "throttled": 0,
+        "hedge_rate": 1.0,
+    }
+    hedger.close()
+
+
+def test_hedger_original_wins():
+    hedger = Hedger(delay=0.05)
+    send = _sender(0.1, 0.5)
+    assert hedger.call("get_user", send) == 1
+    assert len(send.calls) == 2
+    assert hedger.stats()["wins"] == 0
+
+
+def test_hedger_errors():
+    hedger = Hedger(delay=0.01)
+    # The other request is waited for when the first response is an error.
+    send = _sender(ValueError("first"), 0.1)
+    assert hedger.call("get_user", send) == 2
+    send = _sender(ValueError("first"), ValueError("second"))
+    with pytest.raises(ValueError, match="first"):
+        hedger.call("get_user", send)
+    assert hedger.stats() == {
+        "calls": 2,
+        "hedged": 2,
+        "wins": 1,
+        "throttled": 0,
+        "hedge_rate": 1.0,
+    }
+    # An error before the delay is raised right away.
+    hedger = Hedger(delay=1)
+    with pytest.raises(ValueError):
+        hedger.call("get_user", _sender(ValueError("fast")))
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_hedger_operations():
+    hedger = Hedger(delay=0, operations=["get_user"])
+    send = _sender(0)
+    hedger.call("list_users", send)
+    assert len(send.calls) == 1
+    assert hedger.calls == 0
+    assert hedger._latencies == {}
+
+
+def test_hedger_close():
+    hedger = Hedger(delay=0.01)
+    hedger.close()
+    hedger.call("get_user", _sender(0.1, 0))
+    assert hedger._executor is not None
+    hedger.close()
+    assert hedger._executor is None
+
+
+def test_hedger_budget():
+    hedger = Hedger(delay=0.01, max_hedge_rate=0.5, max_hedge_burst=1)
+    assert hedger.call("get_user", _sender(0.05, 0)) == 2
+    # The budget is spent, the slow call is not hedged.
+    send = _sender(0.05, 0)
+    assert hedger.call("get_user", send) == 1
+    assert len(send.calls) == 1
+    # Two calls earn a duplicate request.
+    assert hedger.call("get_user", _sender(0.05, 0)) == 2
+    assert hedger.stats() == {
+        "calls": 3,
+        "hedged": 2,
+        "wins": 2,
+        "throttled": 1,
+        "hedge_rate": 2 / 3,
+    }
+    hedger.close()
+
+
+def test_hedger_busy_workers():
+    # The only thread sends the first request, there is none left for the duplicate.
+    hedger = Hedger(delay=0.01, max_workers=1)
+    send = _sender(0.1, 0)
+    assert hedger.call("get_user", send) == 1
+    assert len(send.calls) == 1
+    assert hedger.stats()["hedged"] == 0
+    assert hedger.stats()["throttled"] == 1
+    time.sleep(0.01)
+    assert hedger._busy_workers == 0
+    hedger.close()
+
+
+def test_hedger_concurrent_calls():
+    # The calls don't wait for a thread of the pool, and don't start threads of their own.
+    hedger = Hedger(delay=0.2, max_workers=2)
+    threads = set()
+
+    def send():
+        threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        return 1
+
+    callers = [
+        threading.Thread(
+            target=hedger.call, args=("get_user", send), name=f"caller-{i}"
+        )
+        for i in range(20)
+    ]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert hedger.stats()["calls"] == 20
+    assert hedger.stats()["hedged"] == 0
+    pool_threads = {name for name in threads if name.startswith("fasjson-hedge")}
+    assert 1 <= len(pool_threads) <= 2
+    # The calls made while the pool was busy were sent by their callers.
+    assert threads - pool_threads
+    assert all(name.startswith("caller-") for name in threads - pool_threads)
+    hedger.close()
+
+
+@pytest.mark.asyncio
+async def test_hedger_async():
+    hedger = Hedger(delay=0.05)
+    assert await hedger.call_async("get_user", _async_sender(0)) == 1
+    send = _async_sender(1, 0)
+    assert await hedger.call_async("get_user", send) == 2
+    send = _async_sender(ValueError("first"), ValueError("second"))
+    with pytest.raises(ValueError, match="first"):
+        await hedger.call_async("get_user", send)
+    assert hedger.stats() == {
+        "calls": 3,
+        "hedged": 2,
+        "wins": 1,
+        "throttled": 0,
+        "hedge_rate": 2 / 3,
+    }
+
+
+@pytest.mark.asyncio
+async def test_hedger_async_not_hedged():
+    hedger = Hedger(operations=["get_user"])
+    assert await hedger.call_async("list_users", _async_sender(0)) == 1
+    assert await hedger.call_async("get_user", _async_sender(0)) == 1
+    assert hedger.stats()["calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedger_async_cancelled():
+    hedger = Hedger(delay=0.01)
+    cancelled = []
+
+    async def send():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    task = asyncio.ensure_future(hedger.call_async("get_user", send))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+    assert cancelled == [True, True]
+
+
+def test_client_hedge(server):
+    calls = []
+
+    def callback(request, context):
+        calls.append(request)
+        # requests_mock serializes the requests, the duplicate is sent when this one returns.
+        if len(calls) == 1:
+            time.sleep(0.2)
+        return {"result": {"username": "dummy"}}
+
+    server.reqs.get(
+        "http://example.com/fasjson/v1/users/dummy/",
+        json=callback,
+        headers={"Content-Type": "application/json"},
+    )
+    server.mock_endpoint(
+        "/certs/", method="POST", json={"result": {"certificate": "x"}}
+    )
+    hedger = Hedger(delay=0.05)
+    client = Client("http://example.com/fasjson", hedge=hedger)
+    response = client.get_user(username="dummy")
+    assert response.result == {"username": "dummy"}
+    # The duplicate request completes in the background.
+    time.sleep(0.1)
+    assert len(calls) == 2
+    # The write operations are not hedged.
+    client.sign_csr(user="dummy", csr="dummy-csr")
+    assert hedger.stats() == {
+        "calls": 1,
+        "hedged": 1,
+        "wins": 0,
+        "throttled": 0,
+        "hedge_rate": 1.0,
+    }
+    hedger.close()
+
+
+def test_client_hedge_default(server):
+    assert isinstance(Client("http://example.com/fasjson", hedge=True).hedger, Hedger)
+    assert Client("http://example.com/fasjson").hedger is None
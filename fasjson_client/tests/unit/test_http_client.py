@@ -0,0 +1,61 @@
+from fasjson_client.client import Client
+from fasjson_client.http_client import PooledRequestsClient, make_http_adapter
+
+
+def test_make_http_adapter():
+    adapter = make_http_adapter(pool_connections=2, pool_maxsize=20, pool_block=True)
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 20
+    assert adapter._pool_block is True
+
+
+def test_default_timeouts():
+    http_client = PooledRequestsClient(timeout=10, connect_timeout=2)
+    _, misc_options = http_client.separate_params({"url": "http://example.com"})
+    assert misc_options["timeout"] == 10
+    assert misc_options["connect_timeout"] == 2
+    # The request options take precedence
+    _, misc_options = http_client.separate_params(
+        {"url": "http://example.com", "timeout": 30, "connect_timeout": 5}
+    )
+    assert misc_options["timeout"] == 30
+    assert misc_options["connect_timeout"] == 5
+
+
+def test_no_default_timeouts():
+    http_client = PooledRequestsClient()
+    _, misc_options = http_client.separate_params({"url": "http://example.com"})
+    assert "timeout" not in misc_options
+    assert "connect_timeout" not in misc_options
+
+
+def test_keep_alive():
+    assert PooledRequestsClient().session.headers["Connection"] == "keep-alive"
+    http_client = PooledRequestsClient(keep_alive=False)
+    assert http_client.session.headers["Connection"] == "close"
+
+
+def test_client_pool(server):
+    client = Client("http://example.com/fasjson", pool_maxsize=32, pool_block=True)
+    adapter = client._http_client.session.get_adapter("http://example.com/fasjson")
+    assert adapter._pool_maxsize == 32
+    assert adapter._pool_block is True
+
+
+def test_client_shared_pool(server):
+    adapter = make_http_adapter(pool_maxsize=32)
+    client1 = Client("http://example.com/fasjson", http_adapter=adapter)
+    client2 = Client("http://example.com/fasjson", http_adapter=adapter)
+    for client in (client1, client2):
+        session = client._http_client.session
+        assert session.get_adapter("https://example.com/fasjson") is adapter
+    assert client1._http_client.session is not client2._http_client.session
+
+
+def test_client_timeouts(server):
+    server.mock_endpoint("/me/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson", timeout=10, connect_timeout=2)
+    client.whoami()
+    assert server.reqs.last_request.timeout == (2, 10)
+    client.whoami(_request_options={"timeout": 30})
+    assert server.reqs.last_request.timeout == (2, 30)
@@ -0,0 +1,121 @@
+import errno
+import re
+
+import pytest
+
+from fasjson_client.client import Client
+from fasjson_client.errors import APIError, ClientSetupError
+from fasjson_client.loader import EntityLoader
+
+from .utils import user_requests
+
+USER_URL = re.compile(r"^http://example\.com/fasjson/v1/users/([^/]+)/$")
+
+
+def _user(request, context):
+    username = USER_URL.match(request.url).group(1)
+    if username == "missing":
+        context.status_code = 404
+        return {"message": "Not Found"}
+    if username == "failing":
+        context.status_code = 500
+        return {"message": "Server Error"}
+    return {"result": {"username": username}}
+
+
+@pytest.fixture
+def client(server):
+    server.reqs.get(USER_URL, json=_user, headers={"Content-Type": "application/json"})
+    return Client("http://example.com/fasjson")
+
+
+def test_loader_batch(client, server):
+    loader = client.loader("users")
+    assert isinstance(loader, EntityLoader)
+    futures = loader.load_many(["dummy", "missing", "dummy", "failing"])
+    assert futures[0] is futures[2]
+    assert futures[0].result(timeout=5) == {"username": "dummy"}
+    assert futures[1].result(timeout=5) is None
+    with pytest.raises(APIError):
+        futures[3].result(timeout=5)
+    assert loader.batches == 1
+    assert loader.deduplicated == 1
+    assert len(user_requests(server)) == 3
+
+
+def test_loader_get(client, server):
+    loader = client.loader("users", window=0.001)
+    assert loader.get("dummy") == {"username": "dummy"}
+    assert loader.get("dummy") == {"username": "dummy"}
+    assert loader.batches == 2
+
+
+def test_loader_max_batch_size(client, server):
+    loader = client.loader("users", window=60, max_batch_size=2)
+    first, second = loader.load_many(["dummy", "other"])
+    assert second.result(timeout=5) == {"username": "other"}
+    assert first.result(timeout=5) == {"username": "dummy"}
+    third = loader.load("third")
+    assert not third.done()
+    loader.dispatch()
+    assert third.result() == {"username": "third"}
+    assert loader.batches == 2
+
+
+def test_loader_dispatch_empty(client, server):
+    loader = client.loader("users", window=60)
+    loader.dispatch()
+    assert loader.batches == 0
+    assert user_requests(server) == []
+
+
+def test_loader_cancelled(client, server):
+    loader = client.loader("users", window=60)
+    cancelled, other = loader.load_many(["dummy", "other"])
+    cancelled.cancel()
+    loader.dispatch()
+    assert cancelled.cancelled()
+    assert other.result() == {"username": "other"}
+
+
+def test_loader_all_cancelled(client, server):
+    loader = client.loader("users", window=60)
+    future = loader.load("dummy")
+    future.cancel()
+    loader.dispatch()
+    assert loader.batches == 0
+    assert user_requests(server) == []
+
+
+def test_loader_cancelled_during_batch(client, mocker):
+    def _lookups(entity_name, names, concurrency):
+        # The futures are running, they can't be cancelled anymore.
+        assert not future.cancel()
+        for name in names:
+            yield name, {"username": name}, None
+
+    mocker.patch.object(client, "iter_entities", side_effect=_lookups)
+    loader = client.loader("users", window=60)
+    future = loader.load("dummy")
+    loader.dispatch()
+    assert not future.cancelled()
+    assert future.result() == {"username": "dummy"}
+
+
+def test_loader_batch_error(client, mocker):
+    mocker.patch.object(
+        client,
+        "iter_entities",
+        side_effect=ClientSetupError("Setup failed", errno.ECONNABORTED),
+    )
+    loader = client.loader("users", window=60)
+    cancelled, failed = loader.load_many(["dummy", "other"])
+    cancelled.cancel()
+    loader.dispatch()
+    with pytest.raises(ClientSetupError):
+        failed.result()
+
+
+def test_loader_wrong_name(client):
+    with pytest.raises(ValueError):
+        client.loader("foobars")
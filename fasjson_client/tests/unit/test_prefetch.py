@@ -0,0 +1,159 @@
+import re
+import threading
+
+import pytest
+
+from fasjson_client.client import Client
+from fasjson_client.errors import APIError
+from fasjson_client.hedge import Hedger
+from fasjson_client.prefetch import PagePrefetcher
+
+from .utils import users_pages
+
+USERS_URL = re.compile(r"^http://example\.com/fasjson/v1/users/(\?.*)?$")
+
+
+def _page_numbers(server):
+    return sorted(
+        int(r.qs.get("page_number", ["1"])[0])
+        for r in server.reqs.request_history
+        if "/users/" in r.url
+    )
+
+
+def test_prefetch_next_pages(server):
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(4),
+        headers={"Content-Type": "application/json"},
+    )
+    client = Client("http://example.com/fasjson", prefetch_pages=2)
+    response = client.list_users(page_size=1)
+    usernames = [response.result[0]["username"]]
+    while response.page["page_number"] < response.page["total_pages"]:
+        response = response.next_page()
+        usernames.append(response.result[0]["username"])
+    assert usernames == [f"dummy-{i}" for i in range(1, 5)]
+    assert _page_numbers(server) == [1, 2, 3, 4]
+    assert client.page_prefetcher.hits == 3
+    assert len(client.page_prefetcher._pending) == 0
+
+
+def test_prefetch_in_background(server):
+    release = threading.Event()
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(3, release=release),
+        headers={"Content-Type": "application/json"},
+    )
+    client = Client("http://example.com/fasjson", prefetch_pages=1)
+    response = client.list_users(page_size=1)
+    assert len(client.page_prefetcher._pending) == 1
+    release.set()
+    assert response.next_page().result == [{"username": "dummy-2"}]
+    assert client.page_prefetcher.hits == 1
+
+
+def test_prefetch_error(server):
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(3, failures={2: 1}),
+        headers={"Content-Type": "application/json"},
+    )
+    client = Client("http://example.com/fasjson", prefetch_pages=1)
+    response = client.list_users(page_size=1)
+    with pytest.raises(APIError) as e:
+        response.next_page()
+    assert e.value.code == 500
+
+
+def test_prefetch_list_all_entities(server):
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(5),
+        headers={"Content-Type": "application/json"},
+    )
+    client = Client("http://example.com/fasjson", prefetch_pages=1)
+    result = list(client.list_all_entities("users", page_size=1))
+    assert result == [{"username": f"dummy-{i}"} for i in range(1, 6)]
+    assert _page_numbers(server) == [1, 2, 3, 4, 5]
+    assert client.page_prefetcher.hits == 4
+
+
+def test_prefetch_not_paginated(server):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    server.reqs.post(
+        re.compile(r"^http://example\.com/fasjson/v1/certs/\?.*$"),
+        json={"result": {"certificate": "dummy"}},
+        headers={"Content-Type": "application/json"},
+    )
+    client = Client("http://example.com/fasjson", prefetch_pages=1)
+    assert client.get_user(username="dummy").result == {"username": "dummy"}
+    response = client.sign_csr(user="dummy", csr="dummy-csr")
+    assert response.result == {"certificate": "dummy"}
+    assert len(client.page_prefetcher._pending) == 0
+    assert client.page_prefetcher._executor is None
+
+
+def test_prefetch_max_pending(server):
+    release = threading.Event()
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(10, release=release),
+        headers={"Content-Type": "application/json"},
+    )
+    prefetcher = PagePrefetcher(pages=3, max_pending=2)
+    client = Client("http://example.com/fasjson", prefetch_pages=prefetcher)
+    assert client.page_prefetcher is prefetcher
+    client.list_users(page_size=1)
+    assert len(prefetcher._pending) == 2
+    assert prefetcher.dropped == 1
+    release.set()
+    prefetcher.close()
+    assert len(prefetcher._pending) == 0
+    assert prefetcher._executor is None
+    prefetcher.close()
+
+
+def test_no_prefetch():
+    assert Client("http://example.com/fasjson", lazy=True).page_prefetcher is None
+
+
+def test_prefetch_max_age(server, mocker):
+    clock = mocker.patch("fasjson_client.prefetch.time.monotonic", return_value=1000.0)
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(3),
+        headers={"Content-Type": "application/json"},
+    )
+    client = Client(
+        "http://example.com/fasjson", prefetch_pages=PagePrefetcher(max_age=10)
+    )
+    response = client.list_users(page_size=1)
+    assert len(client.page_prefetcher._pending) == 1
+    clock.return_value += 10
+    # The stale page is dropped and fetched again.
+    assert response.next_page().result == [{"username": "dummy-2"}]
+    assert _page_numbers(server).count(2) == 2
+    assert client.page_prefetcher.hits == 0
+    assert client.page_prefetcher.dropped == 1
+    client.close()
+
+
+def test_client_close(server, mocker):
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(2),
+        headers={"Content-Type": "application/json"},
+    )
+    hedger = Hedger()
+    with Client("http://example.com/fasjson", prefetch_pages=1, hedge=hedger) as client:
+        client.list_users(page_size=1)
+        assert client.page_prefetcher._executor is not None
+        hedger_close = mocker.spy(hedger, "close")
+    assert client.page_prefetcher._executor is None
+    assert len(client.page_prefetcher._pending) == 0
+    hedger_close.assert_called_once_with()
+    # The client still works after it was closed.
+    assert client.list_users(page_size=1).result == [{"username": "dummy-1"}]
+    assert Client("http://example.com/fasjson", lazy=True).close() is None
@@ -0,0 +1,139 @@
+import multiprocessing
+import pickle
+import threading
+
+import pytest
+
+from fasjson_client.client import Client
+from fasjson_client.ratelimit import FileRateLimiter, RateLimiter
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = mocker.Mock(return_value=1000.0)
+    mocker.patch("fasjson_client.ratelimit.time.monotonic", clock)
+    mocker.patch("fasjson_client.ratelimit.time.time", clock)
+    return clock
+
+
+@pytest.fixture
+def sleep(mocker):
+    return mocker.patch("fasjson_client.ratelimit.time.sleep")
+
+
+def test_rate_limiter_burst(clock, sleep):
+    limiter = RateLimiter(2, burst=3)
+    for _ in range(3):
+        limiter.acquire()
+    sleep.assert_not_called()
+    limiter.acquire()
+    sleep.assert_called_once_with(0.5)
+    # The tokens are reserved in order.
+    limiter.acquire()
+    sleep.assert_called_with(1.0)
+    assert limiter.stats() == {"throttled": 2, "waited": 1.5}
+
+
+def test_rate_limiter_refill(clock, sleep):
+    limiter = RateLimiter(10)
+    for _ in range(10):
+        limiter.acquire()
+    clock.return_value += 0.5
+    for _ in range(5):
+        limiter.acquire()
+    sleep.assert_not_called()
+    # The bucket does not hold more than the burst.
+    clock.return_value += 60
+    for _ in range(10):
+        limiter.acquire()
+    sleep.assert_not_called()
+    limiter.acquire()
+    sleep.assert_called_once()
+
+
+def test_rate_limiter_slow_rate(clock, sleep):
+    limiter = RateLimiter(0.5)
+    assert limiter.burst == 1
+    limiter.acquire()
+    limiter.acquire()
+    sleep.assert_called_once_with(2)
+
+
+def test_rate_limiter_invalid():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
+
+
+def test_rate_limiter_threads(clock, sleep):
+    limiter = RateLimiter(100, burst=10)
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert limiter.throttled == 10
+    # Each thread reserved its own token.
+    delays = sorted(call.args[0] for call in sleep.call_args_list)
+    assert delays == pytest.approx([i / 100 for i in range(1, 11)])
+
+
+def test_client_rate_limit(server, clock, sleep):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    server.mock_endpoint(
+        "/certs/", method="POST", json={"result": {"certificate": "x"}}
+    )
+    client = Client("http://example.com/fasjson", rate_limit=1)
+    client.get_user(username="dummy")
+    sleep.assert_not_called()
+    client.sign_csr(user="dummy", csr="dummy-csr")
+    sleep.assert_called_once_with(1)
+    assert client.rate_limiter.throttled == 1
+
+
+def test_client_rate_limit_cached(server, sleep):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson", rate_limit=1, response_cache=True)
+    for _ in range(3):
+        client.get_user(username="dummy")
+    # The cached responses are not throttled.
+    sleep.assert_not_called()
+
+
+def test_client_rate_limit_shared(server):
+    limiter = RateLimiter(5)
+    client = Client("http://example.com/fasjson", rate_limit=limiter)
+    assert client.rate_limiter is limiter
+    assert Client("http://example.com/fasjson").rate_limiter is None
+
+
+def test_file_rate_limiter(tmp_path, clock, sleep):
+    path = str(tmp_path / "bucket")
+    first = FileRateLimiter(path, 1, burst=2)
+    second = FileRateLimiter(path, 1, burst=2)
+    first.acquire()
+    second.acquire()
+    sleep.assert_not_called()
+    first.acquire()
+    sleep.assert_called_once_with(1)
+    assert second.throttled == 0
+    assert first.throttled == 1
+
+
+def test_file_rate_limiter_pickle(tmp_path):
+    limiter = FileRateLimiter(str(tmp_path / "bucket"), 3, burst=5)
+    copy = pickle.loads(pickle.dumps(limiter))
+    assert (copy.path, copy.rate, copy.burst) == (limiter.path, 3, 5)
+
+
+def _reserve_in_process(limiter, count):
+    return [limiter._reserve() for _ in range(count)]
+
+
+def test_file_rate_limiter_processes(tmp_path):
+    limiter = FileRateLimiter(str(tmp_path / "bucket"), 0.001, burst=4)
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        delays = pool.starmap(_reserve_in_process, [(limiter, 4), (limiter, 4)])
+    # The processes share the burst of 4 requests.
+    delays = sorted(delay for process_delays in delays for delay in process_delays)
+    assert delays[:4] == [0, 0, 0, 0]
+    assert all(delay > 900 for delay in delays[4:])
@@ -1,7 +1,9 @@
 import pytest
+from bravado.http_future import HttpFuture
 
 from fasjson_client.client import Client
-from fasjson_client.response import PaginationError
+from fasjson_client.errors import APIError
+from fasjson_client.response import PaginationError, ResponseWrapper
 
 
 def test_response_paged(server):
@@ -46,3 +48,23 @@ def test_response_wrapper(server):
     operation = client.list_users
     assert operation.consumes == ["application/json"]
     assert operation.produces == ["application/json"]
+
+
+def test_response_wrapper_first_unmarshal_serialized(server, mocker):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    server.mock_endpoint("/users/missing/", status_code=404, json={"message": "Nope"})
+    client = Client("http://example.com/fasjson")
+    lock_held = []
+    get_swagger_result = HttpFuture._get_swagger_result
+
+    def _get_swagger_result(future, incoming_response):
+        lock_held.append(ResponseWrapper._unmarshal_lock.locked())
+        return get_swagger_result(future, incoming_response)
+
+    mocker.patch.object(HttpFuture, "_get_swagger_result", _get_swagger_result)
+    client.get_user(username="dummy")
+    client.get_user(username="dummy")
+    for _ in range(2):
+        with pytest.raises(APIError):
+            client.get_user(username="missing")
+    assert lock_held == [True, False, True, False]
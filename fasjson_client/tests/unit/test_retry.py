@@ -0,0 +1,220 @@
+import email.utils
+import time
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from fasjson_client.client import Client
+from fasjson_client.errors import APIError
+from fasjson_client.retry import RetryPolicy, parse_retry_after
+
+from .utils import user_requests
+
+USER_RESPONSE = {"json": {"result": {"username": "dummy"}}}
+
+
+@pytest.fixture
+def sleep(mocker):
+    return mocker.patch("fasjson_client.retry.time.sleep")
+
+
+@pytest.mark.parametrize("status", [429, 502, 503, 504])
+def test_retry_status(server, sleep, status):
+    server.mock_endpoint(
+        "/users/dummy/",
+        [{"status_code": status, "json": {"message": "Oops"}}, USER_RESPONSE],
+    )
+    client = Client("http://example.com/fasjson", retry=True)
+    response = client.get_user(username="dummy")
+    assert response.result == {"username": "dummy"}
+    assert len(user_requests(server, "/users/dummy/")) == 2
+    assert client.retry_policy.stats() == {"retries": 1, "exhausted": 0}
+    sleep.assert_called_once()
+
+
+def test_retry_connection_error(server, sleep):
+    server.reqs.get(
+        "http://example.com/fasjson/v1/users/dummy/",
+        [
+            {"exc": ConnectionError("reset")},
+            dict(USER_RESPONSE, headers={"Content-Type": "application/json"}),
+        ],
+    )
+    client = Client("http://example.com/fasjson", retry=True)
+    assert client.get_user(username="dummy").result == {"username": "dummy"}
+    assert client.retry_policy.retries == 1
+
+
+def test_retry_exhausted(server, sleep):
+    server.mock_endpoint(
+        "/users/dummy/", status_code=503, json={"message": "Service Unavailable"}
+    )
+    policy = RetryPolicy(max_attempts=3, backoff=1, jitter=False)
+    client = Client("http://example.com/fasjson", retry=policy)
+    with pytest.raises(APIError) as e:
+        client.get_user(username="dummy")
+    assert e.value.code == 503
+    assert len(user_requests(server, "/users/dummy/")) == 3
+    assert [call.args for call in sleep.call_args_list] == [(1,), (2,)]
+    assert policy.stats() == {"retries": 2, "exhausted": 1}
+
+
+def test_retry_not_retryable(server, sleep):
+    server.mock_endpoint("/users/dummy/", status_code=500, json={"message": "Oops"})
+    client = Client("http://example.com/fasjson", retry=True)
+    with pytest.raises(APIError):
+        client.get_user(username="dummy")
+    assert len(user_requests(server, "/users/dummy/")) == 1
+    assert client.retry_policy.stats() == {"retries": 0, "exhausted": 0}
+    sleep.assert_not_called()
+
+
+def test_retry_not_found(server, sleep):
+    server.mock_endpoint("/users/dummy/", status_code=404, json={"message": "Nope"})
+    client = Client("http://example.com/fasjson", retry=True)
+    assert client.get_user_or_none(username="dummy") is None
+    assert len(user_requests(server, "/users/dummy/")) == 1
+
+
+def test_retry_only_get(server, sleep):
+    server.mock_endpoint(
+        "/certs/",
+        method="POST",
+        status_code=503,
+        json={"message": "Service Unavailable"},
+    )
+    client = Client("http://example.com/fasjson", retry=True)
+    with pytest.raises(APIError):
+        client.sign_csr(user="dummy", csr="dummy-csr")
+    assert len(server.reqs.request_history) == 2
+    sleep.assert_not_called()
+
+
+def test_retry_list_all_entities(server, sleep):
+    def callback(request, context):
+        page_number = int(request.qs["page_number"][0])
+        if page_number == 2 and not failed:
+            failed.append(page_number)
+            context.status_code = 502
+            return {"message": "Bad Gateway"}
+        return {
+            "result": [{"username": f"dummy-{page_number}"}],
+            "page": {"page_number": page_number, "page_size": 1, "total_pages": 3},
+        }
+
+    failed = []
+    server.reqs.get(
+        "http://example.com/fasjson/v1/users/",
+        json=callback,
+        headers={"Content-Type": "application/json"},
+    )
+    client = Client("http://example.com/fasjson", retry=True)
+    users = list(client.list_all_entities("users", page_size=1))
+    assert users == [{"username": f"dummy-{i}"} for i in range(1, 4)]
+    assert client.retry_policy.retries == 1
+
+
+def test_retry_after(server, sleep):
+    server.mock_endpoint(
+        "/users/dummy/",
+        [
+            {
+                "status_code": 429,
+                "headers": {"Retry-After": "7"},
+                "json": {"message": "Too Many Requests"},
+            },
+            USER_RESPONSE,
+        ],
+    )
+    client = Client("http://example.com/fasjson", retry=True)
+    client.get_user(username="dummy")
+    sleep.assert_called_once_with(7)
+
+
+def test_retry_after_capped(server, sleep):
+    server.mock_endpoint(
+        "/users/dummy/",
+        [
+            {
+                "status_code": 503,
+                "headers": {"Retry-After": "3600"},
+                "json": {"message": "Maintenance"},
+            },
+            USER_RESPONSE,
+        ],
+    )
+    policy = RetryPolicy(max_backoff=10)
+    client = Client("http://example.com/fasjson", retry=policy)
+    client.get_user(username="dummy")
+    sleep.assert_called_once_with(10)
+
+
+def test_retry_after_ignored(server, sleep, mocker):
+    uniform = mocker.patch("fasjson_client.retry.random.uniform", return_value=0.1)
+    server.mock_endpoint(
+        "/users/dummy/",
+        [
+            {
+                "status_code": 503,
+                "headers": {"Retry-After": "60"},
+                "json": {"message": "Maintenance"},
+            },
+            USER_RESPONSE,
+        ],
+    )
+    policy = RetryPolicy(backoff=2, respect_retry_after=False)
+    client = Client("http://example.com/fasjson", retry=policy)
+    client.get_user(username="dummy")
+    uniform.assert_called_once_with(0, 2)
+    sleep.assert_called_once_with(0.1)
+
+
+def test_retry_hook(server, sleep):
+    server.mock_endpoint(
+        "/users/dummy/",
+        [{"status_code": 503, "json": {"message": "Oops"}}, USER_RESPONSE],
+    )
+    calls = []
+    policy = RetryPolicy(jitter=False, on_retry=lambda *args: calls.append(args))
+    client = Client("http://example.com/fasjson", retry=policy)
+    client.get_user(username="dummy")
+    assert len(calls) == 1
+    operation_id, attempt, error, delay = calls[0]
+    assert operation_id == "get_user"
+    assert attempt == 1
+    assert error.code == 503
+    assert delay == 0.5
+
+
+def test_retry_disabled(server):
+    assert Client("http://example.com/fasjson").retry_policy is None
+    assert Client("http://example.com/fasjson", retry=False).retry_policy is None
+
+
+def test_max_backoff():
+    policy = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+    assert [policy.get_delay(attempt, OSError()) for attempt in range(1, 6)] == [
+        1,
+        2,
+        4,
+        5,
+        5,
+    ]
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [("12", 12), ("-3", 0), (None, None), ("soon", None)],
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_date():
+    value = email.utils.formatdate(time.time() + 120, usegmt=True)
+    assert 110 < parse_retry_after(value) <= 120
+    # Dates without a time zone are in UTC.
+    value = email.utils.formatdate(time.time() + 120).replace("-0000", "")
+    assert 110 < parse_retry_after(value) <= 120
+    value = email.utils.formatdate(time.time() - 120, usegmt=True)
+    assert parse_retry_after(value) == 0
@@ -0,0 +1,77 @@
+import multiprocessing
+import re
+
+import pytest
+
+from fasjson_client import shards
+from fasjson_client.client import Client
+from fasjson_client.shards import Shard, list_all_entities_in_processes, split_pages
+
+from .utils import users_pages
+
+USERS_URL = re.compile(r"^http://example\.com/fasjson/v1/users/(\?.*)?$")
+
+
+@pytest.fixture
+def users(server):
+    server.reqs.get(
+        USERS_URL,
+        json=users_pages(7),
+        headers={"Content-Type": "application/json"},
+    )
+    return server
+
+
+@pytest.mark.parametrize(
+    "total_pages,count,expected",
+    [
+        (10, 3, [(1, 4), (5, 7), (8, 10)]),
+        (6, 3, [(1, 2), (3, 4), (5, 6)]),
+        (2, 5, [(1, 1), (2, 2)]),
+        (0, 3, [(1, 1)]),
+        (5, 0, [(1, 5)]),
+    ],
+)
+def test_split_pages(total_pages, count, expected):
+    assert split_pages(total_pages, count) == expected
+
+
+def test_shards(users):
+    client = Client("http://example.com/fasjson")
+    result = client.get_shards("users", 3, page_size=1)
+    assert result == [
+        Shard("users", 1, 1, 3, {}),
+        Shard("users", 1, 4, 5, {}),
+        Shard("users", 1, 6, 7, {}),
+    ]
+    entities = []
+    for shard in result:
+        # The shards can be serialized to be sent to other hosts.
+        entities.extend(client.iter_shard(shard._asdict()))
+    assert entities == [{"username": f"dummy-{i}"} for i in range(1, 8)]
+
+
+def test_shards_wrong_name(users):
+    client = Client("http://example.com/fasjson")
+    with pytest.raises(ValueError):
+        client.get_shards("foobar", 3)
+
+
+def test_worker(users, mocker):
+    mocker.patch.object(shards, "_worker_client", None)
+    shards._init_worker({"url": "http://example.com/fasjson"})
+    assert isinstance(shards._worker_client, Client)
+    result = shards._fetch_shard(Shard("users", 1, 2, 3, {}))
+    assert result == [{"username": "dummy-2"}, {"username": "dummy-3"}]
+
+
+def test_list_all_entities_in_processes(users):
+    # The forked processes inherit the mocked HTTP requests.
+    result = list_all_entities_in_processes(
+        {"url": "http://example.com/fasjson"},
+        "users",
+        processes=2,
+        page_size=1,
+        mp_context=multiprocessing.get_context("fork"),
+    )
+    assert list(result) == [{"username": f"dummy-{i}"} for i in range(1, 8)]
@@ -0,0 +1,287 @@
+import errno
+import json
+import logging
+import os
+import time
+
+import pytest
+import requests
+import requests_mock
+from bravado.exception import HTTPError
+from bravado.requests_client import RequestsClient
+
+from fasjson_client.client import Client
+from fasjson_client.errors import ClientSetupError
+from fasjson_client.spec import (
+    SpecCache,
+    bundled_spec_path,
+    default_spec_cache_dir,
+    load_spec_file,
+    spec_checksum,
+)
+
+
+SPEC_URL = "http://example.com/fasjson/specs/v1.json"
+
+
+@pytest.fixture
+def spec_dict(fixture_dir):
+    with open(f"{fixture_dir}/spec.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SpecCache(os.path.join(tmp_path, "specs"), ttl=60)
+
+
+def test_default_cache_dir(monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", "/tmp/dummy-cache")
+    assert default_spec_cache_dir() == "/tmp/dummy-cache/fasjson-client/specs"
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert default_spec_cache_dir() == os.path.expanduser(
+        "~/.cache/fasjson-client/specs"
+    )
+
+
+def test_cache_miss_downloads(cache, spec_dict):
+    with requests_mock.Mocker() as m:
+        m.get(SPEC_URL, json=spec_dict, headers={"ETag": '"abc"'})
+        assert cache.load(RequestsClient(), SPEC_URL) == spec_dict
+    entry = cache.get(SPEC_URL)
+    assert entry["etag"] == '"abc"'
+    assert entry["spec"] == spec_dict
+
+
+def test_cache_fresh_no_request(cache, spec_dict):
+    cache.set(SPEC_URL, spec_dict)
+    with requests_mock.Mocker() as m:
+        assert cache.load(RequestsClient(), SPEC_URL) == spec_dict
+        assert m.call_count == 0
+
+
+def test_cache_revalidate_not_modified(cache, spec_dict):
+    cache.set(
+        SPEC_URL,
+        spec_dict,
+        headers={"ETag": '"abc"', "Last-Modified": "Sat, 01 Jan 2022 00:00:00 GMT"},
+        fetched_at=time.time() - 120,
+    )
+    with requests_mock.Mocker() as m:
+        m.get(SPEC_URL, status_code=304)
+        assert cache.load(RequestsClient(), SPEC_URL) == spec_dict
+        headers = m.last_request.headers
+    assert headers["If-None-Match"] == '"abc"'
+    assert headers["If-Modified-Since"] == "Sat, 01 Jan 2022 00:00:00 GMT"
+    # The entry is fresh again
+    assert cache.is_fresh(cache.get(SPEC_URL))
+
+
+def test_cache_revalidate_modified(cache, spec_dict):
+    cache.set(SPEC_URL, {"old": "spec"}, fetched_at=time.time() - 120)
+    with requests_mock.Mocker() as m:
+        m.get(SPEC_URL, json=spec_dict, headers={"ETag": '"def"'})
+        assert cache.load(RequestsClient(), SPEC_URL) == spec_dict
+        assert "If-None-Match" not in m.last_request.headers
+    assert cache.get(SPEC_URL)["etag"] == '"def"'
+
+
+@pytest.mark.parametrize(
+    "mock_kwargs",
+    [
+        {"status_code": 503},
+        {"exc": requests.exceptions.ConnectionError("down")},
+    ],
+)
+def test_cache_revalidate_error_uses_stale(cache, spec_dict, mock_kwargs):
+    cache.set(SPEC_URL, spec_dict, fetched_at=time.time() - 120)
+    with requests_mock.Mocker() as m:
+        m.get(SPEC_URL, **mock_kwargs)
+        assert cache.load(RequestsClient(), SPEC_URL) == spec_dict
+
+
+@pytest.mark.parametrize(
+    "mock_kwargs,exc_class",
+    [
+        ({"status_code": 503}, HTTPError),
+        (
+            {"exc": requests.exceptions.ConnectionError("down")},
+            requests.RequestException,
+        ),
+    ],
+)
+def test_cache_miss_error(cache, mock_kwargs, exc_class):
+    with requests_mock.Mocker() as m, pytest.raises(exc_class):
+        m.get(SPEC_URL, **mock_kwargs)
+        cache.load(RequestsClient(), SPEC_URL)
+
+
+def test_cache_corrupted(cache):
+    os.makedirs(cache.path)
+    with open(cache._entry_path(SPEC_URL), "w") as f:
+        f.write("{not json")
+    assert cache.get(SPEC_URL) is None
+    with open(cache._entry_path(SPEC_URL), "w") as f:
+        json.dump({"url": "http://other.example.com"}, f)
+    assert cache.get(SPEC_URL) is None
+
+
+def test_cache_unwritable(tmp_path, spec_dict, caplog):
+    not_a_dir = os.path.join(tmp_path, "file")
+    open(not_a_dir, "w").close()
+    cache = SpecCache(not_a_dir)
+    cache.set(SPEC_URL, spec_dict)
+    assert "Could not write the spec cache" in caplog.text
+    assert cache.get(SPEC_URL) is None
+
+
+def test_client_spec_cache(server, tmp_path):
+    cache_dir = os.path.join(tmp_path, "specs")
+    server.mock_endpoint("/me/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson", spec_cache=cache_dir)
+    assert client.whoami().result == {"username": "dummy"}
+    spec_requests = [r for r in server.reqs.request_history if "specs" in r.url]
+    assert len(spec_requests) == 1
+    # The second client uses the cache
+    client = Client("http://example.com/fasjson", spec_cache=cache_dir)
+    assert client.whoami().result == {"username": "dummy"}
+    spec_requests = [r for r in server.reqs.request_history if "specs" in r.url]
+    assert len(spec_requests) == 1
+
+
+def test_client_spec_cache_default_dir(mocker):
+    mocker.patch.object(Client, "_make_bravado_client")
+    mocker.patch.object(Client, "_make_ops_map")
+    client = Client("http://example.com/fasjson", spec_cache=True, spec_cache_ttl=42)
+    assert client._spec_cache.path == default_spec_cache_dir()
+    assert client._spec_cache.ttl == 42
+
+
+def test_bundled_spec_is_valid(spec_dict):
+    bundled = load_spec_file(bundled_spec_path(1))
+    assert bundled["swagger"] == "2.0"
+    operation_ids = {
+        operation["operationId"]
+        for path in bundled["paths"].values()
+        for method, operation in path.items()
+        if method != "parameters"
+    }
+    assert operation_ids >= {
+        "get_user",
+        "list_users",
+        "get_group",
+        "whoami",
+        "search",
+        "list_user_groups",
+    }
+
+
+def test_spec_checksum_ignores_base_path(spec_dict):
+    other = dict(spec_dict, basePath="/somewhere/else")
+    assert spec_checksum(other) == spec_checksum(spec_dict)
+    other = dict(spec_dict, info={"version": "2.0"})
+    assert spec_checksum(other) != spec_checksum(spec_dict)
+
+
+def test_client_bundled_spec(mocker):
+    mocker.patch("fasjson_client.client.GssapiAuthenticator", return_value=None)
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://example.com/fasjson/v1/me/",
+            json={"result": {"username": "dummy"}},
+            headers={"Content-Type": "application/json"},
+        )
+        client = Client("http://example.com/fasjson", spec="bundled", spec_check=False)
+        assert m.call_count == 0
+        assert client.whoami().result == {"username": "dummy"}
+    assert m.call_count == 1
+    assert client._spec_check_thread is None
+
+
+def test_client_spec_file_base_path(mocker, fixture_dir):
+    mocker.patch("fasjson_client.client.GssapiAuthenticator", return_value=None)
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://example.com/v1/me/",
+            json={"result": {"username": "dummy"}},
+            headers={"Content-Type": "application/json"},
+        )
+        client = Client(
+            "http://example.com",
+            spec=os.path.join(fixture_dir, "spec.json"),
+            spec_check=False,
+        )
+        assert client.whoami().result == {"username": "dummy"}
+
+
+def test_client_spec_file_missing(tmp_path):
+    with pytest.raises(ClientSetupError) as e:
+        Client("http://example.com", spec=os.path.join(tmp_path, "missing.json"))
+    assert str(e.value) == "could not read the spec file"
+    assert e.value.code == errno.ENOENT
+
+
+def test_client_spec_file_invalid(tmp_path):
+    path = os.path.join(tmp_path, "spec.json")
+    with open(path, "w") as f:
+        f.write("{not json")
+    with pytest.raises(ClientSetupError) as e:
+        Client("http://example.com", spec=path)
+    assert str(e.value) == "spec file validation failed"
+    assert e.value.code == errno.EPROTO
+
+
+def test_client_bundled_spec_check_on_first_use(server, mocker):
+    check_spec = mocker.patch.object(Client, "check_spec")
+    server.mock_endpoint("/me/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson", spec="bundled")
+    client.whoami()
+    client._spec_check_thread.join()
+    client.whoami()
+    check_spec.assert_called_once_with()
+
+
+def test_client_bundled_spec_check_list_all_entities(server, mocker):
+    check_spec = mocker.patch.object(Client, "check_spec")
+    server.mock_endpoint(
+        "/groups/",
+        json={"result": [], "page": {"page_number": 1, "total_pages": 1}},
+    )
+    client = Client("http://example.com/fasjson", spec="bundled")
+    assert list(client.list_all_entities("groups")) == []
+    client._spec_check_thread.join()
+    check_spec.assert_called_once_with()
+
+
+def test_client_check_spec(server, caplog):
+    bundled = load_spec_file(bundled_spec_path(1))
+    server.reqs.get("http://example.com/fasjson/specs/v1.json", json=bundled)
+    client = Client("http://example.com/fasjson", spec="bundled", spec_check=False)
+    assert client.check_spec() is True
+    # The server's spec changed
+    changed = dict(bundled, info={"version": "1.1"})
+    server.reqs.get("http://example.com/fasjson/specs/v1.json", json=changed)
+    with caplog.at_level(logging.WARNING):
+        assert client.check_spec() is False
+    assert "differs from the spec" in caplog.text
+    assert "(version 1.1)" in caplog.text
+    # The server's spec is unavailable
+    server.reqs.get("http://example.com/fasjson/specs/v1.json", status_code=503)
+    assert client.check_spec() is None
+    assert "Could not retrieve the spec" in caplog.text
+
+
+def test_client_check_spec_remote(server):
+    client = Client("http://example.com/fasjson")
+    with pytest.raises(ValueError):
+        client.check_spec()
+
+
+def test_client_check_spec_missing_file(server, tmp_path, fixture_dir, caplog):
+    path = os.path.join(tmp_path, "spec.json")
+    with open(os.path.join(fixture_dir, "spec.json")) as src, open(path, "w") as dest:
+        dest.write(src.read())
+    client = Client("http://example.com/fasjson", spec=path, spec_check=False)
+    os.remove(path)
+    assert client.check_spec() is None
+    assert "Could not load the local spec" in caplog.text
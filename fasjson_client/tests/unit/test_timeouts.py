@@ -0,0 +1,216 @@
+import re
+import threading
+
+import pytest
+from requests.exceptions import ReadTimeout
+
+from fasjson_client.client import Client
+from fasjson_client.errors import DeadlineExceeded
+from fasjson_client.retry import RetryPolicy
+from fasjson_client.timeouts import Deadline, get_operation_timeouts, request_args
+
+from .utils import users_pages
+
+USERS_URL = re.compile(r"^http://example\.com/fasjson/v1/users/(\?.*)?$")
+USER_URL = "http://example.com/fasjson/v1/users/dummy/"
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = mocker.patch("fasjson_client.timeouts.time").monotonic
+    clock.return_value = 1000.0
+    return clock
+
+
+def _timed_out(clock, delay):
+    def callback(request, context):
+        clock.return_value += delay
+        raise ReadTimeout("too slow")
+
+    return callback
+
+
+def _slow_pages(clock, total_pages, delay):
+    pages = users_pages(total_pages)
+
+    def callback(request, context):
+        clock.return_value += delay
+        return pages(request, context)
+
+    return callback
+
+
+def _last_timeout(server):
+    return server.reqs.last_request.timeout
+
+
+def test_operation_timeouts(server):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    server.mock_endpoint("/me/", json={"result": {"username": "dummy"}})
+    server.reqs.get(USERS_URL, json=users_pages(1), headers=JSON_HEADERS)
+    client = Client(
+        "http://example.com/fasjson",
+        timeout=30,
+        connect_timeout=5,
+        operation_timeouts={"get_user": 2, "list_users": (1, 60)},
+    )
+    client.get_user(username="dummy")
+    assert _last_timeout(server) == (5, 2)
+    client.list_users(page_size=1, page_number=1)
+    assert _last_timeout(server) == (1, 60)
+    client.whoami()
+    assert _last_timeout(server) == (5, 30)
+    # The request options take precedence.
+    client.get_user(username="dummy", _request_options={"timeout": 9})
+    assert _last_timeout(server) == (5, 9)
+
+
+def test_get_operation_timeouts():
+    assert get_operation_timeouts(None, "get_user", None, None) is None
+    timeouts = {"get_user": [1, 2]}
+    assert get_operation_timeouts(timeouts, "get_user", None, None) == (1, 2)
+    assert get_operation_timeouts({"get_user": 3}, "whoami", 1, 2) == (1, 2)
+
+
+def test_request_args(clock):
+    kwargs = {"username": "dummy"}
+    assert request_args(kwargs) is kwargs
+    deadline = Deadline(10)
+    args = request_args(
+        {"username": "dummy", "_request_options": {"timeout": 60, "headers": {}}},
+        timeouts=(1, None),
+        deadline=deadline,
+    )
+    options = args["_request_options"]
+    assert options["connect_timeout"] == 1
+    assert options["timeout"] == 10
+    assert options["headers"] == {}
+
+
+def test_deadline(clock):
+    deadline = Deadline(10)
+    assert Deadline.make(deadline) is deadline
+    assert Deadline.make(None) is None
+    assert Deadline.make(5).seconds == 5
+    assert not deadline.expired
+    assert repr(deadline) == "<Deadline of 10s, 10.000s left>"
+    clock.return_value += 10
+    assert deadline.expired
+    expired = Deadline(0)
+    assert expired.expired
+    with pytest.raises(DeadlineExceeded) as e:
+        expired.check()
+    assert str(e.value) == "the time budget of 0 seconds ran out"
+    assert e.value.data == {"deadline": 0}
+
+
+def test_call_deadline(server, clock):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson", timeout=60)
+    client.get_user(username="dummy", _deadline=30)
+    assert _last_timeout(server) == (30, 30)
+    with pytest.raises(DeadlineExceeded):
+        client.get_user(username="dummy", _deadline=0)
+    assert len(server.reqs.request_history) == 2
+
+
+def test_call_deadline_timed_out(server, clock):
+    server.reqs.get(USER_URL, json=_timed_out(clock, 5))
+    client = Client("http://example.com/fasjson")
+    with pytest.raises(DeadlineExceeded) as e:
+        client.get_user(username="dummy", _deadline=1)
+    assert isinstance(e.value.__cause__, ReadTimeout)
+    # A timeout before the deadline is raised as is.
+    with pytest.raises(ReadTimeout):
+        client.get_user(username="dummy", _deadline=10)
+
+
+def test_call_or_none_deadline(server):
+    server.mock_endpoint("/users/dummy/", status_code=404, json={"message": "Nope"})
+    client = Client("http://example.com/fasjson")
+    assert client.get_user_or_none(username="dummy", _deadline=10) is None
+    with pytest.raises(DeadlineExceeded):
+        client.get_user_or_none(username="dummy", _deadline=0)
+
+
+def test_list_all_entities_deadline(server, clock):
+    server.reqs.get(USERS_URL, json=_slow_pages(clock, 5, 1), headers=JSON_HEADERS)
+    client = Client("http://example.com/fasjson")
+    users = []
+    with pytest.raises(DeadlineExceeded):
+        for user in client.list_all_entities("users", page_size=1, deadline=2.5):
+            users.append(user)
+    assert users == [{"username": f"dummy-{i}"} for i in range(1, 4)]
+    timeouts = [r.timeout[1] for r in server.reqs.request_history if "/users/" in r.url]
+    assert timeouts == [2.5, 1.5, 0.5]
+
+
+def test_list_all_entities_deadline_concurrent(server):
+    server.reqs.get(USERS_URL, json=users_pages(3), headers=JSON_HEADERS)
+    client = Client("http://example.com/fasjson")
+    users = list(
+        client.list_all_entities("users", page_size=1, concurrency=2, deadline=10)
+    )
+    assert len(users) == 3
+    assert all(
+        r.timeout[1] <= 10 for r in server.reqs.request_history if "/users/" in r.url
+    )
+
+
+def test_next_page_deadline(server):
+    server.reqs.get(USERS_URL, json=users_pages(3), headers=JSON_HEADERS)
+    client = Client("http://example.com/fasjson")
+    response = client.list_users(page_size=1, page_number=1)
+    response = response.next_page(deadline=10)
+    assert response.result == [{"username": "dummy-2"}]
+    assert _last_timeout(server)[1] <= 10
+    # The deadline is not kept for the next pages.
+    response.prev_page()
+    assert _last_timeout(server) is None
+    with pytest.raises(DeadlineExceeded):
+        response.next_page(deadline=0)
+
+
+def test_prefetched_page_deadline(server, clock):
+    release = threading.Event()
+    server.reqs.get(
+        USERS_URL, json=users_pages(3, release=release), headers=JSON_HEADERS
+    )
+    client = Client("http://example.com/fasjson", prefetch_pages=1)
+    response = client.list_users(page_size=1, page_number=1)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            response.next_page(deadline=0.05)
+    finally:
+        release.set()
+    # The wait is bounded by the deadline, not the prefetch itself.
+    response = client.list_users(page_size=1, page_number=1)
+    assert response.next_page(deadline=10).result == [{"username": "dummy-2"}]
+
+
+def test_retry_deadline(server, mocker):
+    sleep = mocker.patch("fasjson_client.retry.time.sleep")
+    server.mock_endpoint(
+        "/users/dummy/",
+        status_code=503,
+        headers={"Retry-After": "10"},
+        json={"message": "Service Unavailable"},
+    )
+    policy = RetryPolicy()
+    client = Client("http://example.com/fasjson", retry=policy)
+    with pytest.raises(DeadlineExceeded) as e:
+        client.get_user(username="dummy", _deadline=5)
+    assert e.value.__cause__.code == 503
+    sleep.assert_not_called()
+    assert policy.stats() == {"retries": 0, "exhausted": 1}
+
+
+def test_bulk_deadline(server):
+    server.mock_endpoint("/users/dummy/", json={"result": {"username": "dummy"}})
+    client = Client("http://example.com/fasjson")
+    result = client.get_users(["dummy", "other"], deadline=0)
+    assert result.results == {}
+    assert all(isinstance(e, DeadlineExceeded) for e in result.errors.values())
+    result = client.get_users(["dummy"], deadline=10)
+    assert result.results == {"dummy": {"username": "dummy"}}
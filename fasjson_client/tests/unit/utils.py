@@ -1,3 +1,4 @@
+import time
 from types import SimpleNamespace
 from unittest import mock
 
@@ -19,7 +20,8 @@ class FasJsonMock:
         self.api_version = api_version
         self.principal = principal
         self.gssapi_creds = mock.patch(
-            "gssapi.Credentials", return_value=SimpleNamespace(lifetime=10)
+            "gssapi.Credentials",
+            return_value=SimpleNamespace(lifetime=10, name=principal),
         )
         self.reqs = requests_mock.Mocker()
 
@@ -61,3 +63,47 @@ class FasJsonMock:
         else:
             _set_default_in_params(kwargs)
             self.reqs.register_uri(method, url, **kwargs)
+
+
+def users_page(page_number, page_size, total_pages):
+    """Return the response body of a page of users, with one user named after the page."""
+    return {
+        "result": [{"username": f"dummy-{page_number}"}],
+        "page": {
+            "page_number": page_number,
+            "page_size": page_size,
+            "total_pages": total_pages,
+        },
+    }
+
+
+def users_pages(total_pages, failures=None, delay=0, release=None):
+    """Return a requests_mock callback serving the pages of users.
+
+    Args:
+        total_pages (int): the number of pages
+        failures (dict): the number of times each page fails with a server error, keyed by
+            page number
+        delay (float): the number of seconds each page takes
+        release (threading.Event): the event the pages after the first one wait for
+    """
+    failures = dict(failures or {})
+
+    def callback(request, context):
+        page_number = int(request.qs.get("page_number", ["1"])[0])
+        time.sleep(delay)
+        if release is not None and page_number > 1:
+            release.wait(5)
+        if failures.get(page_number, 0) > 0:
+            failures[page_number] -= 1
+            context.status_code = 500
+            return {"message": "Server Error"}
+        page_size = int(request.qs.get("page_size", ["1"])[0])
+        return users_page(page_number, page_size, total_pages)
+
+    return callback
+
+
+def user_requests(server, url="/users/"):
+    """Return the requests sent to the server for the users."""
+    return [r for r in server.reqs.request_history if url in r.url]
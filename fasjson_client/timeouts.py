@@ -0,0 +1,164 @@
+"""Timeouts of the operations, and time budgets spanning several requests."""
+
+import errno
+import time
+
+from .errors import DeadlineExceeded
+
+
+def get_operation_timeouts(timeouts, operation_id, connect_timeout, timeout):
+    """Return the connect and read timeouts of an operation.
+
+    Args:
+        timeouts (dict): the timeouts of some operations, keyed by operation id. A timeout is
+            either the number of seconds to wait for the server to send data, or a
+            ``(connect_timeout, timeout)`` tuple.
+        operation_id (str): the operation id
+        connect_timeout (float): the default number of seconds to wait for a connection
+        timeout (float): the default number of seconds to wait for the server to send data
+
+    Returns:
+        tuple: the connect and read timeouts, or ``None`` if there are none
+    """
+    value = (timeouts or {}).get(operation_id)
+    if value is None:
+        value = (connect_timeout, timeout)
+    elif not isinstance(value, (tuple, list)):
+        value = (connect_timeout, value)
+    value = tuple(value)
+    return None if value == (None, None) else value
+
+
+def request_args(kwargs, timeouts=None, deadline=None):
+    """Return the arguments of a call, with the timeouts of its operation and its deadline.
+
+    The timeouts given in the ``_request_options`` argument take precedence over the
+    timeouts of the operation. All of them are shortened to the time left before the deadline.
+
+    Args:
+        kwargs (dict): the arguments of the call
+        timeouts (tuple): the connect and read timeouts of the operation
+        deadline (Deadline): the deadline of the call
+
+    Returns:
+        dict: the arguments to send the request with
+
+    Raises:
+        DeadlineExceeded: if the deadline has passed
+    """
+    if timeouts is None and deadline is None:
+        return kwargs
+    options = dict(kwargs.get("_request_options", {}))
+    for key, value in zip(("connect_timeout", "timeout"), timeouts or ()):
+        if value is not None:
+            options.setdefault(key, value)
+    if deadline is not None:
+        remaining = deadline.check()
+        for key in ("connect_timeout", "timeout"):
+            value = options.get(key)
+            options[key] = remaining if value is None else min(value, remaining)
+    return dict(kwargs, _request_options=options)
+
+
+class Deadline:
+    """A time budget shared by several requests, such as the pages of an iteration.
+
+    The requests are not sent after the deadline, and their timeouts are shortened so that they
+    don't wait past it.
+
+    Args:
+        seconds (float): the number of seconds from now until the deadline
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._expires_at = time.monotonic() + seconds
+
+    def __repr__(self):
+        return "<Deadline of {}s, {:.3f}s left>".format(self.seconds, self.remaining())
+
+    @classmethod
+    def make(cls, deadline):
+        """Build a deadline from a number of seconds.
+
+        Args:
+            deadline (float or Deadline): the number of seconds, or an existing deadline which
+                is returned as is. ``None`` means no deadline.
+
+        Returns:
+            Deadline: the deadline, or ``None``
+        """
+        if deadline is None or isinstance(deadline, cls):
+            return deadline
+        return cls(deadline)
+
+    def remaining(self):
+        """Return the number of seconds left before the deadline, or zero."""
+        return max(self._expires_at - time.monotonic(), 0)
+
+    @property
+    def expired(self):
+        """Whether the deadline has passed."""
+        return self.remaining() <= 0
+
+    def exceeded(self):
+        """Return the error raised when the deadline has passed.
+
+        Returns:
+            DeadlineExceeded: the error
+        """
+        return DeadlineExceeded(
+            "the time budget of {} seconds ran out".format(self.seconds),
+            errno.ETIMEDOUT,
+            data={"deadline": self.seconds},
+        )
+
+    def check(self):
+        """Return the number of seconds left, or raise if the deadline has passed.
+
+        Returns:
+            float: the number of seconds left
+
+        Raises:
+            DeadlineExceeded: if the deadline has passed
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise self.exceeded()
+        return remaining
+
+    def call(self, send, errors=(OSError,)):
+        """Call ``send()`` if the deadline has not passed.
+
+        Args:
+            send (callable): the function sending the request
+            errors (tuple): the exceptions raised by ``send()`` when the server can't be
+                reached or times out. They are replaced by ``DeadlineExceeded`` if the deadline
+                has passed meanwhile.
+
+        Returns:
+            the result of ``send()``
+
+        Raises:
+            DeadlineExceeded: if the deadline has passed
+        """
+        self.check()
+        try:
+            return send()
+        except errors as e:
+            if self.expired:
+                raise self.exceeded() from e
+            raise
+
+    async def call_async(self, send, errors):
+        """Await ``send()`` if the deadline has not passed.
+
+        This is the asynchronous version of :meth:`call`.
+        """
+        self.check()
+        try:
+            return await send()
+        except errors as e:
+            if self.expired:
+                raise self.exceeded() from e
+            raise
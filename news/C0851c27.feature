@@ -0,0 +1 @@
+Add a loader batching and deduplicating the lookups of single entities
@@ -0,0 +1 @@
+Add `fasjson_client.aio.AsyncClient`, an asyncio client based on aiohttp, with asynchronous operations and pagination
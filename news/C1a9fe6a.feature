@@ -0,0 +1 @@
+Add an optional cache of the responses to the read operations, with a time-to-live and a bounded size
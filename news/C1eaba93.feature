@@ -0,0 +1 @@
+Allow building the client from a local or bundled snapshot of the API specification, without fetching it from the server
@@ -0,0 +1 @@
+Add an iteration over all the entities that can be resumed from a saved cursor
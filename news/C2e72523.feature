@@ -0,0 +1 @@
+Optionally retry the read operations failing with a transient error, with exponential backoff
@@ -0,0 +1 @@
+Optionally throttle the requests with a token bucket rate limiter
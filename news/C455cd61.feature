@@ -0,0 +1 @@
+Split the iteration over all the entities into page ranges that can be fetched in parallel processes
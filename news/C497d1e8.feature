@@ -0,0 +1 @@
+Optionally coalesce the identical read requests that are in flight at the same time
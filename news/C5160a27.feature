@@ -0,0 +1 @@
+Optionally serve stale cached responses while they are refreshed, and when the server fails
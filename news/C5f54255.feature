@@ -0,0 +1 @@
+Make the connection pool size, the timeouts and the keep-alive of the client configurable
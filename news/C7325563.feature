@@ -0,0 +1 @@
+Add the get_users() and get_groups() bulk lookups
@@ -0,0 +1 @@
+Optionally cache the API specification on disk, and revalidate it with a conditional request once its time-to-live has passed
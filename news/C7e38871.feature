@@ -0,0 +1 @@
+Add get_*_or_none() lookups returning None for missing entities, and optionally cache the misses
@@ -0,0 +1 @@
+Add per-operation timeouts, and deadlines bounding the time spent on a call, a paginated iteration or a bulk lookup
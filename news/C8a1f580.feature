@@ -0,0 +1 @@
+Add an opportunistic authentication mode, sending the SPNEGO token with the first request
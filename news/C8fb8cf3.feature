@@ -0,0 +1 @@
+Fetch the pages of list_all_entities() concurrently
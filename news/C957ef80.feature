@@ -0,0 +1 @@
+Optionally store the session cookies of the server on disk, to reuse the session across clients and runs of the command-line tool
@@ -0,0 +1 @@
+Optionally hedge the slow read requests, sending a duplicate request and returning the first response to arrive
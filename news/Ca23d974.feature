@@ -0,0 +1 @@
+Reuse the GSSAPI credentials and the SPNEGO authentication between requests
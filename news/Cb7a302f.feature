@@ -0,0 +1 @@
+Optionally prefetch the next pages of the paginated responses in the background, so that next_page() doesn't wait for the server
@@ -0,0 +1 @@
+Optionally share the parsed API specification between the clients of a process
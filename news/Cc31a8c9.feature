@@ -0,0 +1 @@
+Add an optional circuit breaker, failing fast while the server is down
@@ -0,0 +1 @@
+Spread the requests over several FASJSON servers, and fail over between them
@@ -0,0 +1 @@
+Add a lazy mode deferring the fetching of the API specification to the first call